@@ -0,0 +1,668 @@
+import argparse
+import bisect
+import collections
+import heapq
+import io
+import ipaddress
+import itertools
+import math
+import random
+import selectors
+import socket
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.console import Console
+from rich.table import Table
+
+import tmd
+from tmd import console
+
+IF_COLUMN_NAMES = {oid.rsplit('.', 1)[1]: name for name, oid in tmd.IF_COLUMNS.items()}
+
+def hex_lines(raw):
+    """Formatea bytes como los imprime net-snmp con -Ox: 16 octetos por línea"""
+    chunks = [raw[i:i+16] for i in range(0, len(raw), 16)] or [b'']
+    return [chunk.hex(' ').upper() + ' ' for chunk in chunks]
+
+def synthetic_walk(rows):
+    """Genera, línea a línea, la salida de snmpbulkwalk de ifDescr, ifPhysAddress e ifOperStatus"""
+    for column in ('2', '6', '8'):
+        for index in range(1, rows + 1):
+            oid = f".1.3.6.1.2.1.2.2.1.{column}.{index}"
+            if column == '8':
+                yield f"{oid} = INTEGER: {1 if index % 3 else 2}\n"
+                continue
+            if column == '2':
+                raw = f"GigabitEthernet{index // 48 + 1}/0/{index % 48 + 1}".encode()
+            else:
+                raw = bytes([0x00, 0x1A, 0x2B, (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF])
+            lines = hex_lines(raw)
+            yield f"{oid} = Hex-STRING: {lines[0]}\n"
+            for line in lines[1:]:
+                yield line + "\n"
+
+def parse_walk(lines):
+    """Lo mismo que hace get_snmp_table con el motor netsnmp: parsear y plegar por filas"""
+    rows = {}
+    for oid, value in tmd.parse_netsnmp_output(lines):
+        column, _, index = oid[len('1.3.6.1.2.1.2.2.1.'):].partition('.')
+        rows.setdefault(index, {})[IF_COLUMN_NAMES[column]] = value
+    return {int(index): tmd.parse_interface_row(index, row) for index, row in rows.items()}
+
+def bench_parser(rows, repeat):
+    """Mide filas por segundo del parser de salida de snmpbulkwalk"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        interfaces = parse_walk(synthetic_walk(rows))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    parse_walk(synthetic_walk(rows))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    console.print(f"Parser de snmpbulkwalk: {len(interfaces)} interfaces, mejor de {repeat}: "
+                  f"[bold cyan]{best:.3f}[/bold cyan] s, [bold cyan]{rows / best:,.0f}[/bold cyan] filas/s, "
+                  f"pico de memoria {peak / 1024:.0f} KiB")
+
+def bench_rates(devices, interfaces, repeat):
+    """Mide el cálculo de tasas de RateEngine sobre una flota de interfaces sintéticas"""
+    engine = tmd.RateEngine()
+    polls = []
+    for cycle in range(repeat + 1):
+        timestamp = 60.0 * cycle
+        polls.append([(f"10.{device >> 8}.{device & 0xFF}.1", {
+            index: tmd.Interface(index, f"eth{index}", in_octets=(device + index) * 125000 * (cycle + 1) % (1 << 32),
+                                 out_octets=index * 62500 * (cycle + 1), counter_bits=32 if index % 2 else 64,
+                                 speed=1000000000, in_errors=cycle, out_errors=0)
+            for index in range(1, interfaces + 1)}, timestamp) for device in range(devices)])
+
+    observe = compute = 0.0
+    for cycle, poll in enumerate(polls):
+        started = time.perf_counter()
+        for ip, rows, timestamp in poll:
+            engine.observe(ip, rows, 100 * int(timestamp), timestamp)
+        middle = time.perf_counter()
+        engine.compute()
+        ended = time.perf_counter()
+        if cycle:  # El primer ciclo solo da de alta las filas
+            observe += middle - started
+            compute += ended - middle
+    started = time.perf_counter()
+    engine.top(10)
+    engine.aggregates()
+    summary = time.perf_counter() - started
+
+    total = devices * interfaces
+    console.print(f"Tasas de {total:,} interfaces ({devices} dispositivos), media de {repeat} ciclos: "
+                  f"encolado [bold cyan]{observe / repeat * 1000:.1f}[/bold cyan] ms, cálculo "
+                  f"[bold cyan]{compute / repeat * 1000:.1f}[/bold cyan] ms "
+                  f"([bold cyan]{total * repeat / compute:,.0f}[/bold cyan] interfaces/s), "
+                  f"top-10 y totales {summary * 1000:.1f} ms")
+
+def legacy_device(device, interfaces):
+    """Un dispositivo con la forma anterior: diccionarios con claves de texto y valores ya formateados"""
+    return {
+        'ip': f"10.{device >> 8 & 0xFF}.{device & 0xFF}.1",
+        'System Description': f"Cisco IOS Software, C2960 Software, Version 15.0({device % 4})SE".lower().title(),
+        'System Name': f"sw-{device}",
+        'Location': f"Rack {device % 10}".upper().title(),
+        'Uptime': tmd.format_uptime(8640000 + device),
+        'Contact': 'Admin@Example.com'.lower(),
+        'Object ID': '1.3.6.1.4.1.9.1.' + str(device % 4),
+        'interfaces': {
+            str(index): {
+                'name': f"GigabitEthernet0/{index}".upper().title(),
+                'mac': tmd.clean_mac_address(bytes([0, 0x1A, 0x2B, device >> 8 & 0xFF, device & 0xFF, index])),
+                'status': 'Up' if index % 4 else 'Down',
+                'in_octets': (device + 1) * index * 125000,
+                'out_octets': (device + 1) * index * 62500,
+                'counter_bits': 64,
+            } for index in range(1, interfaces + 1)
+        },
+    }
+
+def slotted_device(device, interfaces):
+    """El mismo dispositivo con Device e Interface, tal como lo construye la recogida"""
+    return tmd.Device(
+        f"10.{device >> 8 & 0xFF}.{device & 0xFF}.1",
+        description=f"Cisco IOS Software, C2960 Software, Version 15.0({device % 4})SE".lower().title(),
+        name=f"sw-{device}",
+        location=f"Rack {device % 10}".upper().title(),
+        contact='Admin@Example.com'.lower(),
+        object_id='1.3.6.1.4.1.9.1.' + str(device % 4),
+        uptime=8640000 + device,
+        interfaces={index: tmd.Interface(index, f"GigabitEthernet0/{index}".upper().title(),
+                                         bytes([0, 0x1A, 0x2B, device >> 8 & 0xFF, device & 0xFF, index]),
+                                         1 if index % 4 else 2, in_octets=(device + 1) * index * 125000,
+                                         out_octets=(device + 1) * index * 62500, counter_bits=64)
+                    for index in range(1, interfaces + 1)},
+    )
+
+def bench_memory(devices, interfaces):
+    """Compara la memoria de la flota con diccionarios y con el modelo de Device e Interface
+
+    Los textos se construyen en tiempo de ejecución, como los que llegan de
+    la red, para que no los comparta el intérprete como constantes.
+    """
+    results = []
+    for name, build in (('diccionarios', legacy_device), ('Device/Interface', slotted_device)):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fleet = [build(device, interfaces) for device in range(devices)]
+        elapsed = time.perf_counter() - started
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        started = time.perf_counter()
+        if name == 'diccionarios':
+            for device in fleet:
+                sorted(device['interfaces'].items(), key=lambda x: int(x[0]))
+        else:
+            for device in fleet:
+                sorted(device.interfaces.items())
+        ordering = time.perf_counter() - started
+        results.append((name, size, elapsed, ordering))
+        del fleet
+
+    table = Table(title=f"Memoria de {devices:,} dispositivos con {interfaces} interfaces "
+                        f"({devices * interfaces:,} interfaces)", header_style="bold blue")
+    for column in ("Modelo", "MiB", "B/interfaz", "Construcción (s)", "Ordenar (s)"):
+        table.add_column(column, justify="left" if column == "Modelo" else "right")
+    for name, size, elapsed, ordering in results:
+        table.add_row(name, f"{size / 2**20:.1f}", f"{size / (devices * interfaces):.0f}",
+                      f"{elapsed:.2f}", f"{ordering:.3f}")
+    console.print(table)
+    console.print(f"Reducción de memoria: [bold cyan]{1 - results[1][1] / results[0][1]:.0%}[/bold cyan]")
+
+def bench_panel(devices, interfaces, repeat):
+    """Compara dibujar la tabla completa de interfaces con dibujar una página del panel en vivo
+
+    Cada ciclo del panel llega un sondeo de un único dispositivo, que cambia
+    el estado de una interfaz, y se vuelve a dibujar la página visible.
+    """
+    fleet = []
+    for device in range(devices):
+        item = tmd.Device(f"10.{device >> 8}.{device & 0xFF}.1", name=f"sw-{device}")
+        item.interfaces = {index: tmd.Interface(index, f"eth{index}", oper_status=1 if index % 4 else 2)
+                           for index in range(1, interfaces + 1)}
+        fleet.append(item)
+    screen = Console(file=io.StringIO(), width=120, height=50)
+
+    started = time.perf_counter()
+    with console.capture():
+        tmd.display_interfaces_table(fleet)
+    full = time.perf_counter() - started
+
+    dashboard = tmd.Dashboard(page_size=40)
+    started = time.perf_counter()
+    for device in fleet:
+        dashboard.update_poll(device.ip, device, 0, [])
+    load = time.perf_counter() - started
+    screen.print(dashboard.render())
+
+    update = render = 0.0
+    for cycle in range(repeat):
+        device = fleet[cycle % devices]
+        interface = device.interfaces[1]
+        changes = [(1, interface.name, interface.status, 'Down' if interface.status == 'Up' else 'Up')]
+        interface.status = changes[0][3]
+        started = time.perf_counter()
+        dashboard.update_poll(device.ip, device, 0, changes)
+        middle = time.perf_counter()
+        screen.print(dashboard.render())
+        ended = time.perf_counter()
+        update += middle - started
+        render += ended - middle
+
+    total = devices * interfaces
+    console.print(f"Panel de {total:,} interfaces ({devices} dispositivos): tabla completa "
+                  f"[bold cyan]{full * 1000:.0f}[/bold cyan] ms, carga inicial del panel {load * 1000:.0f} ms, "
+                  f"por sondeo actualización [bold cyan]{update / repeat * 1000:.2f}[/bold cyan] ms y página "
+                  f"[bold cyan]{render / repeat * 1000:.1f}[/bold cyan] ms (media de {repeat})")
+
+V3_LEVELS = {  # nivel de seguridad -> credenciales del simulador y del cliente
+    'noauth': ('monitor', None, None, None),
+    'auth': ('monitor', 'SHA', 'clave-auth-simulada', None),
+    'priv': ('monitor', 'SHA', 'clave-auth-simulada', 'clave-priv-simulada'),
+}
+
+def usm_header(data):
+    """msgID y engineID de un mensaje SNMPv3, sin verificarlo ni descifrarlo"""
+    data = memoryview(data)
+    _, pos, _ = tmd.ber_read(data, 0)
+    _, _, pos = tmd.ber_read(data, pos)      # msgVersion
+    _, inner, pos = tmd.ber_read(data, pos)  # msgGlobalData
+    _, start, end = tmd.ber_read(data, inner)
+    _, usm, _ = tmd.ber_read(data, pos)      # msgSecurityParameters
+    _, usm, _ = tmd.ber_read(data, usm)
+    _, engine_start, engine_end = tmd.ber_read(data, usm)
+    return int.from_bytes(data[start:end], 'big', signed=True), bytes(data[engine_start:engine_end])
+
+class SimulatedNetwork:
+    """Red de agentes SNMPv2c simulados en direcciones de loopback (127.1.0.1, 127.1.0.2, ...)
+
+    Todos los dispositivos comparten la misma plantilla de MIB (grupo system,
+    ifTable e ifXTable) y los valores se calculan al responder, así que miles
+    de dispositivos caben en memoria. Un único hilo atiende todos los sockets
+    y aplica la latencia y la pérdida configuradas; los dispositivos muertos
+    tienen dirección pero ningún socket. Con `capacity` cada agente atiende
+    como mucho esos paquetes por segundo, con una ráfaga de AGENT_BURST, y
+    descarta el resto, como un snmpd modesto desbordado. Con `v3` (usuario,
+    autenticación, clave de autenticación, clave de cifrado) los agentes
+    hablan SNMPv3 con USM en lugar de v2c.
+    """
+    AGENT_BURST = 3
+
+    def __init__(self, devices=10, interfaces=8, latency=0.0, loss=0.0, dead=0,
+                 port=16100, community='public', seed=1, capacity=None, v3=None):
+        self.port = port
+        self.community = community.encode()
+        self.latency = latency
+        self.loss = loss
+        self.capacity = capacity
+        self.buckets = {}  # dispositivo -> (testigos, instante)
+        self.usm = tmd.UsmSecurity(*v3) if v3 else None
+        self.reporter = tmd.UsmSecurity(v3[0]) if v3 else None  # Reports de descubrimiento, sin firmar
+        self.engine_id = bytes.fromhex('80001f8804') + b'simulado'
+        self.random = random.Random(seed)
+        self.start_time = time.monotonic()
+        base = ipaddress.ip_address('127.1.0.1')
+        addresses = [str(base + offset) for offset in range(devices + dead)]
+        dead_addresses = set(self.random.sample(addresses, dead))
+        self.addresses = addresses
+        self.alive = [address for address in addresses if address not in dead_addresses]
+        self.template = self.build_template(interfaces)
+        self.keys = sorted(self.template)
+        self.stats = collections.Counter()
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def build_template(self, interfaces):
+        """Plantilla {oid: función(dispositivo, segundos) -> valor} común a todos los dispositivos"""
+        def const(value):
+            return lambda device, now: value
+
+        def counter(cls, rate, bits):
+            return lambda device, now: cls(int((device + 1) * rate * (now + 1000)) % (1 << bits))
+
+        uptime = lambda device, now: tmd.TimeTicks(int((now + 86400 + device) * 100))
+        template = {
+            (1, 3, 6, 1, 2, 1, 1, 1, 0): lambda device, now: f"Linux sim-{device} 5.15.0 x86_64".encode(),
+            (1, 3, 6, 1, 2, 1, 1, 2, 0): const(tmd.ObjectIdentifier('1.3.6.1.4.1.8072.3.2.10')),
+            (1, 3, 6, 1, 2, 1, 1, 3, 0): uptime,
+            (1, 3, 6, 1, 2, 1, 1, 4, 0): const(b'admin@example.com'),
+            (1, 3, 6, 1, 2, 1, 1, 5, 0): lambda device, now: f"sim-{device}".encode(),
+            (1, 3, 6, 1, 2, 1, 1, 6, 0): lambda device, now: f"Rack {device % 10}".encode(),
+            (1, 3, 6, 1, 2, 1, 2, 1, 0): const(interfaces),
+            (1, 3, 6, 1, 2, 1, 31, 1, 5, 0): const(tmd.TimeTicks(0)),
+            (1, 3, 6, 1, 2, 1, 25, 1, 6, 0): lambda device, now: tmd.Gauge32(100 + device % 50),
+        }
+        # HOST-RESOURCES-MIB: dos CPU, la memoria física y un disco
+        for index in (1, 2):
+            load = lambda device, now, index=index: (device * 7 + index * 13 + int(now)) % 100
+            template[(1, 3, 6, 1, 2, 1, 25, 3, 3, 1, 2, 195 + index)] = load
+        storage = {
+            1: (tmd.ObjectIdentifier(tmd.HR_STORAGE_RAM), b'Physical memory', 1024, 8388608,
+                lambda device: 2097152 + device * 4096),
+            31: (tmd.ObjectIdentifier(tmd.HR_STORAGE_FIXED_DISK), b'/', 4096, 25600000,
+                 lambda device: 6400000 + device * 1000),
+        }
+        for index, (kind, description, units, size, used) in storage.items():
+            template[(1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 2, index)] = const(kind)
+            template[(1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 3, index)] = const(description)
+            template[(1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 4, index)] = const(units)
+            template[(1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 5, index)] = const(size)
+            template[(1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 6, index)] = lambda device, now, used=used: used(device)
+        for index in range(1, interfaces + 1):
+            mac = lambda device, now, index=index: bytes([0x02, 0x00, device >> 8 & 0xFF, device & 0xFF, 0, index & 0xFF])
+            columns = {
+                1: const(index),
+                2: const(f"eth{index - 1}".encode()),
+                3: const(6),
+                5: const(tmd.Gauge32(1000000000)),
+                6: mac,
+                7: const(1),
+                8: const(1 if index % 4 else 2),
+                9: const(tmd.TimeTicks(0)),
+                10: counter(tmd.Counter32, 12500 * index, 32),
+                16: counter(tmd.Counter32, 6250 * index, 32),
+                14: counter(tmd.Counter32, 0.01 * index, 32),
+                20: const(tmd.Counter32(0)),
+            }
+            for column, value in columns.items():
+                template[(1, 3, 6, 1, 2, 1, 2, 2, 1, column, index)] = value
+            x_columns = {
+                1: const(f"eth{index - 1}".encode()),
+                6: counter(tmd.Counter64, 12500 * index, 64),
+                10: counter(tmd.Counter64, 6250 * index, 64),
+                15: const(tmd.Gauge32(1000)),
+                18: const(f"enlace {index}".encode()),
+            }
+            for column, value in x_columns.items():
+                template[(1, 3, 6, 1, 2, 1, 31, 1, 1, 1, column, index)] = value
+        return template
+
+    def value(self, device, oid, now):
+        return self.template[oid](device, now)
+
+    def next_value(self, device, oid, now):
+        position = bisect.bisect_right(self.keys, oid)
+        if position >= len(self.keys):
+            return '.'.join(map(str, oid)), tmd.END_OF_MIB_VIEW
+        key = self.keys[position]
+        return '.'.join(map(str, key)), self.value(device, key, now)
+
+    def respond(self, device, data, address):
+        """Construye la respuesta a una petición, o None si hay que ignorarla"""
+        if self.usm is not None:
+            return self.respond_v3(device, data, address)
+        message = tmd.decode_message(data)
+        if message['community'] != self.community:
+            return None
+        response = self.answer(device, message)
+        if response is None:
+            return None
+        return tmd.encode_message(message['community'], tmd.GET_RESPONSE, message['request_id'], response)
+
+    def respond_v3(self, device, data, address):
+        """Agente SNMPv3: Report con el motor si el gestor aún no lo conoce; si no, respuesta con su seguridad
+
+        Las peticiones se verifican y descifran con el mismo UsmSecurity del
+        cliente, y la respuesta se firma y cifra con él. Un mensaje con firma
+        incorrecta se descarta, como haría un agente real.
+        """
+        message_id, engine_id = usm_header(data)
+        engine = tmd.EngineState(self.engine_id, 1, int(time.monotonic() - self.start_time))
+        if not engine_id:
+            self.stats['descubrimientos'] += 1
+            self.reporter.engines[address] = engine
+            return self.reporter.encode_request(address, tmd.REPORT, message_id,
+                                                [(tmd.USM_STATS + '4.0', tmd.Counter32(self.stats['descubrimientos']))])
+        try:
+            message = self.usm.decode_response(data, address)
+        except ValueError:
+            self.stats['rechazadas'] += 1
+            return None
+        response = self.answer(device, message)
+        if response is None:
+            return None
+        self.usm.engines[address] = engine
+        return self.usm.encode_request(address, tmd.GET_RESPONSE, message['request_id'], response)
+
+    def answer(self, device, message):
+        """Varbinds de la respuesta a una PDU ya decodificada, o None si no es una consulta"""
+        now = time.monotonic() - self.start_time
+        varbinds = [(oid, tmd.oid_key(oid)) for oid, _ in message['varbinds']]
+        pdu_type = message['pdu_type']
+        if pdu_type == tmd.GET_REQUEST:
+            response = [(oid, self.value(device, key, now) if key in self.template else tmd.NO_SUCH_OBJECT)
+                        for oid, key in varbinds]
+        elif pdu_type == tmd.GET_NEXT_REQUEST:
+            response = [self.next_value(device, key, now) for _, key in varbinds]
+        elif pdu_type == tmd.GET_BULK_REQUEST:
+            non_repeaters = max(0, message['error_status'])
+            repetitions = max(0, message['error_index'])
+            response = [self.next_value(device, key, now) for _, key in varbinds[:non_repeaters]]
+            current = [key for _, key in varbinds[non_repeaters:]]
+            for _ in range(repetitions):
+                row = [self.next_value(device, key, now) for key in current]
+                response.extend(row)
+                current = [tmd.oid_key(oid) for oid, _ in row]
+                if all(value is tmd.END_OF_MIB_VIEW for _, value in row):
+                    break
+        else:
+            return None
+        return response
+
+    def admit(self, device):
+        """Cubo de testigos del agente: indica si le queda capacidad para este paquete"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(device, (self.AGENT_BURST, now))
+        tokens = min(self.AGENT_BURST, tokens + (now - updated) * self.capacity)
+        admitted = tokens >= 1
+        self.buckets[device] = (tokens - admitted, now)
+        return admitted
+
+    def start(self):
+        for device, address in enumerate(self.addresses):
+            if address not in self.alive:
+                continue
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.bind((address, self.port))
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, device)
+            self.sockets.append(sock)
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve(self):
+        delayed = []  # heap de (instante de envío, orden, socket, datos, destino)
+        sequence = itertools.count()
+        while not self.stop_event.is_set():
+            timeout = 0.05
+            if delayed:
+                timeout = max(0, min(timeout, delayed[0][0] - time.monotonic()))
+            for key, _ in self.selector.select(timeout):
+                while True:
+                    try:
+                        data, address = key.fileobj.recvfrom(65535)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    self.stats['peticiones'] += 1
+                    if self.loss and self.random.random() < self.loss:
+                        self.stats['perdidas'] += 1
+                        continue
+                    if self.capacity and not self.admit(key.data):
+                        self.stats['desbordadas'] += 1
+                        continue
+                    try:
+                        response = self.respond(key.data, data, address)
+                    except (ValueError, IndexError):
+                        continue
+                    if response is None:
+                        continue
+                    if self.latency:
+                        heapq.heappush(delayed, (time.monotonic() + self.latency, next(sequence),
+                                                 key.fileobj, response, address))
+                    else:
+                        key.fileobj.sendto(response, address)
+                        self.stats['respuestas'] += 1
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, _, sock, response, address = heapq.heappop(delayed)
+                sock.sendto(response, address)
+                self.stats['respuestas'] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        for sock in self.sockets:
+            self.selector.unregister(sock)
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+def timed_phase(name, function, targets, concurrency, network):
+    """Ejecuta `function(ip)` sobre todos los destinos en paralelo y mide cada dispositivo"""
+    latencies = []
+
+    def run(ip):
+        started = time.perf_counter()
+        result = function(ip)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    requests_before = network.stats['peticiones']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, targets))
+    wall = time.perf_counter() - started
+    return {
+        'fase': name,
+        'ok': sum(1 for result in results if result),
+        'total': len(targets),
+        'tiempo': wall,
+        'peticiones': network.stats['peticiones'] - requests_before,
+        'latencias': latencies,
+    }
+
+def bench_scan(args):
+    """Escaneo completo contra la red simulada: sistema, interfaces y el flujo de main()"""
+    network = SimulatedNetwork(args.dispositivos, args.interfaces, args.latencia, args.perdida,
+                               args.muertos, args.puerto, capacity=args.capacidad,
+                               v3=V3_LEVELS[args.v3] if args.v3 else None)
+    v3 = None
+    security = []
+    if args.v3:
+        user, auth, auth_password, priv_password = V3_LEVELS[args.v3]
+        v3 = tmd.UsmSecurity(user, auth, auth_password, priv_password)
+        security = ['--v3-usuario', user]
+        if auth:
+            security += ['--v3-auth', auth, '--v3-clave-auth', auth_password]
+        if priv_password:
+            security += ['--v3-clave-priv', priv_password]
+    tmd.configure(tmd.SnmpConfig(args.puerto, retries=args.reintentos, v3=v3,
+                                 governor=tmd.RequestGovernor(args.pps or None, args.pps_agente or None,
+                                                              args.en_vuelo or None)))
+    targets = network.addresses
+    results = []
+    with network:
+        results.append(timed_phase('get_system_info',
+                                   lambda ip: tmd.get_system_info(ip, deadline=time.monotonic() + args.limite),
+                                   targets, args.concurrencia, network))
+        results.append(timed_phase('get_interfaces_info',
+                                   lambda ip: tmd.get_interfaces_info(ip, deadline=time.monotonic() + args.limite),
+                                   targets, args.concurrencia, network))
+        profiles = [tmd.PROFILES['host-resources'], tmd.PROFILES['if-extendido']]
+        results.append(timed_phase('get_profile_metrics',
+                                   lambda ip: tmd.get_profile_metrics(ip, 'public', profiles,
+                                                                      time.monotonic() + args.limite),
+                                   targets, args.concurrencia, network))
+
+        requests_before = network.stats['peticiones']
+        quiet = tmd.console.quiet
+        tmd.console.quiet = True
+        started = time.perf_counter()
+        try:
+            tmd.main(['todo', '--ips', *targets, '--puerto', str(args.puerto),
+                      '--concurrencia', str(args.concurrencia), '--limite', str(args.limite),
+                      '--procesos', str(args.procesos), '--reintentos', str(args.reintentos),
+                      '--pps', str(args.pps), '--pps-agente', str(args.pps_agente),
+                      '--en-vuelo', str(args.en_vuelo), *security])
+        finally:
+            tmd.console.quiet = quiet
+        results.append({
+            'fase': f"main() todo, {args.procesos} proc.",
+            'ok': None,
+            'total': len(targets),
+            'tiempo': time.perf_counter() - started,
+            'peticiones': network.stats['peticiones'] - requests_before,
+            'latencias': [],
+        })
+
+    details = f", capacidad {args.capacidad:g} pps por agente" if args.capacidad else ''
+    details += f", SNMPv3 {args.v3}" if args.v3 else ''
+    table = Table(title=f"Red simulada: {args.dispositivos} dispositivos ({args.muertos} muertos), "
+                        f"{args.interfaces} interfaces, latencia {args.latencia * 1000:g} ms, "
+                        f"pérdida {args.perdida:.0%}{details}", header_style="bold blue")
+    for column in ("Fase", "OK", "Tiempo (s)", "Peticiones", "Pet/s", "p50 (ms)", "p95 (ms)", "p99 (ms)"):
+        table.add_column(column, justify="left" if column == "Fase" else "right")
+    for result in results:
+        latencies = result['latencias']
+        table.add_row(
+            result['fase'],
+            'N/A' if result['ok'] is None else f"{result['ok']}/{result['total']}",
+            f"{result['tiempo']:.3f}",
+            str(result['peticiones']),
+            f"{result['peticiones'] / result['tiempo']:,.0f}",
+            *(f"{percentile(latencies, q) * 1000:.1f}" if latencies else 'N/A' for q in (0.50, 0.95, 0.99))
+        )
+    console.print(table)
+    if args.v3:
+        console.print(f"SNMPv3: {network.stats['descubrimientos']} descubrimientos de motor, "
+                      f"{network.stats['rechazadas']} peticiones rechazadas por el agente")
+    if args.capacidad:
+        console.print(f"Paquetes descartados por agentes desbordados: "
+                      f"[bold cyan]{network.stats['desbordadas']}[/bold cyan]")
+
+def main():
+    parser = argparse.ArgumentParser(description='Pruebas de rendimiento del monitor SNMP')
+    parser.add_argument('prueba', choices=['parser', 'escaneo', 'tasas', 'memoria', 'panel'],
+                       help='Qué medir (parser: parseo de la salida de snmpbulkwalk; '
+                            'escaneo: escaneo completo contra agentes simulados; '
+                            'tasas: cálculo de tasas y utilización de la flota; '
+                            'memoria: memoria del modelo de dispositivos e interfaces; '
+                            'panel: tabla completa frente a una página del panel en vivo)')
+    parser.add_argument('--filas', type=int, default=10000,
+                       help='Parser: interfaces simuladas en la salida del walk (por defecto: 10000)')
+    parser.add_argument('--repeticiones', type=int, default=5,
+                       help='Parser, tasas y panel: repeticiones de cada medida (por defecto: 5)')
+    parser.add_argument('--dispositivos', type=int, default=100,
+                       help='Escaneo, tasas, memoria y panel: dispositivos simulados (por defecto: 100)')
+    parser.add_argument('--interfaces', type=int, default=24,
+                       help='Escaneo, tasas, memoria y panel: interfaces por dispositivo (por defecto: 24)')
+    parser.add_argument('--latencia', type=float, default=0.005,
+                       help='Escaneo: latencia de cada respuesta en segundos (por defecto: 0.005)')
+    parser.add_argument('--perdida', type=float, default=0.0,
+                       help='Escaneo: fracción de peticiones descartadas (por defecto: 0)')
+    parser.add_argument('--muertos', type=int, default=0,
+                       help='Escaneo: dispositivos adicionales que nunca responden (por defecto: 0)')
+    parser.add_argument('--puerto', type=int, default=16100,
+                       help='Escaneo: puerto UDP de los agentes simulados (por defecto: 16100)')
+    parser.add_argument('--capacidad', type=float,
+                       help='Escaneo: paquetes por segundo que atiende cada agente antes de descartar '
+                            '(por defecto: sin límite)')
+    parser.add_argument('--v3', choices=list(V3_LEVELS),
+                       help='Escaneo: agentes y cliente en SNMPv3 con este nivel de seguridad '
+                            '(por defecto: v2c con comunidad)')
+    parser.add_argument('--reintentos', type=int, default=tmd.SNMP_RETRIES,
+                       help=f'Escaneo: reenvíos de cada petición (por defecto: {tmd.SNMP_RETRIES})')
+    parser.add_argument('--pps', type=float, default=0,
+                       help='Escaneo: presupuesto global de paquetes por segundo (por defecto: sin límite)')
+    parser.add_argument('--pps-agente', type=float, default=tmd.AGENT_PPS,
+                       help=f'Escaneo: paquetes por segundo a cada agente, 0 sin límite (por defecto: {tmd.AGENT_PPS})')
+    parser.add_argument('--en-vuelo', type=int, default=0,
+                       help='Escaneo: peticiones en vuelo como máximo (por defecto: sin límite)')
+    parser.add_argument('--concurrencia', type=int, default=32,
+                       help='Escaneo: dispositivos consultados en paralelo (por defecto: 32)')
+    parser.add_argument('--procesos', type=int, default=1,
+                       help='Escaneo: procesos trabajadores de la fase main() (por defecto: 1)')
+    parser.add_argument('--limite', type=float, default=10,
+                       help='Escaneo: tiempo máximo por dispositivo en segundos (por defecto: 10)')
+
+    args = parser.parse_args()
+
+    if args.prueba == 'parser':
+        bench_parser(args.filas, args.repeticiones)
+    elif args.prueba == 'escaneo':
+        bench_scan(args)
+    elif args.prueba == 'tasas':
+        bench_rates(args.dispositivos, args.interfaces, args.repeticiones)
+    elif args.prueba == 'memoria':
+        bench_memory(args.dispositivos, args.interfaces)
+    elif args.prueba == 'panel':
+        bench_panel(args.dispositivos, args.interfaces, args.repeticiones)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import threading
+import types
+
+import pytest
+
+import tmd
+from benchmark import SimulatedNetwork
+
+IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+
+# --- Codificación BER ---
+
+@pytest.mark.parametrize('value', [
+    0, 1, -1, 127, 128, -128, -129, 255, 256, 2 ** 31 - 1, -2 ** 31,
+    b'', b'eth0', b'x' * 300,
+    tmd.Counter32(0), tmd.Counter32(2 ** 32 - 1), tmd.Gauge32(1_000_000_000),
+    tmd.TimeTicks(8640000), tmd.Counter64(2 ** 64 - 1),
+    tmd.ObjectIdentifier('1.3.6.1.4.1.8072.3.2.10'), tmd.ObjectIdentifier('2.999.4294967295'),
+    tmd.IpAddress('192.0.2.1'),
+    tmd.NULL, tmd.NO_SUCH_OBJECT, tmd.NO_SUCH_INSTANCE, tmd.END_OF_MIB_VIEW,
+])
+def test_message_round_trip(value):
+    """Cada tipo de valor sobrevive a codificar y decodificar un mensaje completo"""
+    oid = '1.3.6.1.2.1.2.2.1.10.1'
+    data = tmd.encode_message(b'public', tmd.GET_RESPONSE, 4242, [(oid, value)])
+    message = tmd.decode_message(data)
+    assert message['community'] == b'public'
+    assert message['pdu_type'] == tmd.GET_RESPONSE
+    assert message['request_id'] == 4242
+    assert message['error_status'] == 0
+    [(decoded_oid, decoded)] = message['varbinds']
+    assert decoded_oid == oid
+    assert decoded == value
+    assert type(decoded) is type(value)
+    if isinstance(value, tmd.SnmpNull):
+        assert decoded is value
+
+def test_message_header_round_trip():
+    """La versión, el error y los varbinds largos (longitud en varios octetos) se conservan"""
+    varbinds = [(f"{IF_DESCR}.{index}", f"GigabitEthernet0/{index}".encode()) for index in range(1, 40)]
+    data = tmd.encode_message(b'secreta', tmd.GET_RESPONSE, 0x7FFFFFFF, varbinds,
+                              error_status=2, error_index=3, version=0)
+    assert len(data) > 255
+    assert tmd.message_version(data) == 0
+    message = tmd.decode_message(data)
+    assert message['version'] == 0
+    assert (message['error_status'], message['error_index']) == (2, 3)
+    assert message['varbinds'] == varbinds
+
+def test_truncated_message_is_rejected():
+    data = tmd.encode_message(b'public', tmd.GET_RESPONSE, 1, [(IF_DESCR + '.1', b'eth0')])
+    with pytest.raises((ValueError, IndexError)):
+        tmd.decode_message(data[:-3])
+
+# --- Claves USM (RFC 3414, apéndice A.3) ---
+
+ENGINE_ID = bytes.fromhex('000000000000000000000002')
+
+@pytest.mark.parametrize('hash_name, key, localized', [
+    ('md5', '9faf3283884e92834ebc9847d8edd963', '526f5eed9fcce26f8964c2930787d82b'),
+    ('sha1', '9fb5cc0381497b3793528939ff788d5d79145211', '6695febc9288e36282235fc7151f128497b38f3f'),
+])
+def test_localize_key_rfc3414_vectors(hash_name, key, localized):
+    assert tmd.password_to_key('maplesyrup', hash_name).hex() == key
+    assert tmd.localize_key('maplesyrup', ENGINE_ID, hash_name).hex() == localized
+
+# --- Recorrido de tablas con GETBULK ---
+
+class ScriptedClient(tmd.SnmpClient):
+    """Cliente que responde a cada GETBULK con la siguiente respuesta preparada"""
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, target, community, pdu_type, varbinds, *args):
+        self.requests.append([oid for oid, _ in varbinds])
+        return self.responses.pop(0)
+
+def test_get_table_stops_at_end_of_mib():
+    client = ScriptedClient([
+        [(f"{IF_DESCR}.1", b'lo'), (f"{IF_DESCR}.2", b'eth0'), (f"{IF_DESCR}.2", tmd.END_OF_MIB_VIEW)],
+    ])
+    try:
+        rows = client.get_table('192.0.2.1', 'public', [IF_DESCR], max_repetitions=3)
+    finally:
+        client.close()
+    assert rows == {'1': {IF_DESCR: b'lo'}, '2': {IF_DESCR: b'eth0'}}
+    assert len(client.requests) == 1
+
+def test_get_table_stops_on_non_increasing_oid():
+    """Un agente que repite o retrocede el OID no deja el recorrido en bucle"""
+    client = ScriptedClient([
+        [(f"{IF_DESCR}.1", b'lo'), (f"{IF_DESCR}.2", b'eth0')],
+        [(f"{IF_DESCR}.2", b'eth0'), (f"{IF_DESCR}.1", b'lo')],
+    ])
+    try:
+        rows = client.get_table('192.0.2.1', 'public', [IF_DESCR], max_repetitions=2)
+    finally:
+        client.close()
+    assert rows == {'1': {IF_DESCR: b'lo'}, '2': {IF_DESCR: b'eth0'}}
+    assert client.requests == [[IF_DESCR], [f"{IF_DESCR}.2"]]
+
+def test_get_table_drops_each_column_when_it_leaves_its_subtree():
+    status = '1.3.6.1.2.1.2.2.1.8'
+    client = ScriptedClient([
+        [(f"{IF_DESCR}.1", b'lo'), (f"{status}.1", 1),
+         (f"{IF_DESCR}.2", b'eth0'), (f"{status}.2", 2),
+         ('1.3.6.1.2.1.2.2.1.3.1', 24), (f"{status}.3", 1)],
+        [(f"{status}.4", 1), (f"{status}.4", tmd.END_OF_MIB_VIEW)],
+    ])
+    try:
+        rows = client.get_table('192.0.2.1', 'public', [IF_DESCR, status], max_repetitions=3)
+    finally:
+        client.close()
+    assert rows == {'1': {IF_DESCR: b'lo', status: 1}, '2': {IF_DESCR: b'eth0', status: 2},
+                    '3': {status: 1}, '4': {status: 1}}
+    assert client.requests[1] == [f"{status}.3"]
+
+def test_get_table_against_simulated_agent():
+    with SimulatedNetwork(devices=1, interfaces=30, port=16390) as network:
+        client = tmd.SnmpClient(tmd.SnmpConfig(port=16390))
+        try:
+            rows = client.get_table(network.addresses[0], 'public', [IF_DESCR], max_repetitions=7)
+        finally:
+            client.close()
+    assert sorted(rows, key=int) == [str(index) for index in range(1, 31)]
+
+# --- Cálculo de tasas ---
+
+def counters(in_octets, out_octets, bits=64, speed=1_000_000_000):
+    return {'1': tmd.Interface('1', 'eth0', in_octets=in_octets, out_octets=out_octets,
+                               in_errors=0, out_errors=0, counter_bits=bits, speed=speed)}
+
+@pytest.fixture
+def rates():
+    pytest.importorskip('numpy')
+    return tmd.RateEngine()
+
+def test_rates_first_sample_has_no_rate(rates):
+    rates.observe('192.0.2.1', counters(1000, 2000), uptime=100, timestamp=0)
+    assert rates.compute() == 0
+    assert rates.current() == {}
+
+def test_rates_plain_difference(rates):
+    rates.observe('192.0.2.1', counters(1000, 2000), uptime=100, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(11000, 4000), uptime=1100, timestamp=10)
+    assert rates.compute() == 1
+    in_bps, out_bps, utilization = rates.current()[('192.0.2.1', '1')]
+    assert (in_bps, out_bps) == (8000.0, 1600.0)
+    assert utilization == pytest.approx(0.0008, abs=1e-3)
+
+def test_rates_32_bit_wrap(rates):
+    """Una vuelta de un contador de 32 bits se descuenta con la máscara"""
+    rates.observe('192.0.2.1', counters(2 ** 32 - 1000, 0, bits=32), uptime=100, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(1000, 0, bits=32), uptime=1100, timestamp=10)
+    assert rates.compute() == 1
+    assert rates.current()[('192.0.2.1', '1')][0] == 1600.0
+
+def test_rates_impossible_32_bit_wrap_is_a_reset(rates):
+    """Una vuelta que supera la velocidad del enlace es una puesta a cero, no tráfico"""
+    rates.observe('192.0.2.1', counters(2 ** 31, 0, bits=32, speed=10_000_000), uptime=100, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(10, 0, bits=32, speed=10_000_000), uptime=1100, timestamp=10)
+    assert rates.compute() == 0
+    assert rates.current() == {}
+
+def test_rates_64_bit_decrease_is_a_reset(rates):
+    rates.observe('192.0.2.1', counters(10 ** 12, 10 ** 12), uptime=100, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(500, 500), uptime=1100, timestamp=10)
+    assert rates.compute() == 0
+    # La muestra tras la puesta a cero sirve de base para la siguiente
+    rates.observe('192.0.2.1', counters(1500, 500), uptime=2100, timestamp=20)
+    assert rates.compute() == 1
+    assert rates.current()[('192.0.2.1', '1')][:2] == (800.0, 0.0)
+
+def test_rates_reboot_invalidates_sample(rates):
+    rates.observe('192.0.2.1', counters(1000, 1000), uptime=500000, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(5000, 5000), uptime=300, timestamp=10)
+    assert rates.compute() == 0
+
+def test_rates_counter_width_change_invalidates_sample(rates):
+    rates.observe('192.0.2.1', counters(1000, 1000, bits=32), uptime=100, timestamp=0)
+    rates.compute()
+    rates.observe('192.0.2.1', counters(5000, 5000, bits=64), uptime=1100, timestamp=10)
+    assert rates.compute() == 0
+
+# --- Historial de contadores ---
+
+def test_counter_store_reopen_keeps_samples(tmp_path):
+    path = str(tmp_path / 'historial.bin')
+    store = tmd.CounterStore(path, capacity=4, max_series=8)
+    interface = types.SimpleNamespace(in_octets=0, out_octets=0, counter_bits=32)
+    for second in range(6):
+        interface.in_octets, interface.out_octets = 100 * second, 10 * second
+        store.record('192.0.2.1', {'3': interface}, timestamp=float(second))
+    store.close()
+
+    store = tmd.CounterStore(path, capacity=4, max_series=8)
+    try:
+        assert len(store) == 1
+        assert store.series[('192.0.2.1', '3')].counter_bits == 32
+        # La capacidad es 4: solo quedan las cuatro últimas muestras, en orden
+        assert store.samples('192.0.2.1', '3') == [(float(s), 100 * s, 10 * s) for s in range(2, 6)]
+        assert store.append('192.0.2.2', '1', 7.0, 1, 2)
+    finally:
+        store.close()
+
+def test_counter_store_reopen_keeps_stored_size(tmp_path):
+    path = str(tmp_path / 'historial.bin')
+    tmd.CounterStore(path, capacity=4, max_series=2).close()
+    store = tmd.CounterStore(path, capacity=100, max_series=50)
+    try:
+        assert (store.capacity, store.max_series) == (4, 2)
+    finally:
+        store.close()
+
+def test_counter_store_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'otro.bin'
+    path.write_bytes(b'NOTMINE!' + bytes(64))
+    with pytest.raises(ValueError, match='no es un fichero de historial'):
+        tmd.CounterStore(str(path))
+
+def test_counter_store_drops_series_when_full():
+    store = tmd.CounterStore(capacity=2, max_series=1)
+    assert store.append('192.0.2.1', '1', 0.0, 1, 1)
+    assert not store.append('192.0.2.1', '2', 0.0, 1, 1)
+    assert store.dropped['historial lleno'] == 1
+
+def test_counter_store_rejects_truncated_file(tmp_path):
+    path = tmp_path / 'historial.bin'
+    tmd.CounterStore(str(path), capacity=4, max_series=8).close()
+    path.write_bytes(path.read_bytes()[:200])
+    with pytest.raises(ValueError, match='truncado'):
+        tmd.CounterStore(str(path), capacity=4, max_series=8)
+
+def test_rates_readers_see_whole_cycles(rates):
+    """Las lecturas concurrentes con compute() nunca ven un ciclo a medias"""
+    interfaces = {str(index): tmd.Interface(str(index), in_octets=0, out_octets=0, counter_bits=64,
+                                             speed=1_000_000_000) for index in range(500)}
+    stop = threading.Event()
+    seen = []
+
+    def reader():
+        while not stop.is_set():
+            seen.append(len({sample[0] for sample in rates.current().values()}))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for cycle in range(1, 60):
+            for interface in interfaces.values():
+                interface.in_octets = cycle * cycle * 1000
+            rates.observe('192.0.2.1', interfaces, timestamp=cycle)
+            rates.compute()
+    finally:
+        stop.set()
+        thread.join()
+    # Todas las interfaces tienen el mismo tráfico en cada ciclo
+    assert set(seen) <= {0, 1}
+
+# --- Traps ---
+
+def test_trap_matches_targets_given_by_name():
+    """Un trap de 127.0.0.1 afecta al destino vigilado como localhost:puerto"""
+    scheduler = tmd.PollScheduler(['localhost:16161', '192.0.2.7'], interval=60, jitter=0)
+    try:
+        scheduler.interfaces['localhost:16161'] = {'2': tmd.Interface('2', 'eth0', oper_status=1)}
+        changes = scheduler.handle_trap({'ip': '127.0.0.1', 'if_index': '2', 'status': 'Down',
+                                         'event': 'linkDown'})
+        assert changes == [('2', 'eth0', 'Up', 'Down')]
+        assert scheduler.interfaces['localhost:16161']['2'].status == 'Down'
+        assert scheduler.handle_trap({'ip': '198.51.100.1', 'if_index': '2', 'status': 'Down',
+                                      'event': 'linkDown'}) is None
+    finally:
+        scheduler.pool.shutdown()
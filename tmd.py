@@ -1,31 +1,111 @@
 import subprocess
-from rich.console import Console
-from rich.table import Table
 import time
 import re
 import argparse
+import bisect
+import collections
+import contextlib
+import csv
+import fnmatch
+import functools
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import itertools
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import select
+import selectors
+import socket
+import socketserver
+import sqlite3
+import stat
+import struct
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-console = Console()
+MARKUP_TAG = re.compile(r'\[/?[a-z]+(?: [a-z]+)*\]')
+
+class PlainConsole:
+    """Consola mínima sin Rich: escribe el texto sin etiquetas de estilo"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.quiet = False
+
+    def print(self, *objects, sep=' ', end='\n', **kwargs):
+        if self.quiet:
+            return
+        self.stream.write(MARKUP_TAG.sub('', sep.join(str(obj) for obj in objects)) + end)
+        self.stream.flush()
+
+class LazyConsole:
+    """Consola que solo importa Rich la primera vez que se usa
+
+    En los formatos jsonl/csv se cambia por una PlainConsole sobre stderr,
+    así que Rich ni siquiera se llega a importar.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, '_target', None)
+
+    def _console(self):
+        if self._target is None:
+            from rich.console import Console
+            object.__setattr__(self, '_target', Console())
+        return self._target
+
+    def use(self, target):
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        return getattr(self._console(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._console(), name, value)
+
+console = LazyConsole()
+
+NON_HEX = re.compile(r'[^0-9A-Fa-f]')
+TICKS_IN_PARENS = re.compile(r'\((\d+)\)')
+TRAILING_NUMBER = re.compile(r'(\d+)\s*$')
 
 def clean_snmp_output(output):
     """Limpia la salida SNMP eliminando tipos y comillas"""
+    if isinstance(output, TimeTicks):
+        return format_uptime(output)
+    if isinstance(output, int):
+        return str(output)
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+        return output.strip() or "N/A"
     if not output:
         return "N/A"
     
+    if output.startswith('Timeticks: ('):
+        return format_uptime(output)
+    
     if ': ' in output:
         output = output.split(': ', 1)[1]
     
     output = output.replace('\"', '').strip()
-
-    if output.startswith('Timeticks: ('):
-        return format_uptime(output)
     
     return output if output else "N/A"
 
 def clean_mac_address(mac):
     """Limpia y formatea correctamente una dirección MAC"""
+    if isinstance(mac, bytes):
+        return ':'.join(f'{byte:02x}' for byte in mac)
     # Eliminar todos los caracteres no hexadecimales
-    clean_mac = re.sub(r'[^0-9A-Fa-f]', '', mac)
+    clean_mac = NON_HEX.sub('', mac)
     # Formatear en pares de caracteres separados por :
     if len(clean_mac) == 12:  # Longitud correcta para MAC
         return ':'.join([clean_mac[i:i+2] for i in range(0, 12, 2)]).lower()
@@ -34,7 +114,9 @@ def clean_mac_address(mac):
 def format_uptime(ticks):
     """Formatea los ticks de uptime a días/horas/minutos"""
     try:
-        ticks = int(re.search(r'\((\d+)\)', ticks).group(1)) // 100
+        if not isinstance(ticks, int):
+            ticks = int(TICKS_IN_PARENS.search(ticks).group(1))
+        ticks //= 100
         days = ticks // (24*3600)
         hours = (ticks % (24*3600)) // 3600
         minutes = (ticks % 3600) // 60
@@ -42,98 +124,2297 @@ def format_uptime(ticks):
     except:
         return ticks
 
+def remaining_time(deadline, timeout):
+    """Devuelve el timeout a usar sin sobrepasar el límite absoluto del dispositivo"""
+    if deadline is None:
+        return timeout
+    return max(0, min(timeout, deadline - time.monotonic()))
+
+# --- Métricas de rendimiento (--perfil) ---
+
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRIC_HELP = {
+    'ping': 'Duración de cada ping ICMP',
+    'snmp_request': 'Duración de cada petición SNMP, reintentos incluidos',
+    'walk': 'Duración de cada recorrido de tabla (GETBULK/GETNEXT o snmpbulkwalk)',
+    'parse': 'Tiempo de decodificación de respuestas (BER o salida de net-snmp)',
+    'clean': 'Tiempo de limpieza y formateo de valores',
+    'render': 'Tiempo de renderizado de tablas con Rich',
+    'rates': 'Tiempo de cálculo de las tasas de todas las interfaces de un ciclo',
+    'stage': 'Duración de cada etapa del escaneo por dispositivo',
+    'device_seconds': 'Segundos acumulados por dispositivo y etapa',
+    'snmp_timeouts': 'Peticiones SNMP sin respuesta a tiempo',
+    'snmp_retries': 'Reenvíos de peticiones SNMP',
+    'snmp_rtt': 'RTT medido de las respuestas SNMP sin reenvíos',
+    'snmp_breaker_rejections': 'Peticiones descartadas por agentes cortocircuitados',
+    'governor_wait': 'Espera de cada paquete SNMP hasta tener turno en el limitador de ritmo',
+    'snmp_governor_rejections': 'Peticiones no enviadas por no tener turno o hueco a tiempo',
+    'snmp_backoffs': 'Pérdidas que han reducido a la mitad el ritmo de un agente',
+    'snmp_v3_reports': 'Reports SNMPv3 recibidos (descubrimiento, desfase de reloj o errores de seguridad)',
+    'snmp_bytes_sent': 'Bytes SNMP enviados',
+    'snmp_bytes_received': 'Bytes SNMP recibidos',
+    'history_dropped': 'Muestras descartadas del historial de contadores por no caber su serie',
+}
+
+def metric_value(value):
+    """Valor exacto de una métrica: los enteros tal cual y los reales con todas sus cifras"""
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+class Metrics:
+    """Histogramas de tiempos y contadores del escaneo, exportables a JSON y a Prometheus
+
+    Mientras está desactivado, observe() y count() vuelven enseguida, así que
+    la instrumentación de los caminos calientes apenas cuesta.
+    """
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.enabled = False
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {}  # (nombre, etiquetas) -> [cuentas por cubeta + Inf, suma, máximo]
+        self.counters = collections.Counter()  # (nombre, etiquetas) -> total
+
+    def observe(self, name, seconds, **labels):
+        """Añade una duración al histograma `name`"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+            histogram[0][position] += 1
+            histogram[1] += seconds
+            histogram[2] = max(histogram[2], seconds)
+
+    def count(self, name, amount=1, **labels):
+        """Suma `amount` al contador `name`"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        """Mide la duración del bloque en el histograma `name`"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def to_json(self):
+        """Estado actual como diccionario serializable, con cubetas acumuladas"""
+        with self.lock:
+            histograms = [{
+                'name': name,
+                'labels': dict(labels),
+                'count': sum(counts),
+                'sum': total,
+                'max': maximum,
+                'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'],
+                                    itertools.accumulate(counts))),
+            } for (name, labels), (counts, total, maximum) in sorted(self.histograms.items())]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {'histograms': histograms, 'counters': counters}
+
+    def to_prometheus(self):
+        """Estado actual en el formato de exposición de texto de Prometheus"""
+        def series(name, labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return name
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                       for _, value in pairs)
+            return name + '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        data = self.to_json()
+        lines = []
+        described = set()
+        for histogram in data['histograms']:
+            name = f"tmd_{histogram['name']}_seconds"
+            labels = tuple(histogram['labels'].items())
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(histogram['name'], histogram['name'])}")
+                lines.append(f"# TYPE {name} histogram")
+            for bound, cumulative in histogram['buckets'].items():
+                lines.append(f"{series(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{series(name + '_sum', labels)} {histogram['sum']:.6f}")
+            lines.append(f"{series(name + '_count', labels)} {histogram['count']}")
+        for counter in data['counters']:
+            name = f"tmd_{counter['name']}_total"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(counter['name'], counter['name'])}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{series(name, tuple(counter['labels'].items()))} {metric_value(counter['value'])}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """Escribe las métricas en JSON si el fichero acaba en .json y si no en texto de Prometheus"""
+        if path.endswith('.json'):
+            content = json.dumps(self.to_json(), indent=2, ensure_ascii=False)
+        else:
+            content = self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+
+    def snapshot(self):
+        """Estado en bruto, serializable, para unirlo al de otro proceso con merge()"""
+        with self.lock:
+            return {
+                'histograms': [[name, labels, counts, total, maximum]
+                               for (name, labels), (counts, total, maximum) in self.histograms.items()],
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+            }
+
+    def merge(self, snapshot):
+        """Suma las métricas de otro proceso"""
+        with self.lock:
+            for name, labels, counts, total, maximum in snapshot['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] = max(histogram[2], maximum)
+            for name, labels, value in snapshot['counters']:
+                self.counters[(name, tuple(tuple(pair) for pair in labels))] += value
+
+    def report(self):
+        """Líneas con el resumen de cada histograma, agregando los dispositivos"""
+        summary = {}
+        with self.lock:
+            for (name, labels), (counts, total, maximum) in self.histograms.items():
+                label = ','.join(f"{key}={value}" for key, value in labels if key != 'ip')
+                entry = summary.setdefault(f"{name}{'{' + label + '}' if label else ''}", [0, 0.0, 0.0])
+                entry[0] += sum(counts)
+                entry[1] += total
+                entry[2] = max(entry[2], maximum)
+            totals = collections.Counter()
+            for (name, labels), value in self.counters.items():
+                if name != 'device_seconds':
+                    totals[name] += value
+        lines = [f"  {name:<26} {count:>5} x {total:6.3f} s, media {total / count * 1000:6.2f} ms, "
+                 f"máx {maximum * 1000:6.1f} ms"
+                 for name, (count, total, maximum) in sorted(summary.items())]
+        lines += [f"  {name:<26} {metric_value(value):>6}" for name, value in sorted(totals.items())]
+        return lines
+
+METRICS = Metrics()
+
+# --- Timeouts adaptativos por agente ---
+
+MIN_RTO = 0.1      # segundos
+MAX_RTO = 5.0
+INITIAL_RTO = 1.0  # hasta tener la primera medida del agente
+MAX_BACKOFF = 8
+SNMP_RETRIES = 2   # reenvíos como máximo de cada petición
+BREAKER_THRESHOLD = 3  # peticiones seguidas sin respuesta que abren el cortocircuito
+BREAKER_COOLDOWN = 30
+BREAKER_MAX_COOLDOWN = 300
+
+class HostTiming:
+    """RTT suavizado y estado del cortocircuito de un agente"""
+    __slots__ = ('srtt', 'rttvar', 'backoff', 'failures', 'open_until', 'cooldown', 'probing')
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.backoff = 1
+        self.failures = 0
+        self.open_until = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probing = False
+
+class AdaptiveTimeouts:
+    """Timeout de cada agente calculado a partir de su RTT, como el RTO de TCP (RFC 6298)
+
+    Solo se miden las respuestas a peticiones que no se reenviaron (algoritmo
+    de Karn). Tras BREAKER_THRESHOLD peticiones seguidas sin respuesta el
+    agente queda cortocircuitado y sus peticiones fallan al instante; cuando
+    vence la espera se deja pasar una sola de prueba, y si también falla la
+    espera se duplica.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostTiming()
+        return state
+
+    def rto(self, host):
+        """Timeout de la primera transmisión de una petición al agente"""
+        with self.lock:
+            state = self._host(host)
+            if state.srtt is None:
+                base = INITIAL_RTO
+            else:
+                base = max(MIN_RTO, state.srtt + 4 * state.rttvar)
+            return min(MAX_RTO, base * state.backoff)
+
+    def attempt_timeouts(self, host, budget, retries):
+        """Espera de cada transmisión, duplicándose en cada reenvío sin pasar de `budget`"""
+        rto = self.rto(host)
+        waits = []
+        for attempt in range(retries + 1):
+            wait = min(rto * 2 ** attempt, budget)
+            if wait <= 0:
+                break
+            waits.append(wait)
+            budget -= wait
+        return waits
+
+    def sample(self, host, rtt):
+        """Incorpora el RTT medido de una respuesta sin reenvíos"""
+        METRICS.observe('snmp_rtt', rtt)
+        with self.lock:
+            state = self._host(host)
+            if state.srtt is None:
+                state.srtt = rtt
+                state.rttvar = rtt / 2
+            else:
+                state.rttvar = (1 - self.BETA) * state.rttvar + self.BETA * abs(state.srtt - rtt)
+                state.srtt = (1 - self.ALPHA) * state.srtt + self.ALPHA * rtt
+            state.backoff = 1
+
+    def allow(self, host):
+        """Indica si se puede enviar una petición al agente o está cortocircuitado"""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or state.failures < BREAKER_THRESHOLD:
+                return True
+            if time.monotonic() < state.open_until or state.probing:
+                METRICS.count('snmp_breaker_rejections')
+                return False
+            state.probing = True  # Medio abierto: solo una petición de prueba
+            return True
+
+    def release(self, host):
+        """La petición que allow() dejó pasar no llegó a enviarse: libera la prueba sin contarla"""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is not None:
+                state.probing = False
+
+    def success(self, host):
+        with self.lock:
+            state = self._host(host)
+            state.failures = 0
+            state.probing = False
+            state.cooldown = BREAKER_COOLDOWN
+
+    def failure(self, host):
+        with self.lock:
+            state = self._host(host)
+            state.failures += 1
+            state.backoff = min(MAX_BACKOFF, state.backoff * 2)
+            if state.failures >= BREAKER_THRESHOLD:
+                if state.probing:
+                    state.cooldown = min(BREAKER_MAX_COOLDOWN, state.cooldown * 2)
+                state.open_until = time.monotonic() + state.cooldown
+                state.probing = False
+
+    def failing_hosts(self):
+        """Agentes cuya última petición se quedó sin respuesta"""
+        with self.lock:
+            return [host for host, state in self.hosts.items() if state.failures]
+
+    def open_hosts(self):
+        """Agentes con el cortocircuito abierto en este momento"""
+        now = time.monotonic()
+        with self.lock:
+            return [host for host, state in self.hosts.items()
+                    if state.failures >= BREAKER_THRESHOLD and state.open_until > now]
+
+TIMEOUTS = AdaptiveTimeouts()
+
+# --- Limitador de peticiones (--pps, --pps-agente, --en-vuelo) ---
+
+AGENT_PPS = 200        # paquetes por segundo a cada agente mientras no pierde ninguno
+AGENT_BURST = 2        # paquetes seguidos que admite un agente que estaba en reposo
+MIN_AGENT_PPS = 2      # suelo del frenado por pérdidas
+RECOVERY_STEP = 0.05   # fracción del ritmo base que recupera un agente con cada respuesta limpia
+
+class TokenBucket:
+    """Cubo de testigos: `rate` paquetes por segundo con una reserva de hasta `burst`"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        """Aparta un testigo y devuelve cuánto hay que esperar a que esté disponible
+
+        El saldo puede quedar negativo: cada hilo se lleva su turno y los
+        siguientes esperan detrás, sin sondear el cubo en bucle.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0, -self.tokens / self.rate)
+
+    def refund(self):
+        self.tokens += 1
+
+class RequestGovernor:
+    """Ritmo de envío de paquetes SNMP: presupuesto global, cubo por agente y tope de peticiones en vuelo
+
+    Cada paquete, reenvíos incluidos, gasta un testigo del cubo global
+    (`pps`) y otro del cubo de su agente, identificado por su dirección
+    (IP, puerto) como en AdaptiveTimeouts. Cuando se pierde una petición
+    (hay que reenviarla o no llega respuesta) el ritmo de ese agente se
+    reduce a la mitad, y cada respuesta sin reenvíos le devuelve una parte
+    del ritmo base, como el control de congestión de TCP. Así un agente
+    débil que descarta ráfagas se frena solo sin frenar al resto. `in_flight`
+    limita las peticiones sin terminar de todo el proceso.
+    """
+
+    def __init__(self, pps=None, agent_pps=AGENT_PPS, in_flight=None, agent_burst=AGENT_BURST):
+        self.pps = pps
+        self.agent_pps = agent_pps
+        self.agent_burst = agent_burst
+        self.in_flight = in_flight
+        self.lock = threading.Lock()
+        self.bucket = TokenBucket(pps, max(1, pps / 10)) if pps else None
+        self.agents = {}
+        self.slots = threading.BoundedSemaphore(in_flight) if in_flight else None
+
+    def settings(self, parts=1):
+        """Parámetros del limitador para repetirlo en otro proceso, con los topes globales entre `parts`
+
+        Los cubos por agente no se reparten: cada agente lo consulta un solo proceso.
+        """
+        return {'pps': self.pps and self.pps / parts, 'agent_pps': self.agent_pps,
+                'in_flight': self.in_flight and max(1, self.in_flight // parts), 'agent_burst': self.agent_burst}
+
+    def _agent(self, host):
+        bucket = self.agents.get(host)
+        if bucket is None:
+            bucket = self.agents[host] = TokenBucket(self.agent_pps, self.agent_burst)
+        return bucket
+
+    def pace(self, host, deadline=None):
+        """Espera turno para enviar un paquete al agente; devuelve False si no llega antes de `deadline`
+
+        Con `host` None solo se gasta del presupuesto global.
+        """
+        if self.bucket is None and not self.agent_pps:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            agent = self._agent(host) if self.agent_pps and host is not None else None
+            wait = max(self.bucket.reserve(now) if self.bucket else 0, agent.reserve(now) if agent else 0)
+            if deadline is not None and now + wait > deadline:
+                for bucket in (self.bucket, agent):
+                    if bucket is not None:
+                        bucket.refund()
+                METRICS.count('snmp_governor_rejections')
+                return False
+        if wait > 0:
+            METRICS.observe('governor_wait', wait)
+            time.sleep(wait)
+        return True
+
+    @contextlib.contextmanager
+    def admit(self, host, timeout):
+        """Ocupa un hueco de las peticiones en vuelo y espera turno para el primer paquete
+
+        Da False si no hay hueco o turno en `timeout` segundos; la petición
+        entonces no se envía y cuenta como sin respuesta.
+        """
+        deadline = time.monotonic() + timeout
+        if self.slots is not None and not self.slots.acquire(timeout=max(0, timeout)):
+            METRICS.count('snmp_governor_rejections')
+            yield False
+            return
+        try:
+            yield self.pace(host, deadline)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+
+    def loss(self, host):
+        """Una petición al agente se ha perdido: reduce su ritmo a la mitad"""
+        if not self.agent_pps:
+            return
+        with self.lock:
+            bucket = self._agent(host)
+            bucket.rate = max(MIN_AGENT_PPS, bucket.rate / 2)
+            bucket.burst = max(1, min(bucket.burst, bucket.rate / 2))
+        METRICS.count('snmp_backoffs')
+
+    def delivered(self, host):
+        """Respuesta sin reenvíos: el agente recupera poco a poco su ritmo base"""
+        if not self.agent_pps:
+            return
+        with self.lock:
+            bucket = self.agents.get(host)
+            if bucket is not None and bucket.rate < self.agent_pps:
+                bucket.rate = min(self.agent_pps, bucket.rate + self.agent_pps * RECOVERY_STEP)
+                bucket.burst = min(self.agent_burst, max(bucket.burst, bucket.rate / 2))
+
+    def throttled(self):
+        """Agentes que van ahora por debajo de su ritmo base, con el ritmo que llevan"""
+        with self.lock:
+            return {host: bucket.rate for host, bucket in self.agents.items() if bucket.rate < self.agent_pps}
+
+# --- SNMPv3 (USM, RFC 3414 y RFC 3826) ---
+
+REPORT = 0xA8
+V3_MAX_SIZE = 65507
+V3_AUTH_PROTOCOLS = {  # nombre -> (hash, bytes de la firma truncada)
+    'MD5': ('md5', 12),
+    'SHA': ('sha1', 12),
+    'SHA256': ('sha256', 24),
+}
+USM_STATS = '1.3.6.1.6.3.15.1.1.'
+USM_REPORTS = {
+    USM_STATS + '1.0': 'unsupportedSecLevels',
+    USM_STATS + '2.0': 'notInTimeWindows',
+    USM_STATS + '3.0': 'unknownUserNames',
+    USM_STATS + '4.0': 'unknownEngineIDs',
+    USM_STATS + '5.0': 'wrongDigests',
+    USM_STATS + '6.0': 'decryptionErrors',
+}
+
+@functools.lru_cache(maxsize=None)
+def load_aes():
+    """Importa AES-CFB de cryptography al primer uso; None si el paquete no está instalado"""
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+    except ImportError:  # Solo hace falta para el cifrado de SNMPv3 (authPriv)
+        return None
+    try:
+        # Las versiones recientes trasladan CFB a decrepit y avisan si se usa el antiguo
+        from cryptography.hazmat.decrepit.ciphers.modes import CFB
+    except ImportError:
+        from cryptography.hazmat.primitives.ciphers.modes import CFB
+    return lambda key, iv: Cipher(algorithms.AES(key), CFB(iv))
+
+@functools.lru_cache(maxsize=64)
+def password_to_key(password, hash_name):
+    """Clave maestra de una contraseña: hash de 1 MB de la contraseña repetida (RFC 3414 A.2)"""
+    password = password.encode()
+    repeated = password * (1048576 // len(password) + 1)
+    return hashlib.new(hash_name, repeated[:1048576]).digest()
+
+@functools.lru_cache(maxsize=4096)
+def localize_key(password, engine_id, hash_name):
+    """Clave localizada para un engineID; se calcula una vez por agente y contraseña"""
+    key = password_to_key(password, hash_name)
+    return hashlib.new(hash_name, key + engine_id + key).digest()
+
+class EngineState:
+    """engineID, engineBoots y engineTime descubiertos de un agente"""
+    __slots__ = ('engine_id', 'boots', 'time', 'received')
+
+    def __init__(self, engine_id, boots, engine_time):
+        self.engine_id = engine_id
+        self.boots = boots
+        self.time = engine_time
+        self.received = time.monotonic()
+
+    def current_time(self):
+        return self.time + int(time.monotonic() - self.received)
+
+class UsmSecurity:
+    """Credenciales de un usuario SNMPv3 y estado de los motores descubiertos
+
+    El engineID, boots y time de cada agente se guardan tras el primer
+    descubrimiento y las claves localizadas quedan en caché, así que en
+    régimen estable cada petición cuesta un HMAC y un cifrado AES.
+    """
+
+    def __init__(self, user, auth_protocol=None, auth_password=None, priv_password=None):
+        if auth_protocol and not auth_password:
+            raise ValueError('Falta la contraseña de autenticación')
+        if priv_password and not auth_protocol:
+            raise ValueError('El cifrado necesita también autenticación')
+        if priv_password and load_aes() is None:
+            raise ValueError('El cifrado AES de SNMPv3 necesita el paquete cryptography')
+        self.user = user.encode()
+        self.auth_protocol = auth_protocol
+        self.auth_password = auth_password
+        self.priv_password = priv_password
+        self.lock = threading.Lock()
+        self.engines = {}  # dirección (ip, puerto) -> EngineState
+        self.salt = random.getrandbits(64)
+
+    @property
+    def flags(self):
+        return 0x04 | (0x01 if self.auth_protocol else 0) | (0x02 if self.priv_password else 0)
+
+    def _keys(self, engine_id):
+        hash_name, digest_size = V3_AUTH_PROTOCOLS[self.auth_protocol]
+        auth_key = localize_key(self.auth_password, engine_id, hash_name)
+        priv_key = localize_key(self.priv_password, engine_id, hash_name)[:16] if self.priv_password else None
+        return hash_name, digest_size, auth_key, priv_key
+
+    def _next_salt(self):
+        with self.lock:
+            self.salt = (self.salt + 1) & 0xFFFFFFFFFFFFFFFF
+            return self.salt.to_bytes(8, 'big')
+
+    def encode_request(self, address, pdu_type, request_id, varbinds, non_repeaters=0, max_repetitions=0):
+        """Codifica la petición; si aún no se conoce el motor del agente, un mensaje de descubrimiento"""
+        engine = self.engines.get(address)
+        if engine is None:
+            # Sin engineID el agente responde con un Report que lo trae
+            global_data = ber_integer(request_id) + ber_integer(V3_MAX_SIZE) + ber_tlv(0x04, b'\x04') + ber_integer(3)
+            usm = ber_tlv(0x30, ber_tlv(0x04, b'') + ber_integer(0) + ber_integer(0)
+                          + ber_tlv(0x04, b'') + ber_tlv(0x04, b'') + ber_tlv(0x04, b''))
+            scoped = ber_tlv(0x30, ber_tlv(0x04, b'') + ber_tlv(0x04, b'')
+                             + encode_pdu(GET_REQUEST, request_id, []))
+            return ber_tlv(0x30, ber_integer(3) + ber_tlv(0x30, global_data) + ber_tlv(0x04, usm) + scoped)
+        
+        boots = engine.boots
+        engine_time = engine.current_time()
+        scoped = ber_tlv(0x30, ber_tlv(0x04, engine.engine_id) + ber_tlv(0x04, b'')
+                         + encode_pdu(pdu_type, request_id, varbinds, non_repeaters, max_repetitions))
+        auth_params = priv_params = b''
+        if self.auth_protocol:
+            hash_name, digest_size, auth_key, priv_key = self._keys(engine.engine_id)
+            auth_params = bytes(digest_size)
+            if priv_key:
+                priv_params = self._next_salt()
+                iv = boots.to_bytes(4, 'big') + engine_time.to_bytes(4, 'big') + priv_params
+                encryptor = load_aes()(priv_key, iv).encryptor()
+                scoped = ber_tlv(0x04, encryptor.update(scoped) + encryptor.finalize())
+        
+        global_data = (ber_integer(request_id) + ber_integer(V3_MAX_SIZE)
+                       + ber_tlv(0x04, bytes([self.flags])) + ber_integer(3))
+        priv_tlv = ber_tlv(0x04, priv_params)
+        usm = ber_tlv(0x30, ber_tlv(0x04, engine.engine_id) + ber_integer(boots) + ber_integer(engine_time)
+                      + ber_tlv(0x04, self.user) + ber_tlv(0x04, auth_params) + priv_tlv)
+        message = ber_tlv(0x30, ber_integer(3) + ber_tlv(0x30, global_data) + ber_tlv(0x04, usm) + scoped)
+        if not self.auth_protocol:
+            return message
+        
+        # La firma se calcula con el hueco a ceros y luego se escribe en él
+        offset = len(message) - len(scoped) - len(priv_tlv) - digest_size
+        digest = hmac.new(auth_key, message, hash_name).digest()[:digest_size]
+        return message[:offset] + digest + message[offset + digest_size:]
+
+    def decode_response(self, data, address):
+        """Verifica, descifra y decodifica una respuesta o Report SNMPv3
+
+        Lanza ValueError si la firma no es válida o si el mensaje no trae el
+        nivel de seguridad configurado: una respuesta sin firmar o sin cifrar
+        no se acepta cuando el usuario tiene autenticación o cifrado. Un
+        Report sin firmar solo vale para descubrir el motor de un agente que
+        aún no se conoce; con autenticación, el aviso de desfase de reloj de
+        un motor conocido debe venir firmado (RFC 3414, 3.2), para que nadie
+        que suplante la dirección del agente pueda desajustar su reloj.
+        """
+        data = memoryview(data)
+        _, pos, _ = ber_read(data, 0)
+        tag, start, pos = ber_read(data, pos)  # msgVersion
+        _, inner, pos = ber_read(data, pos)    # msgGlobalData
+        tag, start, inner = ber_read(data, inner)
+        message_id = int.from_bytes(data[start:inner], 'big', signed=True)
+        tag, start, inner = ber_read(data, inner)  # msgMaxSize
+        tag, start, inner = ber_read(data, inner)
+        flags = data[start] if inner > start else 0
+        
+        _, usm, pos = ber_read(data, pos)  # msgSecurityParameters
+        _, usm, _ = ber_read(data, usm)
+        fields = []
+        for _ in range(6):
+            tag, start, usm = ber_read(data, usm)
+            fields.append((start, usm))
+        engine_id = bytes(data[slice(*fields[0])])
+        boots = int.from_bytes(data[slice(*fields[1])], 'big')
+        engine_time = int.from_bytes(data[slice(*fields[2])], 'big')
+        auth_start, auth_end = fields[4]
+        priv_params = bytes(data[slice(*fields[5])])
+        
+        authenticated = bool(flags & 0x01 and self.auth_protocol)
+        if authenticated:
+            hash_name, digest_size, auth_key, priv_key = self._keys(engine_id)
+            signed = bytearray(data)
+            received = bytes(signed[auth_start:auth_end])
+            signed[auth_start:auth_end] = bytes(auth_end - auth_start)
+            expected = hmac.new(auth_key, signed, hash_name).digest()[:digest_size]
+            if not hmac.compare_digest(received, expected):
+                raise ValueError('Firma SNMPv3 incorrecta')
+        
+        if flags & 0x02:
+            if not self.priv_password:
+                raise ValueError('Respuesta cifrada sin clave de cifrado')
+            tag, start, end = ber_read(data, pos)
+            iv = boots.to_bytes(4, 'big') + engine_time.to_bytes(4, 'big') + priv_params
+            decryptor = load_aes()(self._keys(engine_id)[3], iv).decryptor()
+            scoped = memoryview(decryptor.update(bytes(data[start:end])) + decryptor.finalize())
+            pos = 0
+        else:
+            scoped = data
+        _, pos, _ = ber_read(scoped, pos)   # ScopedPDU
+        tag, start, pos = ber_read(scoped, pos)  # contextEngineID
+        tag, start, pos = ber_read(scoped, pos)  # contextName
+        message = {'version': 3, 'community': b''}
+        message.update(decode_pdu(scoped, pos))
+        message['request_id'] = message_id
+        
+        update = authenticated
+        if message['pdu_type'] == REPORT:
+            message['report'] = next((USM_REPORTS.get(oid, oid) for oid, _ in message['varbinds']), None)
+            if not authenticated:
+                with self.lock:
+                    known = self.engines.get(address)
+                if known is None:
+                    update = True
+                elif self.auth_protocol:
+                    raise ValueError('Report SNMPv3 sin firmar de un motor ya conocido')
+                elif message['report'] == 'notInTimeWindows' and known.engine_id == engine_id:
+                    update = True  # Sin autenticación no hay firma que comprobar; el engineID no cambia
+        else:
+            if self.auth_protocol and not authenticated:
+                raise ValueError('Respuesta SNMPv3 sin firmar')
+            if self.priv_password and not flags & 0x02:
+                raise ValueError('Respuesta SNMPv3 sin cifrar')
+        
+        if engine_id and update:
+            with self.lock:
+                self.engines[address] = EngineState(engine_id, boots, engine_time)
+        return message
+
+    def netsnmp_args(self):
+        """Opciones de seguridad equivalentes para los comandos de net-snmp"""
+        args = ['-v3', '-u', self.user.decode()]
+        if not self.auth_protocol:
+            return args + ['-l', 'noAuthNoPriv']
+        args += ['-a', self.auth_protocol.replace('SHA256', 'SHA-256'), '-A', self.auth_password]
+        if not self.priv_password:
+            return args + ['-l', 'authNoPriv']
+        return args + ['-l', 'authPriv', '-x', 'AES', '-X', self.priv_password]
+
+SNMP_PORT = 161
+BULK_REPETITIONS = 10  # max-repetitions de cada GETBULK
+
+class SnmpConfig:
+    """Parámetros SNMP de una ejecución: puerto, motor, GETBULK, reintentos, SNMPv3 y limitador
+
+    main() crea uno a partir de los argumentos y lo instala con configure();
+    los procesos trabajadores lo reciben serializado con to_dict(). Cada
+    SnmpClient queda ligado al SnmpConfig con el que se creó.
+    """
+
+    def __init__(self, port=SNMP_PORT, engine='nativo', repetitions=BULK_REPETITIONS, retries=SNMP_RETRIES,
+                 v3=None, governor=None):
+        self.port = port
+        self.engine = engine            # 'nativo' o 'netsnmp' (subprocesos snmpget/snmpwalk)
+        self.repetitions = repetitions
+        self.retries = retries
+        self.v3 = v3                    # UsmSecurity activa; None para SNMPv2c con comunidad
+        self.governor = governor or RequestGovernor()
+
+    def to_dict(self, parts=1):
+        """Forma serializable para un proceso trabajador, con el presupuesto del limitador repartido en `parts`"""
+        return {
+            'port': self.port, 'engine': self.engine, 'repetitions': self.repetitions, 'retries': self.retries,
+            'governor': self.governor.settings(parts),
+            'v3': self.v3 and (self.v3.user.decode(), self.v3.auth_protocol, self.v3.auth_password,
+                               self.v3.priv_password),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['port'], data['engine'], data['repetitions'], data['retries'],
+                   UsmSecurity(*data['v3']) if data['v3'] else None, RequestGovernor(**data['governor']))
+
+CONFIG = SnmpConfig()
+
+# --- Cliente SNMP nativo (BER sobre UDP) ---
+
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+GET_RESPONSE = 0xA2
+TRAP_V1 = 0xA4
+GET_BULK_REQUEST = 0xA5
+INFORM_REQUEST = 0xA6
+SNMPV2_TRAP = 0xA7
+
+PDU_NAMES = {GET_REQUEST: 'get', GET_NEXT_REQUEST: 'getnext', GET_BULK_REQUEST: 'getbulk'}
+
+class Counter32(int):
+    """Contador SNMP de 32 bits"""
+
+class Gauge32(int):
+    """Gauge SNMP de 32 bits"""
+
+class TimeTicks(int):
+    """Tiempo SNMP en centésimas de segundo"""
+
+class Counter64(int):
+    """Contador SNMP de 64 bits"""
+
+class ObjectIdentifier(str):
+    """OID en notación numérica con puntos"""
+
+class IpAddress(str):
+    """Dirección IPv4 devuelta por el agente"""
+
+class SnmpNull:
+    """Valores SNMP sin contenido: Null y las excepciones de SNMPv2c"""
+    __slots__ = ('name', 'tag')
+
+    def __init__(self, name, tag):
+        self.name = name
+        self.tag = tag
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return self.name
+
+NULL = SnmpNull('Null', 0x05)
+NO_SUCH_OBJECT = SnmpNull('noSuchObject', 0x80)
+NO_SUCH_INSTANCE = SnmpNull('noSuchInstance', 0x81)
+END_OF_MIB_VIEW = SnmpNull('endOfMibView', 0x82)
+
+SNMP_NULLS = {value.tag: value for value in (NULL, NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)}
+UNSIGNED_TYPES = {0x41: Counter32, 0x42: Gauge32, 0x43: TimeTicks, 0x46: Counter64}
+UNSIGNED_TAGS = {cls: tag for tag, cls in UNSIGNED_TYPES.items()}
+
+def ber_length(length):
+    """Codifica la longitud de un TLV en forma corta o larga"""
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+def ber_tlv(tag, payload):
+    """Construye un TLV BER"""
+    return bytes([tag]) + ber_length(len(payload)) + payload
+
+def ber_integer(value, tag=0x02):
+    """Codifica un entero con signo (o sin signo para los tipos de aplicación)"""
+    if tag == 0x02:
+        raw = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=True)
+    else:
+        raw = value.to_bytes(value.bit_length() // 8 + 1, 'big')
+    return ber_tlv(tag, raw)
+
+def ber_oid(oid):
+    """Codifica un OID en notación con puntos"""
+    arcs = [int(arc) for arc in oid.strip('.').split('.')]
+    arcs[:2] = [arcs[0] * 40 + arcs[1]]
+    payload = bytearray()
+    for arc in arcs:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        payload.extend(reversed(chunk))
+    return ber_tlv(0x06, bytes(payload))
+
+def ber_value(value):
+    """Codifica un valor Python con su tipo SNMP"""
+    if isinstance(value, SnmpNull):
+        return bytes([value.tag, 0])
+    if isinstance(value, ObjectIdentifier):
+        return ber_oid(value)
+    if isinstance(value, IpAddress):
+        return ber_tlv(0x40, bytes(int(part) for part in value.split('.')))
+    if isinstance(value, int):
+        return ber_integer(value, UNSIGNED_TAGS.get(type(value), 0x02))
+    if isinstance(value, str):
+        value = value.encode()
+    return ber_tlv(0x04, bytes(value))
+
+def ber_read(data, pos):
+    """Lee un TLV y devuelve (tag, inicio del contenido, fin del contenido)"""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    if pos + length > len(data):
+        raise ValueError('TLV truncado')
+    return tag, pos, pos + length
+
+def decode_oid(raw):
+    """Decodifica el contenido de un OID a notación con puntos"""
+    arcs = []
+    arc = 0
+    for byte in raw:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    if not arcs:
+        return ''
+    first = min(arcs[0] // 40, 2)
+    return '.'.join(map(str, [first, arcs[0] - first * 40] + arcs[1:]))
+
+def decode_value(tag, raw):
+    """Convierte un valor BER a su tipo Python"""
+    if tag == 0x02:
+        return int.from_bytes(raw, 'big', signed=True)
+    if tag == 0x04:
+        return bytes(raw)
+    if tag == 0x06:
+        return ObjectIdentifier(decode_oid(raw))
+    if tag == 0x40:
+        return IpAddress('.'.join(str(byte) for byte in raw))
+    if tag in UNSIGNED_TYPES:
+        return UNSIGNED_TYPES[tag](int.from_bytes(raw, 'big'))
+    if tag in SNMP_NULLS:
+        return SNMP_NULLS[tag]
+    return bytes(raw)  # Opaque y tipos desconocidos se devuelven tal cual
+
+def encode_pdu(pdu_type, request_id, varbinds, error_status=0, error_index=0):
+    """Codifica una PDU con sus varbinds"""
+    encoded = b''.join(ber_tlv(0x30, ber_oid(oid) + ber_value(value)) for oid, value in varbinds)
+    pdu = (ber_integer(request_id) + ber_integer(error_status) + ber_integer(error_index)
+           + ber_tlv(0x30, encoded))
+    return ber_tlv(pdu_type, pdu)
+
+def encode_message(community, pdu_type, request_id, varbinds, error_status=0, error_index=0, version=1):
+    """Codifica un mensaje SNMPv2c completo"""
+    if isinstance(community, str):
+        community = community.encode()
+    return ber_tlv(0x30, ber_integer(version) + ber_tlv(0x04, community)
+                   + encode_pdu(pdu_type, request_id, varbinds, error_status, error_index))
+
+def decode_varbinds(data, pos):
+    """Decodifica la lista de varbinds que empieza en `pos`"""
+    _, pos, end = ber_read(data, pos)
+    varbinds = []
+    while pos < end:
+        _, item, pos = ber_read(data, pos)
+        tag, start, item = ber_read(data, item)
+        oid = decode_oid(data[start:item])
+        tag, start, item = ber_read(data, item)
+        varbinds.append((oid, decode_value(tag, data[start:item])))
+    return varbinds
+
+def decode_pdu(data, pos):
+    """Decodifica la PDU que empieza en `pos`
+
+    Los Trap-PDU de SNMPv1 traen enterprise, agent_address, generic_trap,
+    specific_trap y timestamp en lugar de request-id y errores.
+    """
+    pdu_type, pos, end = ber_read(data, pos)
+    if pdu_type == TRAP_V1:
+        fields = []
+        for _ in range(5):
+            tag, start, pos = ber_read(data, pos)
+            fields.append(decode_value(tag, data[start:pos]))
+        return {
+            'pdu_type': pdu_type,
+            'enterprise': fields[0],
+            'agent_address': fields[1],
+            'generic_trap': fields[2],
+            'specific_trap': fields[3],
+            'timestamp': fields[4],
+            'varbinds': decode_varbinds(data, pos),
+        }
+    fields = []
+    for _ in range(3):
+        tag, start, pos = ber_read(data, pos)
+        fields.append(int.from_bytes(data[start:pos], 'big', signed=True))
+    return {
+        'pdu_type': pdu_type,
+        'request_id': fields[0],
+        'error_status': fields[1],
+        'error_index': fields[2],
+        'varbinds': decode_varbinds(data, pos),
+    }
+
+def message_version(data):
+    """Versión SNMP de un mensaje (0 = v1, 1 = v2c, 3 = v3) sin decodificar el resto"""
+    _, pos, _ = ber_read(data, 0)
+    tag, start, end = ber_read(data, pos)
+    return int.from_bytes(data[start:end], 'big', signed=True)
+
+def decode_message(data):
+    """Decodifica un mensaje SNMPv1/v2c y devuelve un diccionario con sus campos"""
+    data = memoryview(data)
+    _, pos, end = ber_read(data, 0)
+    tag, start, pos = ber_read(data, pos)
+    version = int.from_bytes(data[start:pos], 'big', signed=True)
+    if version == 3:
+        raise ValueError('Mensaje SNMPv3')
+    tag, start, pos = ber_read(data, pos)
+    community = bytes(data[start:pos])
+    message = {'version': version, 'community': community}
+    message.update(decode_pdu(data, pos))
+    return message
+
+def oid_key(oid):
+    """Clave de ordenación lexicográfica de un OID"""
+    return tuple(int(arc) for arc in oid.strip('.').split('.'))
+
+@functools.lru_cache(maxsize=4096)
+def resolve_target(target, default_port=SNMP_PORT):
+    """Convierte 'host' o 'host:puerto' en la dirección UDP del agente"""
+    host, _, port = target.partition(':')
+    return socket.gethostbyname(host), int(port or default_port)
+
+def target_address(target):
+    """IP a la que resuelve un destino 'host' o 'host:puerto'; None si no se puede resolver"""
+    try:
+        return resolve_target(target)[0]
+    except OSError:
+        return None
+
+class PendingRequest:
+    """Petición en vuelo esperando la respuesta con su request-id"""
+    __slots__ = ('request_id', 'address', 'packet', 'callback', 'event', 'response', 'sent', 'attempts')
+
+    def __init__(self, request_id, address, packet, callback=None):
+        self.request_id = request_id
+        self.address = address
+        self.packet = packet
+        self.callback = callback
+        self.event = threading.Event()
+        self.response = None
+        self.sent = time.monotonic()
+        self.attempts = 1
+
+class SnmpClient:
+    """Cliente SNMPv2c sobre un único socket UDP compartido por todos los hilos"""
+
+    def __init__(self, config=None):
+        self.config = config or SnmpConfig()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('0.0.0.0', 0))
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next_id = random.randint(1, 0x3FFFFFFF)
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receiver.start()
+
+    def _new_request_id(self):
+        with self.lock:
+            self.next_id = self.next_id % 0x7FFFFFFF + 1
+            return self.next_id
+
+    def _receive_loop(self):
+        """Despacha cada respuesta a la petición en vuelo con el mismo request-id"""
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65535)
+                started = time.perf_counter()
+                if self.config.v3 is not None and message_version(data) == 3:
+                    message = self.config.v3.decode_response(data, address)
+                else:
+                    message = decode_message(data)
+            except OSError:
+                return
+            except (ValueError, IndexError):
+                continue  # Paquete malformado
+            METRICS.observe('parse', time.perf_counter() - started, format='ber')
+            METRICS.count('snmp_bytes_received', len(data))
+            with self.lock:
+                pending = self.pending.get(message.get('request_id'))
+                if pending is None or pending.address[0] != address[0]:
+                    continue
+                del self.pending[message['request_id']]
+            if pending.attempts == 1:
+                TIMEOUTS.sample(pending.address, time.monotonic() - pending.sent)
+            pending.response = message
+            pending.event.set()
+            if pending.callback:
+                pending.callback(pending)
+
+    def submit(self, target, community, pdu_type, varbinds, non_repeaters=0,
+               max_repetitions=0, callback=None):
+        """Envía una PDU sin esperar; la respuesta llega a la PendingRequest devuelta"""
+        address = resolve_target(target, self.config.port)
+        request_id = self._new_request_id()
+        if self.config.v3 is not None:
+            packet = self.config.v3.encode_request(address, pdu_type, request_id, varbinds,
+                                                   non_repeaters, max_repetitions)
+        else:
+            packet = encode_message(community, pdu_type, request_id, varbinds,
+                                    non_repeaters, max_repetitions)
+        pending = PendingRequest(request_id, address, packet, callback)
+        with self.lock:
+            self.pending[request_id] = pending
+        try:
+            self.sock.sendto(packet, address)
+        except OSError:
+            self.cancel(pending)
+            raise
+        METRICS.count('snmp_bytes_sent', len(packet))
+        return pending
+
+    def cancel(self, pending):
+        """Deja de esperar la respuesta de una petición"""
+        with self.lock:
+            self.pending.pop(pending.request_id, None)
+
+    def request(self, target, community, pdu_type, varbinds, timeout=2, retries=None,
+                non_repeaters=0, max_repetitions=0):
+        """Envía una PDU y espera la respuesta; devuelve las varbinds o None
+
+        `timeout` es el tiempo máximo total: cada transmisión espera el RTO
+        adaptativo del agente y los reenvíos (como mucho `retries`) lo duplican.
+        Con SNMPv3, un Report de descubrimiento o de desfase de reloj actualiza
+        el motor del agente y la petición se repite una vez con esos datos.
+        Cada paquete espera su turno en el limitador de ritmo de la configuración.
+        El RTO, el cortocircuito y el ritmo son los de la dirección (IP, puerto) del agente.
+        """
+        governor = self.config.governor
+        address = resolve_target(target, self.config.port)
+        if not TIMEOUTS.allow(address):
+            return None
+        retries = self.config.retries if retries is None else retries
+        end = time.monotonic() + timeout
+        with governor.admit(address, timeout) as admitted:
+            if not admitted:
+                TIMEOUTS.release(address)
+                return None
+            for exchange in range(3 if self.config.v3 is not None else 1):
+                if exchange and not governor.pace(address, end):
+                    TIMEOUTS.release(address)
+                    return None
+                lost = False
+                started = time.perf_counter()
+                pending = self.submit(target, community, pdu_type, varbinds,
+                                      non_repeaters, max_repetitions)
+                try:
+                    for attempt, wait in enumerate(TIMEOUTS.attempt_timeouts(address, remaining_time(end, timeout),
+                                                                             retries)):
+                        if attempt:
+                            if not lost:
+                                governor.loss(address)
+                                lost = True
+                            if not governor.pace(address, end):
+                                break
+                            pending.attempts += 1
+                            self.sock.sendto(pending.packet, pending.address)
+                            METRICS.count('snmp_retries', pdu=PDU_NAMES.get(pdu_type))
+                            METRICS.count('snmp_bytes_sent', len(pending.packet))
+                        if pending.event.wait(wait):
+                            break
+                finally:
+                    self.cancel(pending)
+                METRICS.observe('snmp_request', time.perf_counter() - started, pdu=PDU_NAMES.get(pdu_type))
+                
+                response = pending.response
+                if response is None:
+                    METRICS.count('snmp_timeouts', pdu=PDU_NAMES.get(pdu_type))
+                    TIMEOUTS.failure(address)
+                    if not lost:  # Sin reenvíos (-r 0) la pérdida aún no se había contado
+                        governor.loss(address)
+                    return None
+                TIMEOUTS.success(address)
+                if pending.attempts == 1:
+                    governor.delivered(address)
+                if response['pdu_type'] != REPORT:
+                    break
+                METRICS.count('snmp_v3_reports', report=response.get('report'))
+                if response.get('report') not in ('unknownEngineIDs', 'notInTimeWindows'):
+                    return None  # Usuario, clave o nivel de seguridad rechazados por el agente
+            else:
+                return None
+        if response['error_status'] != 0:
+            return None
+        return response['varbinds']
+
+    def get(self, target, community, oids, timeout=2, retries=None):
+        """GET de varios OIDs en una sola PDU; devuelve {oid: valor}"""
+        varbinds = self.request(target, community, GET_REQUEST,
+                                [(oid, NULL) for oid in oids], timeout, retries)
+        if varbinds is None:
+            return None
+        return dict(varbinds)
+
+    def walk(self, target, community, oid, timeout=2, retries=None, deadline=None):
+        """Recorre un subárbol con GETNEXT; devuelve [(oid, valor)] o None si no responde"""
+        prefix = oid.strip('.') + '.'
+        current = oid.strip('.')
+        rows = []
+        while True:
+            request_timeout = remaining_time(deadline, timeout)
+            if request_timeout <= 0:
+                return None
+            varbinds = self.request(target, community, GET_NEXT_REQUEST,
+                                    [(current, NULL)], request_timeout, retries)
+            if not varbinds:
+                return None
+            next_oid, value = varbinds[0]
+            if (value is END_OF_MIB_VIEW or not next_oid.startswith(prefix)
+                    or oid_key(next_oid) <= oid_key(current)):
+                return rows
+            rows.append((next_oid, value))
+            current = next_oid
+
+    def get_table(self, target, community, columns, max_repetitions=None,
+                  timeout=2, retries=None, deadline=None):
+        """Obtiene varias columnas de una tabla con GETBULK; devuelve {índice: {columna: valor}}
+
+        Todas las columnas avanzan a la vez en la misma PDU y cada una se
+        descarta en cuanto sale de su subárbol, así que solo viajan las
+        columnas pedidas.
+        """
+        max_repetitions = max_repetitions or self.config.repetitions
+        rows = {}
+        active = {column.strip('.'): column.strip('.') for column in columns}
+        while active:
+            request_timeout = remaining_time(deadline, timeout)
+            if request_timeout <= 0:
+                return None
+            current = list(active.items())
+            varbinds = self.request(target, community, GET_BULK_REQUEST,
+                                    [(oid, NULL) for _, oid in current], request_timeout,
+                                    retries, 0, max_repetitions)
+            if not varbinds:
+                return None
+
+            # La respuesta viene intercalada: fila 0 de cada columna, fila 1, ...
+            finished = set()
+            for position, (next_oid, value) in enumerate(varbinds):
+                column, last_oid = current[position % len(current)]
+                if column in finished:
+                    continue
+                prefix = column + '.'
+                if (value is END_OF_MIB_VIEW or not next_oid.startswith(prefix)
+                        or oid_key(next_oid) <= oid_key(last_oid)):
+                    finished.add(column)
+                    continue
+                rows.setdefault(next_oid[len(prefix):], {})[column] = value
+                current[position % len(current)] = (column, next_oid)
+
+            active = {column: oid for column, oid in current if column not in finished}
+        return rows
+
+    def close(self):
+        self.sock.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Devuelve el cliente SNMP compartido del proceso, creándolo la primera vez con CONFIG"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SnmpClient(CONFIG)
+        return _client
+
+def configure(config):
+    """Instala `config` como configuración SNMP del proceso; el cliente compartido se recrea con ella"""
+    global CONFIG, _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        CONFIG = config
+        _client = None
+
+SNMP_ERRORS = ('No Such Object', 'No Such Instance', 'No more variables')
+
+# Salida de net-snmp con -On -Oe -Ot -Ox: OID numérico, enteros sin etiqueta,
+# timeticks en bruto y todas las cadenas en hexadecimal
+NETSNMP_LINE = re.compile(r'\.(\d[\d.]*) = (?:([A-Za-z][\w-]*): ?)?(.*)')
+NETSNMP_NUMBER = re.compile(r'-?\d+')
+NETSNMP_OPTIONS = ['-On', '-Oe', '-Ot', '-Ox']
+NETSNMP_TYPES = {
+    'INTEGER': int,
+    'Counter32': Counter32,
+    'Gauge32': Gauge32,
+    'Unsigned32': Gauge32,
+    'Timeticks': TimeTicks,
+    'Counter64': Counter64,
+}
+
+def parse_netsnmp_value(kind, text):
+    """Convierte un valor de texto de net-snmp en el mismo tipo que devuelve el cliente nativo"""
+    if kind == 'Hex-STRING':
+        return bytes.fromhex(text)
+    if kind == 'STRING':
+        return text.strip().strip('"').encode()
+    if kind in NETSNMP_TYPES:
+        match = NETSNMP_NUMBER.search(text)
+        return NETSNMP_TYPES[kind](int(match.group())) if match else None
+    if kind == 'OID':
+        return ObjectIdentifier(text.strip().lstrip('.'))
+    if kind == 'IpAddress':
+        return IpAddress(text.strip())
+    if kind is None and text.strip() == '""':
+        return b''
+    if text.startswith(SNMP_ERRORS):
+        return None
+    return text
+
+def parse_netsnmp_output(lines):
+    """Genera (oid, valor) a partir de las líneas de salida de net-snmp, una a una
+
+    Las cadenas hexadecimales largas ocupan varias líneas, así que cada
+    variable se cierra al empezar la siguiente.
+    """
+    current = None
+    for line in lines:
+        match = NETSNMP_LINE.match(line)
+        if match:
+            if current:
+                yield current[0], parse_netsnmp_value(current[1], '\n'.join(current[2]))
+            current = (match.group(1), match.group(2), [match.group(3)])
+        elif current:
+            current[2].append(line.rstrip('\n'))
+    if current:
+        yield current[0], parse_netsnmp_value(current[1], '\n'.join(current[2]))
+
+def netsnmp_security(community):
+    """Opciones de versión y credenciales de los comandos de net-snmp"""
+    if CONFIG.v3 is not None:
+        return CONFIG.v3.netsnmp_args()
+    return ['-v2c', '-c', community]
+
+def netsnmp_agent(ip):
+    """Dirección (IP, puerto) del agente, la misma clave que usa el motor nativo, y su forma para net-snmp"""
+    address = resolve_target(ip, CONFIG.port)
+    return address, f'{address[0]}:{address[1]}'
+
+def netsnmp_timing(address, timeout):
+    """Opciones -t/-r de net-snmp con el RTO del agente y los reintentos que caben en `timeout`"""
+    rto = TIMEOUTS.rto(address)
+    retries = max(0, min(CONFIG.retries, int(timeout / rto) - 1))
+    return ['-t', f'{rto:.2f}', '-r', str(retries)], rto
+
+def netsnmp_get(ip, community, oids, timeout=2):
+    """GET de varios OIDs lanzando snmpget (motor netsnmp)"""
+    governor = CONFIG.governor
+    values = dict.fromkeys(oids)
+    try:
+        address, agent = netsnmp_agent(ip)
+    except OSError:
+        return values
+    if not TIMEOUTS.allow(address):
+        return values
+    timing, rto = netsnmp_timing(address, timeout)
+    # Los reenvíos los hace snmpget por su cuenta: el limitador solo regula el arranque de cada comando
+    with governor.admit(address, timeout) as admitted:
+        if not admitted:
+            TIMEOUTS.release(address)
+            return values
+        started = time.monotonic()
+        try:
+            with METRICS.timed('snmp_request', pdu='get'):
+                result = subprocess.run(
+                    ['snmpget'] + netsnmp_security(community) + timing + NETSNMP_OPTIONS + [agent] + list(oids),
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout + 1
+                )
+        except subprocess.TimeoutExpired:
+            METRICS.count('snmp_timeouts', pdu='get')
+            TIMEOUTS.failure(address)
+            governor.loss(address)
+            return values
+        except:
+            TIMEOUTS.release(address)
+            return values
+    
+    if 'Timeout' in result.stderr:
+        METRICS.count('snmp_timeouts', pdu='get')
+        TIMEOUTS.failure(address)
+        governor.loss(address)
+        return values
+    elapsed = time.monotonic() - started
+    if elapsed < rto:  # Sin reenvíos; incluye el arranque del proceso, así que sobrestima el RTT
+        TIMEOUTS.sample(address, elapsed)
+        governor.delivered(address)
+    TIMEOUTS.success(address)
+
+    names = {oid.strip('.'): oid for oid in oids}
+    with METRICS.timed('parse', format='netsnmp'):
+        for oid, value in parse_netsnmp_output(result.stdout.splitlines()):
+            if oid in names:
+                values[names[oid]] = value
+    return values
+
+def iter_netsnmp_walk(ip, community, oid, timeout=5, max_repetitions=None):
+    """Recorre un subárbol con snmpwalk o snmpbulkwalk y genera (oid, valor) según llega la salida
+
+    La salida no se guarda entera en memoria. Si el proceso falla o supera
+    el timeout se lanza CalledProcessError al terminar.
+    """
+    governor = CONFIG.governor
+    address, agent = netsnmp_agent(ip)
+    if max_repetitions:
+        command = ['snmpbulkwalk', f'-Cr{max_repetitions}']
+    else:
+        command = ['snmpwalk']
+    command += netsnmp_security(community) + netsnmp_timing(address, timeout)[0] + NETSNMP_OPTIONS + [agent, oid]
+    if not TIMEOUTS.allow(address):
+        raise subprocess.CalledProcessError(1, command)
+    
+    # El recorrido entero ocupa un hueco en vuelo; el ritmo solo se aplica al arrancarlo
+    try:
+        with governor.admit(address, timeout) as admitted:
+            if not admitted:
+                raise subprocess.CalledProcessError(1, command)
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            killer = threading.Timer(timeout, process.kill)
+            killer.start()
+            try:
+                for item in parse_netsnmp_output(process.stdout):
+                    if item[1] is not None:
+                        yield item
+                returncode = process.wait()
+            finally:
+                killer.cancel()
+                process.stdout.close()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+    except BaseException:
+        # Sin turno, sin proceso o recorrido abandonado a medias: no cuenta ni como éxito ni como fallo
+        TIMEOUTS.release(address)
+        raise
+    
+    if returncode != 0:
+        METRICS.count('snmp_timeouts', pdu='getbulk' if max_repetitions else 'getnext')
+        TIMEOUTS.failure(address)
+        governor.loss(address)
+        raise subprocess.CalledProcessError(returncode, command)
+    TIMEOUTS.success(address)
+
 def get_snmp_data(ip, community, oid, timeout=2):
     """Obtiene datos SNMP de forma robusta"""
+    return get_snmp_values(ip, community, [oid], timeout)[oid]
+
+def get_snmp_values(ip, community, oids, timeout=2):
+    """Obtiene varios OIDs en una sola petición SNMP, con None para los que no existan"""
+    if CONFIG.engine != 'nativo':
+        return netsnmp_get(ip, community, oids, timeout)
+    
+    values = dict.fromkeys(oids)
     try:
-        result = subprocess.run(
-            ['snmpget', '-v2c', '-c', community, '-t', '1', '-r', '0', ip, oid],
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            if '=' in output:
-                return output.split('=', 1)[1].strip()
-        return None
-    except:
+        response = get_client().get(ip, community, oids, timeout=timeout)
+    except OSError:
+        return values
+    
+    if response:
+        for oid in oids:
+            value = response.get(oid.strip('.'))
+            if value is not None and not isinstance(value, SnmpNull):
+                values[oid] = value
+    return values
+
+def get_snmp_table(ip, community, columns, timeout=5):
+    """Obtiene solo las columnas indicadas ({nombre: OID}) de una tabla, por filas {índice: {nombre: valor}}"""
+    names = {oid.strip('.'): name for name, oid in columns.items()}
+    if CONFIG.engine == 'nativo':
+        with METRICS.timed('walk', engine=CONFIG.engine):
+            table = get_client().get_table(ip, community, list(names), deadline=time.monotonic() + timeout)
+        if table is None:
+            return None
+        return {index: {names[oid]: value for oid, value in row.items()}
+                for index, row in table.items()}
+    
+    rows = {}
+    deadline = time.monotonic() + timeout
+    try:
+        for oid, name in names.items():
+            prefix = len(oid) + 1
+            with METRICS.timed('walk', engine=CONFIG.engine):
+                for row_oid, value in iter_netsnmp_walk(ip, community, oid, remaining_time(deadline, timeout),
+                                                        CONFIG.repetitions):
+                    rows.setdefault(row_oid[prefix:], {})[name] = value
+    except (OSError, subprocess.SubprocessError):
         return None
+    return rows
+
+SYS_OBJECT_ID = '1.3.6.1.2.1.1.2.0'
+
+def expand_networks(networks):
+    """Lista las direcciones de host de una serie de rangos CIDR"""
+    hosts = []
+    for network in networks:
+        hosts.extend(str(ip) for ip in ipaddress.ip_network(network, strict=False).hosts())
+    return hosts
+
+def probe_hosts(ips, community='public', timeout=1, window=256, lost=None):
+    """Envía una sonda sysObjectID a cada IP y genera las que responden, a medida que llegan
 
-def get_system_info(ip, community='public'):
-    """Obtiene información básica del sistema"""
-    info = {'ip': ip}
+    Mantiene como mucho `window` sondas en vuelo sobre el socket compartido
+    (y no más que el tope del limitador); cada sonda espera su turno en el
+    presupuesto global de paquetes. Las IPs que no contestan a tiempo se
+    añaden a `lost`, sin frenar su agente: en un barrido lo normal es que
+    la mayoría de direcciones no respondan.
+    """
+    client = get_client()
+    governor = client.config.governor
+    window = min(window, governor.in_flight or window)
+    answers = queue.Queue()
+    in_flight = collections.OrderedDict()  # request-id -> (ip, sonda, instante de envío)
+    targets = iter(ips)
+    exhausted = False
     
+    while True:
+        while not exhausted and len(in_flight) < window:
+            ip = next(targets, None)
+            if ip is None:
+                exhausted = True
+                break
+            governor.pace(None)
+            try:
+                pending = client.submit(ip, community, GET_REQUEST, [(SYS_OBJECT_ID, NULL)],
+                                        callback=answers.put)
+            except OSError:
+                if lost is not None:
+                    lost.append(ip)
+                continue
+            in_flight[pending.request_id] = (ip, pending, time.monotonic())
+        
+        if not in_flight:
+            return
+        
+        _, _, oldest = next(iter(in_flight.values()))
+        try:
+            pending = answers.get(timeout=max(0, oldest + timeout - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            while in_flight:
+                request_id, (ip, pending, sent) = next(iter(in_flight.items()))
+                if sent + timeout > now:
+                    break
+                del in_flight[request_id]
+                client.cancel(pending)
+                METRICS.count('snmp_timeouts', pdu='get')
+                if lost is not None:
+                    lost.append(ip)
+            continue
+        
+        entry = in_flight.pop(pending.request_id, None)
+        if entry:
+            yield entry[0]
+
+def ping_host(ip):
+    """Comprueba con un ping ICMP si el host está encendido"""
+    host = ip.partition(':')[0]
     try:
-        subprocess.run(
-            ['ping', '-c', '1', '-W', '1', ip],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+        wait = math.ceil(TIMEOUTS.rto(resolve_target(ip, CONFIG.port)))
+    except OSError:
+        return False
+    try:
+        with METRICS.timed('ping'):
+            subprocess.run(
+                ['ping', '-c', '1', '-W', str(wait), host],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=wait + 2
+            )
+        return True
     except:
-        return None
+        return False
+
+def iter_discovered_hosts(networks, community='public', timeout=1, retries=1, silent=None):
+    """Genera las IPs de los rangos CIDR con agente SNMP a medida que responden
+
+    Las IPs que siguen sin contestar tras los reintentos se añaden a `silent`.
+    """
+    pending = expand_networks(networks)
+    for attempt in range(retries + 1):
+        lost = []
+        yield from probe_hosts(pending, community, timeout, lost=lost)
+        pending = lost
+        if not pending:
+            break
+    if silent is not None:
+        silent.extend(pending)
+
+def discover_hosts(networks, community='public', timeout=1, retries=1, icmp=False, concurrency=32):
+    """Barre rangos CIDR con sondas SNMP y devuelve las IPs con agente que responde
+
+    Con icmp=True también se lanza un ping a las IPs que no contestaron por
+    SNMP y se devuelven aparte las que sí están encendidas.
+    """
+    silent = []
+    found = list(iter_discovered_hosts(networks, community, timeout, retries, silent))
+    
+    alive_without_snmp = []
+    if icmp and silent:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            alive_without_snmp = [ip for ip, alive in zip(silent, pool.map(ping_host, silent)) if alive]
     
-    oid_mapping = {
-        'System Description': '1.3.6.1.2.1.1.1.0',
-        'System Name': '1.3.6.1.2.1.1.5.0',
-        'Location': '1.3.6.1.2.1.1.6.0',
-        'Uptime': '1.3.6.1.2.1.1.3.0',
-        'Contact': '1.3.6.1.2.1.1.4.0'
+    order = {ip: position for position, ip in enumerate(expand_networks(networks))}
+    found.sort(key=order.get)
+    return found, alive_without_snmp
+
+def uptime_ticks(value):
+    """Devuelve sysUpTime en centésimas, tanto del valor tipado como del texto de net-snmp"""
+    if isinstance(value, int):
+        return int(value)
+    match = TICKS_IN_PARENS.search(value or '')
+    return int(match.group(1)) if match else None
+
+# --- Modelo de datos: dispositivos e interfaces ---
+
+def intern_text(value):
+    """Interna un texto que se repite entre equipos; None se queda como está"""
+    return None if value is None else sys.intern(str(value))
+
+def snmp_text(value):
+    """Texto limpio de un valor SNMP, o None si el agente no lo tiene o está vacío"""
+    text = clean_snmp_output(value)
+    return None if text == 'N/A' else text
+
+def mac_bytes(text):
+    """Convierte una MAC en texto (con o sin separadores) en sus bytes; None si no es válida"""
+    digits = NON_HEX.sub('', text or '')
+    return bytes.fromhex(digits) if digits and len(digits) % 2 == 0 else None
+
+class Interface:
+    """Fila de la tabla de interfaces con los valores tal como llegan del agente
+
+    El ifIndex es entero, la MAC se guarda en bytes y el nombre se interna,
+    porque los mismos eth0 o Gi1/0/1 se repiten en toda la flota. El texto
+    para mostrar (MAC con dos puntos, Up/Down) se forma solo al pedirlo.
+    """
+    __slots__ = ('index', 'name', 'mac', 'oper_status', 'speed', 'in_octets', 'out_octets',
+                 'in_errors', 'out_errors', 'counter_bits')
+    NUMBERS = ('speed', 'in_octets', 'out_octets', 'in_errors', 'out_errors', 'counter_bits')
+
+    def __init__(self, index, name=None, mac=None, oper_status=None, speed=None, in_octets=None,
+                 out_octets=None, in_errors=None, out_errors=None, counter_bits=None):
+        self.index = index
+        self.name = intern_text(name)
+        self.mac = mac or None
+        self.oper_status = oper_status
+        self.speed = speed
+        self.in_octets = in_octets
+        self.out_octets = out_octets
+        self.in_errors = in_errors
+        self.out_errors = out_errors
+        self.counter_bits = counter_bits
+
+    @property
+    def status(self):
+        """Up o Down según ifOperStatus (cualquier estado distinto de up cuenta como Down)"""
+        if self.oper_status is None:
+            return None
+        return 'Up' if self.oper_status == 1 else 'Down'
+
+    @status.setter
+    def status(self, status):
+        self.oper_status = 1 if status == 'Up' else 2
+
+    @property
+    def mac_text(self):
+        return clean_mac_address(self.mac) if self.mac else None
+
+    def update(self, other):
+        """Copia los valores que trae otra lectura de la misma interfaz"""
+        for field in self.__slots__[1:]:
+            value = getattr(other, field)
+            if value is not None:
+                setattr(self, field, value)
+
+    def to_dict(self):
+        """Valores para mostrar o exportar, sin los que no se conocen"""
+        values = {'name': self.name, 'mac': self.mac_text, 'status': self.status}
+        values.update((field, getattr(self, field)) for field in self.NUMBERS)
+        return {key: value for key, value in values.items() if value is not None}
+
+    @classmethod
+    def from_dict(cls, index, values):
+        """Reconstruye la interfaz a partir de to_dict()"""
+        interface = cls(int(index), values.get('name'), mac_bytes(values.get('mac')),
+                        **{field: values[field] for field in cls.NUMBERS if field in values})
+        if values.get('status'):
+            interface.status = values['status']
+        return interface
+
+class Device:
+    """Dispositivo consultado: su grupo system en bruto, sus interfaces y las métricas de los perfiles
+
+    El uptime se guarda en centésimas de segundo, tal como llega en
+    sysUpTime, y se formatea al mostrarlo. Los textos que se repiten entre
+    equipos (descripción, ubicación, contacto) se internan. `interfaces` es
+    {ifIndex entero: Interface}.
+    """
+    __slots__ = ('ip', 'description', 'name', 'location', 'contact', 'object_id', 'uptime',
+                 'interfaces', 'metrics', 'polled_at')
+    TEXT_FIELDS = ('description', 'name', 'location', 'contact', 'object_id')
+
+    def __init__(self, ip, description=None, name=None, location=None, contact=None, object_id=None,
+                 uptime=None, interfaces=None, metrics=None, polled_at=None):
+        self.ip = ip
+        self.description = intern_text(description)
+        self.name = intern_text(name)
+        self.location = intern_text(location)
+        self.contact = intern_text(contact)
+        self.object_id = intern_text(object_id)
+        self.uptime = uptime
+        self.interfaces = interfaces
+        self.metrics = metrics
+        self.polled_at = polled_at
+
+    @property
+    def label(self):
+        """Nombre con el que se presenta el equipo: sysName o, si no tiene, su IP"""
+        return self.name or self.ip
+
+    @property
+    def uptime_text(self):
+        return format_uptime(self.uptime) if self.uptime is not None else None
+
+    def record(self):
+        """Campos de sistema listos para mostrar o exportar"""
+        return {'name': self.name, 'description': self.description, 'location': self.location,
+                'uptime': self.uptime_text, 'contact': self.contact, 'object_id': self.object_id}
+
+    def to_dict(self):
+        """Forma JSON del dispositivo, para el canal entre procesos, el colector y el inventario"""
+        values = {field: getattr(self, field) for field in self.__slots__}
+        if self.interfaces is not None:
+            values['interfaces'] = {str(index): interface.to_dict()
+                                    for index, interface in self.interfaces.items()}
+        return values
+
+    @classmethod
+    def from_dict(cls, values):
+        """Reconstruye el dispositivo a partir de to_dict()"""
+        values = {field: values[field] for field in cls.__slots__ if field in values}
+        if values.get('interfaces') is not None:
+            values['interfaces'] = {int(index): Interface.from_dict(index, row)
+                                    for index, row in values['interfaces'].items()}
+        return cls(**values)
+
+def snmp_int(value):
+    """Extrae el entero de un valor SNMP tipado o de la salida de texto de net-snmp"""
+    if isinstance(value, int):
+        return int(value)
+    match = TRAILING_NUMBER.search(value or '')
+    return int(match.group(1)) if match else None
+
+# --- Registro de perfiles de OIDs ---
+
+class OidProfile:
+    """Perfil declarativo de lo que se recoge de un equipo
+
+    `scalars` es {campo: (OID, decodificador)} y `tables` es
+    {tabla: {columna: (OID de la columna, decodificador)}}; un decodificador
+    None deja el valor tal como llega. Con `summarize`, el perfil convierte
+    lo leído ({campo: valor, tabla: {índice: {columna: valor}}}) en su
+    resultado final.
+    """
+
+    def __init__(self, name, description, scalars=None, tables=None, summarize=None):
+        self.name = name
+        self.description = description
+        self.scalars = scalars or {}
+        self.tables = tables or {}
+        self.summarize = summarize
+
+PROFILES = {}
+BASE_PROFILES = ('sistema', 'interfaces')  # los recogen siempre get_system_info y get_interfaces_info
+
+def register_profile(profile):
+    """Añade un perfil al registro, sustituyendo al que tuviera el mismo nombre"""
+    PROFILES[profile.name] = profile
+    return profile
+
+# Los campos de este perfil son los atributos de Device
+register_profile(OidProfile('sistema', 'Grupo system de MIB-II', scalars={
+    'description': ('1.3.6.1.2.1.1.1.0', snmp_text),
+    'name': ('1.3.6.1.2.1.1.5.0', snmp_text),
+    'location': ('1.3.6.1.2.1.1.6.0', snmp_text),
+    'uptime': ('1.3.6.1.2.1.1.3.0', uptime_ticks),
+    'contact': ('1.3.6.1.2.1.1.4.0', snmp_text),
+    'object_id': (SYS_OBJECT_ID, snmp_text),  # sysObjectID: la clase del equipo
+}))
+
+# parse_interface_row decodifica estas columnas junto con los contadores
+register_profile(OidProfile('interfaces', 'ifTable de MIB-II', tables={'interfaces': {
+    'name': ('1.3.6.1.2.1.2.2.1.2', None),    # ifDescr
+    'mac': ('1.3.6.1.2.1.2.2.1.6', None),     # ifPhysAddress
+    'status': ('1.3.6.1.2.1.2.2.1.8', None),  # ifOperStatus
+}}))
+
+register_profile(OidProfile('if-extendido', 'ifXTable: nombre, alias, velocidad y contadores de 64 bits', tables={
+    'interfaces': {
+        'name': ('1.3.6.1.2.1.31.1.1.1.1', clean_snmp_output),   # ifName
+        'alias': ('1.3.6.1.2.1.31.1.1.1.18', clean_snmp_output), # ifAlias
+        'speed_mbps': ('1.3.6.1.2.1.31.1.1.1.15', snmp_int),     # ifHighSpeed
+        'in_octets': ('1.3.6.1.2.1.31.1.1.1.6', snmp_int),       # ifHCInOctets
+        'out_octets': ('1.3.6.1.2.1.31.1.1.1.10', snmp_int),     # ifHCOutOctets
+    },
+}))
+
+HR_STORAGE_RAM = '1.3.6.1.2.1.25.2.1.2'
+HR_STORAGE_FIXED_DISK = '1.3.6.1.2.1.25.2.1.4'
+
+def storage_usage(entry):
+    """Tamaño y ocupación en bytes de una fila de hrStorageTable, o None si no tiene tamaño"""
+    size, used = entry.get('size'), entry.get('used')
+    if not size or used is None:
+        return None
+    units = entry.get('units') or 1
+    return {'description': entry.get('description'), 'size': size * units, 'used': used * units,
+            'percent': round(100 * used / size, 1)}
+
+def summarize_host_resources(data):
+    """Carga media de las CPU, memoria física y discos fijos de HOST-RESOURCES-MIB"""
+    loads = [row['load'] for row in data['cpu'].values() if row.get('load') is not None]
+    storage = [(row.get('type'), storage_usage(row))
+               for _, row in sorted(data['storage'].items(), key=lambda item: oid_key(item[0]))]
+    return {
+        'cpu_load': round(sum(loads) / len(loads), 1) if loads else None,
+        'cpus': len(loads),
+        'processes': data['processes'],
+        'memory': next((usage for kind, usage in storage if kind == HR_STORAGE_RAM and usage), None),
+        'disks': [usage for kind, usage in storage if kind == HR_STORAGE_FIXED_DISK and usage],
     }
+
+register_profile(OidProfile('host-resources', 'HOST-RESOURCES-MIB: CPU, memoria y discos', scalars={
+    'processes': ('1.3.6.1.2.1.25.1.6.0', snmp_int),  # hrSystemProcesses
+}, tables={
+    'cpu': {
+        'load': ('1.3.6.1.2.1.25.3.3.1.2', snmp_int),  # hrProcessorLoad
+    },
+    'storage': {
+        'type': ('1.3.6.1.2.1.25.2.3.1.2', str),                      # hrStorageType
+        'description': ('1.3.6.1.2.1.25.2.3.1.3', clean_snmp_output), # hrStorageDescr
+        'units': ('1.3.6.1.2.1.25.2.3.1.4', snmp_int),                # hrStorageAllocationUnits
+        'size': ('1.3.6.1.2.1.25.2.3.1.5', snmp_int),                 # hrStorageSize
+        'used': ('1.3.6.1.2.1.25.2.3.1.6', snmp_int),                 # hrStorageUsed
+    },
+}, summarize=summarize_host_resources))
+
+# Perfiles adicionales según la clase del equipo, por prefijo de sysObjectID
+PROFILE_CLASSES = (
+    ('1.3.6.1.4.1.8072.', ('host-resources', 'if-extendido')),  # net-snmp (Linux, BSD)
+    ('1.3.6.1.4.1.311.', ('host-resources', 'if-extendido')),   # Windows
+    ('1.3.6.1.4.1.9.', ('if-extendido',)),                      # Cisco
+    ('1.3.6.1.4.1.2636.', ('if-extendido',)),                   # Juniper
+)
+
+def select_profiles(device, names, overrides=None):
+    """Perfiles adicionales que tocan a un equipo
+
+    `overrides` ({IP: nombres}) sustituye a `names` para esa IP; el nombre
+    'auto' elige según la clase del equipo (su sysObjectID).
+    """
+    names = (overrides or {}).get(device.ip, names)
+    selected = []
+    for name in names or ():
+        if name == 'auto':
+            object_id = device.object_id or ''
+            for prefix, class_profiles in PROFILE_CLASSES:
+                if object_id.startswith(prefix):
+                    selected.extend(class_profiles)
+                    break
+        else:
+            selected.append(name)
+    return [PROFILES[name] for name in dict.fromkeys(selected)]
+
+def get_profile_metrics(ip, community, profiles, deadline=None):
+    """Recoge varios perfiles a la vez: un GET con todos sus escalares y un recorrido GETBULK con todas sus columnas
+
+    Devuelve {perfil: resultado}, o None si el equipo no ha respondido a tiempo.
+    """
+    scalars = {oid: None for profile in profiles for oid, _ in profile.scalars.values()}
+    columns = {oid: oid for profile in profiles for table in profile.tables.values()
+               for oid, _ in table.values()}
+    
+    values = {}
+    if scalars:
+        timeout = remaining_time(deadline, 2)
+        if timeout <= 0:
+            return None
+        values = get_snmp_values(ip, community, list(scalars), timeout)
+    rows = {}
+    if columns:
+        rows = get_snmp_table(ip, community, columns, timeout=remaining_time(deadline, 5))
+        if rows is None:
+            return None
+    
+    def decode(value, decoder):
+        return value if value is None or decoder is None else decoder(value)
+    
+    results = {}
+    with METRICS.timed('clean'):
+        for profile in profiles:
+            data = {field: decode(values.get(oid), decoder) for field, (oid, decoder) in profile.scalars.items()}
+            for table, table_columns in profile.tables.items():
+                data[table] = {}
+                for index, row in rows.items():
+                    entry = {column: decode(row[oid], decoder)
+                             for column, (oid, decoder) in table_columns.items() if oid in row}
+                    if entry:
+                        data[table][index] = entry
+            results[profile.name] = profile.summarize(data) if profile.summarize else data
+    return results
+
+SYSTEM_OIDS = {field: oid for field, (oid, _) in PROFILES['sistema'].scalars.items()}
+
+SYS_UPTIME_OID = SYSTEM_OIDS['uptime']
+
+class DeviceCache:
+    """Caché persistente por IP de lo que casi nunca cambia en un equipo
+
+    Guarda los campos estáticos de sistema y la última tabla de interfaces.
+    Los campos de sistema valen mientras no caduque su TTL y sysUpTime no
+    retroceda (si retrocede, el equipo se ha reiniciado). La tabla de
+    interfaces vale mientras su firma (ifNumber, ifTableLastChange y el
+    ifLastChange de cada fila) no cambie.
+    """
+    STATIC_FIELDS = Device.TEXT_FIELDS
+
+    def __init__(self, path=None, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                console.print(f"[yellow]No se pudo leer la caché {path}, se empieza vacía[/yellow]")
+
+    def _section(self, ip, section):
+        return self.entries.get(ip, {}).get(section)
+
+    def is_fresh(self, ip):
+        """Indica si hay campos de sistema sin caducar para la IP"""
+        with self.lock:
+            entry = self._section(ip, 'system')
+            return entry is not None and time.time() - entry['fetched'] < self.ttl
+
+    def lookup(self, ip, uptime):
+        """Devuelve los campos guardados si el equipo no se ha reiniciado; None en caso contrario"""
+        with self.lock:
+            entry = self._section(ip, 'system')
+            # Las entradas de versiones anteriores usaban otras claves y no valen
+            if (entry is None or uptime is None or uptime < entry['uptime']
+                    or not entry['fields'].keys() <= set(self.STATIC_FIELDS)):
+                self.stats['system_misses'] += 1
+                return None
+            self.stats['system_hits'] += 1
+            entry['uptime'] = uptime
+            return dict(entry['fields'])
+
+    def record_miss(self):
+        with self.lock:
+            self.stats['system_misses'] += 1
+
+    def store(self, ip, device):
+        with self.lock:
+            self.entries.setdefault(ip, {})['system'] = {
+                'fields': {field: getattr(device, field) for field in self.STATIC_FIELDS},
+                'uptime': device.uptime or 0,
+                'fetched': time.time(),
+            }
+
+    def interface_indices(self, ip):
+        """ifIndex de las filas guardadas, cuyo ifLastChange se comprueba en la firma"""
+        with self.lock:
+            entry = self._section(ip, 'interfaces')
+            return list(entry['signature']['rows']) if entry else []
+
+    def lookup_interfaces(self, ip, signature):
+        """Compara la firma actual con la guardada
+
+        Devuelve (interfaces, filas cambiadas) si la tabla conserva sus filas,
+        o (None, None) si hay que recorrerla entera.
+        """
+        with self.lock:
+            entry = self._section(ip, 'interfaces')
+            old = entry and entry['signature']
+            if (not old or time.time() - entry['fetched'] >= self.ttl
+                    or signature['uptime'] is None or signature['uptime'] < old['uptime']
+                    or signature['if_number'] != old['if_number']
+                    or signature['table_last_change'] != old['table_last_change']
+                    or signature['rows'].keys() != old['rows'].keys()
+                    or None in signature['rows'].values()):
+                self.stats['interface_misses'] += 1
+                return None, None
+            self.stats['interface_hits'] += 1
+            changed = [if_index for if_index, ticks in signature['rows'].items()
+                       if ticks != old['rows'][if_index]]
+            return {int(if_index): Interface.from_dict(if_index, if_data)
+                    for if_index, if_data in entry['rows'].items()}, changed
+
+    def store_interfaces(self, ip, signature, interfaces, refetched=True):
+        """Guarda la tabla de interfaces sin contadores; el TTL solo se renueva tras recorrerla entera"""
+        static = {str(if_index): {key: value for key, value in interface.to_dict().items()
+                                  if key in IF_COLUMNS}
+                  for if_index, interface in interfaces.items()}
+        with self.lock:
+            previous = self._section(ip, 'interfaces')
+            fetched = time.time() if refetched or not previous else previous['fetched']
+            self.entries.setdefault(ip, {})['interfaces'] = {
+                'signature': signature,
+                'rows': static,
+                'fetched': fetched,
+            }
+
+    def merge(self, entries, stats):
+        """Incorpora las entradas y estadísticas de la caché de otro proceso"""
+        with self.lock:
+            self.entries.update(entries)
+            self.stats.update(stats)
+
+    def summary(self):
+        """Texto con los aciertos y fallos de cada parte de la caché"""
+        return (f"sistema [bold cyan]{self.stats['system_hits']}[/bold cyan] aciertos, "
+                f"[bold cyan]{self.stats['system_misses']}[/bold cyan] fallos; "
+                f"interfaces [bold cyan]{self.stats['interface_hits']}[/bold cyan] aciertos, "
+                f"[bold cyan]{self.stats['interface_misses']}[/bold cyan] fallos")
+
+    def save(self):
+        """Escribe la caché en disco de forma atómica"""
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temporary, self.path)
+
+INVENTORY_GRACE = 2             # fallos seguidos antes de empezar a espaciar los sondeos
+INVENTORY_BASE_BACKOFF = 60     # segundos de espera tras el primer fallo fuera de gracia
+INVENTORY_MAX_BACKOFF = 86400
+
+class DeviceInventory:
+    """Inventario persistente de dispositivos en SQLite
+
+    Guarda por IP cuándo respondió por última vez, cuántos sondeos seguidos
+    ha fallado y la última información de sistema conocida. Los equipos que
+    dejan de responder se vuelven a sondear cada vez más espaciados (backoff
+    exponencial), hasta una vez al día.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.last_commit = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS devices (
+                ip TEXT PRIMARY KEY,
+                first_seen REAL NOT NULL,
+                last_seen REAL,
+                last_attempt REAL,
+                failures INTEGER NOT NULL DEFAULT 0,
+                next_probe REAL NOT NULL DEFAULT 0,
+                info TEXT
+            )''')
+        self.db.commit()
+
+    def targets(self):
+        """IPs del inventario en el orden en que se dieron de alta"""
+        with self.lock:
+            return [ip for ip, in self.db.execute('SELECT ip FROM devices ORDER BY first_seen, rowid')]
+
+    def add(self, ips):
+        """Da de alta las IPs que aún no estén en el inventario"""
+        now = time.time()
+        with self.lock:
+            self.db.executemany('INSERT OR IGNORE INTO devices (ip, first_seen) VALUES (?, ?)',
+                                [(ip, now) for ip in ips])
+            self.db.commit()
+
+    def is_due(self, ip, now=None):
+        """Indica si toca sondear la IP o sigue en espera por sus fallos"""
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.db.execute('SELECT next_probe FROM devices WHERE ip = ?', (ip,)).fetchone()
+        return row is None or row[0] <= now
+
+    def split_due(self, ips):
+        """Separa las IPs en (a sondear, en espera)"""
+        now = time.time()
+        due, waiting = [], []
+        for ip in ips:
+            (due if self.is_due(ip, now) else waiting).append(ip)
+        return due, waiting
+
+    def backoff(self, failures):
+        """Segundos hasta el próximo sondeo tras `failures` fallos seguidos"""
+        if failures <= INVENTORY_GRACE:
+            return 0
+        return min(INVENTORY_MAX_BACKOFF, INVENTORY_BASE_BACKOFF * 2 ** (failures - INVENTORY_GRACE - 1))
+
+    def record(self, ip, device):
+        """Anota el resultado de un sondeo: la información de sistema o None si no respondió"""
+        now = time.time()
+        with self.lock:
+            if device:
+                self.stats['responden'] += 1
+                info = json.dumps({key: value for key, value in device.to_dict().items()
+                                   if key not in ('ip', 'interfaces')}, ensure_ascii=False)
+                self.db.execute('''
+                    INSERT INTO devices (ip, first_seen, last_seen, last_attempt, failures, next_probe, info)
+                    VALUES (?, ?, ?, ?, 0, 0, ?)
+                    ON CONFLICT(ip) DO UPDATE SET last_seen = excluded.last_seen,
+                        last_attempt = excluded.last_attempt, failures = 0, next_probe = 0,
+                        info = excluded.info''', (ip, now, now, now, info))
+            else:
+                self.stats['sin respuesta'] += 1
+                row = self.db.execute('SELECT failures FROM devices WHERE ip = ?', (ip,)).fetchone()
+                failures = (row[0] if row else 0) + 1
+                self.db.execute('''
+                    INSERT INTO devices (ip, first_seen, last_attempt, failures, next_probe)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(ip) DO UPDATE SET last_attempt = excluded.last_attempt,
+                        failures = excluded.failures, next_probe = excluded.next_probe''',
+                                (ip, now, now, failures, now + self.backoff(failures)))
+            # Agrupar las escrituras en transacciones de unos segundos
+            if time.monotonic() - self.last_commit > 5:
+                self.db.commit()
+                self.last_commit = time.monotonic()
+
+    def last_info(self, ip):
+        """Última información de sistema conocida de la IP, o None"""
+        with self.lock:
+            row = self.db.execute('SELECT info FROM devices WHERE ip = ?', (ip,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def summary(self):
+        """Texto con el estado del inventario y los resultados de esta ejecución"""
+        now = time.time()
+        with self.lock:
+            total, waiting = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(next_probe > ?), 0) FROM devices', (now,)).fetchone()
+        return (f"[bold cyan]{total}[/bold cyan] dispositivos, "
+                f"[bold cyan]{waiting}[/bold cyan] en espera por fallos; en esta ejecución "
+                f"[bold cyan]{self.stats['responden']}[/bold cyan] responden y "
+                f"[bold cyan]{self.stats['sin respuesta']}[/bold cyan] sin respuesta")
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+def get_system_info(ip, community='public', deadline=None, cache=None):
+    """Obtiene información básica del sistema como un Device"""
+    timeout = remaining_time(deadline, 2)
+    if timeout <= 0:
+        return None
+    
+    if cache is not None:
+        if cache.is_fresh(ip):
+            # En régimen estable basta con un GET de sysUpTime
+            uptime = uptime_ticks(get_snmp_data(ip, community, SYS_UPTIME_OID, timeout))
+            if uptime is None:
+                return None
+            fields = cache.lookup(ip, uptime)
+            if fields is not None:
+                return Device(ip, uptime=uptime, **fields)
+            timeout = remaining_time(deadline, 2)
+            if timeout <= 0:
+                return None
+        else:
+            cache.record_miss()
+    
+    values = get_snmp_values(ip, community, list(SYSTEM_OIDS.values()), timeout)
+    if all(value is None for value in values.values()):
+        return None
+    
+    # Los OIDs que el agente no tenga se quedan en None y se muestran como N/A
+    with METRICS.timed('clean'):
+        device = Device(ip, **{field: None if values.get(oid) is None else decoder(values[oid])
+                               for field, (oid, decoder) in PROFILES['sistema'].scalars.items()})
+    
+    if cache is not None:
+        cache.store(ip, device)
+    
+    return device
+
+IF_COLUMNS = {column: oid for column, (oid, _) in PROFILES['interfaces'].tables['interfaces'].items()}
+
+IF_HC_COUNTER_COLUMNS = {column: PROFILES['if-extendido'].tables['interfaces'][column][0]
+                         for column in ('in_octets', 'out_octets')}
+
+IF_COUNTER_COLUMNS = {
+    'in_octets': '1.3.6.1.2.1.2.2.1.10',   # ifInOctets
+    'out_octets': '1.3.6.1.2.1.2.2.1.16',  # ifOutOctets
+}
+
+# Velocidad y errores, que se leen junto a los contadores para calcular tasas
+IF_RATE_COLUMNS = {
+    'speed': '1.3.6.1.2.1.2.2.1.5',           # ifSpeed, en b/s (se queda en 4294967295 por encima)
+    'high_speed': '1.3.6.1.2.1.31.1.1.1.15',  # ifHighSpeed, en Mb/s
+    'in_errors': '1.3.6.1.2.1.2.2.1.14',      # ifInErrors
+    'out_errors': '1.3.6.1.2.1.2.2.1.20',     # ifOutErrors
+}
+
+IF_NUMBER_OID = '1.3.6.1.2.1.2.1.0'
+IF_TABLE_LAST_CHANGE_OID = '1.3.6.1.2.1.31.1.5.0'
+IF_LAST_CHANGE_COLUMN = {'last_change': '1.3.6.1.2.1.2.2.1.9'}
+SIGNATURE_BATCH = 48  # varbinds por GET al comprobar la firma, como una respuesta GETBULK típica
+
+def parse_interface_row(if_index, row, counter_bits=64):
+    """Convierte las columnas SNMP de una fila de ifTable en un Interface"""
+    interface = Interface(int(if_index))
     
-    for desc, oid in oid_mapping.items():
-        value = get_snmp_data(ip, community, oid)
-        if value:
-            info[desc] = clean_snmp_output(value)
+    for column, value in row.items():
+        if column == 'name':  # Interface Description
+            interface.name = intern_text(snmp_text(value))
+        elif column == 'mac':  # MAC Address
+            if isinstance(value, bytes):
+                interface.mac = value or None
+            elif 'Hex-STRING:' in value:
+                interface.mac = mac_bytes(value.replace('Hex-STRING:', ''))
+        elif column == 'status':  # Interface Status
+            interface.oper_status = snmp_int(value)
+        elif column in ('in_octets', 'out_octets'):  # Contadores de tráfico
+            octets = snmp_int(value)
+            if octets is not None:
+                setattr(interface, column, octets)
+                interface.counter_bits = counter_bits
+        elif column in ('in_errors', 'out_errors'):  # Contadores de errores (32 bits)
+            setattr(interface, column, snmp_int(value))
+        elif column == 'speed':  # ifSpeed, salvo que ifHighSpeed dé un valor mejor
+            if interface.speed is None:
+                interface.speed = snmp_int(value)
+        elif column == 'high_speed':  # ifHighSpeed va en Mb/s
+            speed = snmp_int(value)
+            if speed:
+                interface.speed = speed * 1000000
     
-    return info if len(info) > 1 else None
+    return interface
+
+def get_interface_counters(ip, community, deadline=None):
+    """Obtiene solo los contadores de tráfico y errores y la velocidad, de 64 bits si el agente tiene ifXTable"""
+    rows = get_snmp_table(ip, community, dict(IF_HC_COUNTER_COLUMNS, **IF_RATE_COLUMNS),
+                          timeout=remaining_time(deadline, 5))
+    if rows is None:
+        return {}, 64
+    if any('in_octets' in row for row in rows.values()):
+        return rows, 64
+    # Sin ifXTable solo quedan los contadores de 32 bits de ifTable
+    legacy = get_snmp_table(ip, community, IF_COUNTER_COLUMNS, timeout=remaining_time(deadline, 5))
+    for if_index, row in (legacy or {}).items():
+        rows.setdefault(if_index, {}).update(row)
+    return rows, 32
+
+def get_interface_signature(ip, community, deadline=None, indices=()):
+    """Lee los indicadores de cambio de la tabla de interfaces solo con GET, sin recorrer columnas
+
+    ifNumber y ifTableLastChange delatan altas y bajas de filas. El
+    ifLastChange de las filas ya guardadas (`indices`) va en las mismas
+    PDU, de SIGNATURE_BATCH en SIGNATURE_BATCH, y delata los cambios de
+    estado. Una fila sin valor (borrada, o una PDU sin respuesta) queda a
+    None y obliga a recorrer la tabla.
+    """
+    column = IF_LAST_CHANGE_COLUMN['last_change']
+    oids = [IF_NUMBER_OID, IF_TABLE_LAST_CHANGE_OID, SYS_UPTIME_OID] + [f"{column}.{index}" for index in indices]
+    values = {}
+    for start in range(0, len(oids), SIGNATURE_BATCH):
+        values.update(get_snmp_values(ip, community, oids[start:start + SIGNATURE_BATCH],
+                                      remaining_time(deadline, 2)))
+        if not start and all(value is None for value in values.values()):
+            return None
+    return {
+        'uptime': uptime_ticks(values[SYS_UPTIME_OID]),
+        'if_number': snmp_int(values[IF_NUMBER_OID]),
+        'table_last_change': uptime_ticks(values[IF_TABLE_LAST_CHANGE_OID]),
+        'rows': {index: uptime_ticks(values[f"{column}.{index}"]) for index in indices},
+    }
 
-def get_interfaces_info(ip, community='public'):
-    """Obtiene información de interfaces de red con mejor formato"""
+def get_interfaces_info(ip, community='public', deadline=None, counters=False, cache=None):
+    """Obtiene las interfaces de red como {ifIndex: Interface}"""
     try:
-        result = subprocess.run(
-            ['snmpwalk', '-v2c', '-c', community, '-t', '1', '-r', '0', ip, '1.3.6.1.2.1.2.2.1'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        timeout = remaining_time(deadline, 5)
+        if timeout <= 0:
+            return None
         
-        if result.returncode != 0:
+        signature = None
+        if cache is not None:
+            signature = get_interface_signature(ip, community, deadline, cache.interface_indices(ip))
+            if signature is None:
+                return None
+            interfaces, changed = cache.lookup_interfaces(ip, signature)
+            if interfaces is not None:
+                # La tabla no ha cambiado de forma: solo se releen las filas con ifLastChange distinto
+                if changed:
+                    oids = {f"{oid}.{if_index}": (if_index, column)
+                            for if_index in changed for column, oid in IF_COLUMNS.items()}
+                    values = get_snmp_values(ip, community, list(oids), remaining_time(deadline, 2))
+                    rows = {}
+                    for oid, value in values.items():
+                        if value is not None:
+                            if_index, column = oids[oid]
+                            rows.setdefault(if_index, {})[column] = value
+                    with METRICS.timed('clean'):
+                        for if_index, row in rows.items():
+                            interfaces[int(if_index)] = parse_interface_row(if_index, row)
+                cache.store_interfaces(ip, signature, interfaces, refetched=False)
+                if counters:
+                    counter_rows, counter_bits = get_interface_counters(ip, community, deadline)
+                    for if_index, row in counter_rows.items():
+                        if int(if_index) in interfaces:
+                            interfaces[int(if_index)].update(parse_interface_row(if_index, row, counter_bits))
+                return interfaces or None
+        
+        columns = dict(IF_COLUMNS, **IF_HC_COUNTER_COLUMNS, **IF_RATE_COLUMNS) if counters else IF_COLUMNS
+        if cache is not None:
+            # El ifLastChange de cada fila viaja en el mismo recorrido y completa la firma
+            columns = dict(columns, **IF_LAST_CHANGE_COLUMN)
+        rows = get_snmp_table(ip, community, columns, timeout=remaining_time(deadline, 5))
+        
+        if rows is None:
             return None
+        
+        counter_bits = 64
+        if counters and not any('in_octets' in row for row in rows.values()):
+            # Sin ifXTable solo quedan los contadores de 32 bits de ifTable
+            counter_bits = 32
+            legacy = get_snmp_table(ip, community, IF_COUNTER_COLUMNS,
+                                    timeout=remaining_time(deadline, 5))
+            for if_index, row in (legacy or {}).items():
+                rows.setdefault(if_index, {}).update(row)
             
         interfaces = {}
         
-        for line in result.stdout.splitlines():
-            if '=' not in line:
-                continue
-                
-            oid_part, value_part = line.split('=', 1)
-            oid_parts = oid_part.strip().split('.')
-            
-            if len(oid_parts) < 2:
-                continue
-                
-            oid_type = oid_parts[-2]
-            if_index = oid_parts[-1]
-            value = value_part.strip()
-            
-            if if_index not in interfaces:
-                interfaces[if_index] = {}
-            
-            if oid_type == '2':  # Interface Description
-                interfaces[if_index]['name'] = clean_snmp_output(value)
-            elif oid_type == '6':  # MAC Address
-                if 'Hex-STRING:' in value:
-                    mac = value.replace('Hex-STRING:', '').strip().upper()
-                    interfaces[if_index]['mac'] = clean_mac_address(mac)
-            elif oid_type == '8':  # Interface Status
-                interfaces[if_index]['status'] = 'Up' if '1' in value else 'Down'
+        with METRICS.timed('clean'):
+            for if_index, row in rows.items():
+                interface = parse_interface_row(if_index, row, counter_bits)
+                interfaces[interface.index] = interface
         
         # Filtrar interfaces válidas
         valid_interfaces = {}
-        for if_id, if_data in interfaces.items():
-            if 'name' in if_data or 'mac' in if_data:
-                valid_interfaces[if_id] = if_data
+        for if_id, interface in interfaces.items():
+            if interface.name is not None or interface.mac:
+                valid_interfaces[if_id] = interface
+        
+        if cache is not None:
+            signature['rows'] = {str(if_index): uptime_ticks(rows[str(if_index)].get('last_change'))
+                                 for if_index in valid_interfaces}
+            cache.store_interfaces(ip, signature, valid_interfaces)
         
         return valid_interfaces if valid_interfaces else None
         
@@ -141,8 +2422,649 @@ def get_interfaces_info(ip, community='public'):
         console.print(f"[red]Error obteniendo interfaces: {str(e)}[/red]")
         return None
 
+class RingSeries:
+    """Serie de contadores de una interfaz en un buffer circular de tamaño fijo
+
+    El hueco de la serie es una cabecera seguida de tres arrays de `capacity`
+    elementos (instante, octetos de entrada y de salida) vistos directamente
+    sobre el buffer, sin objetos Python por muestra.
+    """
+    KEY_SIZE = 48
+    HEADER = struct.Struct(f'<{KEY_SIZE}sIIII')  # ip, ifIndex, cabeza, número de muestras, bits del contador
+    __slots__ = ('buffer', 'capacity', 'times', 'inbound', 'outbound')
+
+    def __init__(self, buffer, capacity):
+        self.buffer = buffer
+        self.capacity = capacity
+        start = self.HEADER.size
+        size = 8 * capacity
+        self.times = buffer[start:start + size].cast('d')
+        self.inbound = buffer[start + size:start + 2 * size].cast('Q')
+        self.outbound = buffer[start + 2 * size:start + 3 * size].cast('Q')
+
+    @classmethod
+    def slot_size(cls, capacity):
+        return cls.HEADER.size + 24 * capacity
+
+    @property
+    def key(self):
+        ip, if_index, _, _, _ = self.HEADER.unpack_from(self.buffer)
+        return ip.rstrip(b'\0').decode(), str(if_index)
+
+    def init(self, ip, if_index, counter_bits):
+        self.HEADER.pack_into(self.buffer, 0, ip.encode(), int(if_index), 0, 0, counter_bits)
+
+    def append(self, timestamp, in_octets, out_octets, counter_bits):
+        ip, if_index, head, count, _ = self.HEADER.unpack_from(self.buffer)
+        self.times[head] = timestamp
+        self.inbound[head] = in_octets
+        self.outbound[head] = out_octets
+        self.HEADER.pack_into(self.buffer, 0, ip, if_index, (head + 1) % self.capacity,
+                              min(count + 1, self.capacity), counter_bits)
+
+    def samples(self):
+        """Devuelve las muestras [(instante, entrada, salida)] de la más antigua a la más reciente"""
+        _, _, head, count, _ = self.HEADER.unpack_from(self.buffer)
+        start = (head - count) % self.capacity
+        positions = [(start + offset) % self.capacity for offset in range(count)]
+        return [(self.times[i], self.inbound[i], self.outbound[i]) for i in positions]
+
+    @property
+    def counter_bits(self):
+        return self.HEADER.unpack_from(self.buffer)[4]
+
+class CounterStore:
+    """Almacén de contadores de tráfico por interfaz con memoria fija por serie
+
+    Con `path` las series viven en un fichero mapeado en memoria, de modo que
+    el historial sobrevive a un reinicio; sin él se guardan solo en RAM.
+    Un fichero existente conserva el tamaño con el que se creó. Las series
+    que no caben, por estar lleno o por tener una clave demasiado larga, se
+    descartan y se cuentan en `dropped`.
+    """
+    HEADER = struct.Struct('<8sII')  # firma, muestras por serie, número máximo de series
+    MAGIC = b'TMDCNT01'
+
+    def __init__(self, path=None, capacity=1440, max_series=4096):
+        self.path = path
+        self.lock = threading.Lock()
+        self.series = {}
+        self.dropped = collections.Counter()
+        self.mmap = None
+        self.file = None
+        
+        if path and os.path.exists(path) and os.path.getsize(path) >= self.HEADER.size:
+            self.file = open(path, 'r+b')
+            try:
+                self.mmap = mmap.mmap(self.file.fileno(), 0)
+                magic, stored_capacity, stored_series = self.HEADER.unpack_from(self.mmap)
+                if magic != self.MAGIC:
+                    raise ValueError(f"{path} no es un fichero de historial de contadores")
+                if len(self.mmap) < self.HEADER.size + stored_series * RingSeries.slot_size(stored_capacity):
+                    raise ValueError(f"{path} está truncado: no caben las {stored_series} series de su cabecera")
+            except BaseException:
+                if self.mmap is not None:
+                    self.mmap.close()
+                self.file.close()
+                raise
+            if (stored_capacity, stored_series) != (capacity, max_series):
+                console.print(f"[yellow]{path} se creó con {stored_capacity} muestras y {stored_series} series; "
+                              f"se mantiene ese tamaño en lugar de {capacity} muestras y {max_series} series. "
+                              f"Bórralo o usa otro fichero para cambiarlo.[/yellow]")
+            capacity, max_series = stored_capacity, stored_series
+        elif path:
+            self.file = open(path, 'w+b')
+            self.file.truncate(self.HEADER.size + max_series * RingSeries.slot_size(capacity))
+            self.mmap = mmap.mmap(self.file.fileno(), 0)
+            self.HEADER.pack_into(self.mmap, 0, self.MAGIC, capacity, max_series)
+        
+        self.capacity = capacity
+        self.max_series = max_series
+        self.free_slot = 0
+        if self.mmap is not None:
+            # Recuperar las series que ya tenía el fichero
+            view = memoryview(self.mmap)
+            slot_size = RingSeries.slot_size(capacity)
+            for slot in range(max_series):
+                offset = self.HEADER.size + slot * slot_size
+                series = RingSeries(view[offset:offset + slot_size], capacity)
+                if series.buffer[0] == 0:
+                    break
+                self.series[series.key] = series
+                self.free_slot = slot + 1
+
+    def _new_series(self, ip, if_index, counter_bits):
+        if len(ip.encode()) > RingSeries.KEY_SIZE or not 0 <= int(if_index) < 2 ** 32:
+            self._drop('clave demasiado larga', f"{ip} interfaz {if_index}: la clave no cabe en el historial, "
+                                                f"no se guarda")
+            return None
+        if len(self.series) >= self.max_series:
+            self._drop('historial lleno', f"Historial lleno ({self.max_series} series): las interfaces nuevas "
+                                          f"no se guardan; aumenta --series con un fichero nuevo")
+            return None
+        slot_size = RingSeries.slot_size(self.capacity)
+        if self.mmap is not None:
+            offset = self.HEADER.size + self.free_slot * slot_size
+            buffer = memoryview(self.mmap)[offset:offset + slot_size]
+        else:
+            buffer = memoryview(bytearray(slot_size))
+        self.free_slot += 1
+        series = RingSeries(buffer, self.capacity)
+        series.init(ip, if_index, counter_bits)
+        self.series[(ip, str(if_index))] = series
+        return series
+
+    def _drop(self, reason, message):
+        # Se avisa la primera vez de cada motivo; el resto solo se cuenta
+        if not self.dropped[reason]:
+            console.print(f"[yellow]{message}[/yellow]")
+        self.dropped[reason] += 1
+        METRICS.count('history_dropped', reason=reason)
+
+    def append(self, ip, if_index, timestamp, in_octets, out_octets, counter_bits=64):
+        """Añade una muestra; devuelve False si su serie no cabe en el almacén"""
+        with self.lock:
+            series = self.series.get((ip, str(if_index)))
+            if series is None:
+                series = self._new_series(ip, if_index, counter_bits)
+                if series is None:
+                    return False
+            series.append(timestamp, in_octets, out_octets, counter_bits)
+            return True
+
+    def record(self, ip, interfaces, timestamp=None):
+        """Guarda los contadores de todas las interfaces devueltas por get_interfaces_info"""
+        timestamp = time.time() if timestamp is None else timestamp
+        for if_index, interface in (interfaces or {}).items():
+            if interface.in_octets is not None and interface.out_octets is not None:
+                self.append(ip, if_index, timestamp, interface.in_octets, interface.out_octets,
+                            interface.counter_bits or 64)
+
+    def samples(self, ip, if_index):
+        series = self.series.get((ip, str(if_index)))
+        return series.samples() if series else []
+
+    def __len__(self):
+        return len(self.series)
+
+    def flush(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+
+    def close(self):
+        if self.mmap is not None:
+            self.flush()
+            for series in self.series.values():
+                for view in (series.times, series.inbound, series.outbound, series.buffer):
+                    view.release()
+            self.series = {}
+            self.mmap.close()
+            self.file.close()
+            self.mmap = None
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """Importa NumPy al primer uso; None si no está instalado"""
+    try:
+        import numpy
+    except ImportError:  # Solo hace falta para el cálculo de tasas (--tasas)
+        return None
+    return numpy
+
+RESET_TOLERANCE = 1.05  # una vuelta de contador que supera la velocidad del enlace más de esto es un reinicio
+SATURATION = 80         # utilización a partir de la que un enlace cuenta como saturado
+
+class RateEngine:
+    """Tasas, utilización y errores de todas las interfaces, calculados por columnas con NumPy
+
+    Cada sondeo deja sus contadores en una cola con observe() y compute()
+    procesa de una vez todo lo acumulado en el ciclo. El estado vive en
+    arrays con una fila por (IP, ifIndex). Las diferencias se hacen en
+    aritmética uint64 enmascarada a 32 o 64 bits, de modo que las vueltas
+    del contador salen solas. Un sysUpTime que retrocede (reinicio), un
+    cambio de ancho del contador o una vuelta imposible para la velocidad
+    del enlace invalidan esa muestra en lugar de dar un pico falso.
+    Las columnas solo se leen y se escriben con `lock` tomado, así que el
+    panel puede consultar mientras el planificador calcula.
+    """
+    STATE = {  # columna -> (tipo, valor inicial)
+        'time': ('float64', float('nan')),
+        'uptime': ('int64', -1),
+        'inbound': ('uint64', 0),
+        'outbound': ('uint64', 0),
+        'in_errors': ('uint64', 0),
+        'out_errors': ('uint64', 0),
+        'errors_known': ('bool', False),
+        'bits': ('uint8', 0),
+        'speed': ('float64', 0.0),
+        'device': ('int64', -1),
+        'in_bps': ('float64', float('nan')),
+        'out_bps': ('float64', float('nan')),
+        'utilization': ('float64', float('nan')),
+        'errors': ('float64', float('nan')),
+    }
+    ORDERS = ('utilization', 'bps', 'errors')
+
+    def __init__(self, stale_after=None, capacity=1024):
+        self.np = load_numpy()
+        if self.np is None:
+            raise ValueError('el cálculo de tasas necesita NumPy')
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.rows = {}
+        self.keys = []
+        self.names = []
+        self.devices = {}
+        self.capacity = 0
+        self.columns = {}
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        np = self.np
+        for name, (dtype, fill) in self.STATE.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            if name in self.columns:
+                column[:self.capacity] = self.columns[name]
+            self.columns[name] = column
+        self.capacity = capacity
+
+    def _row(self, key, name):
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.keys)
+            if row >= self.capacity:
+                self._grow(2 * self.capacity)
+            self.keys.append(key)
+            self.names.append(name)
+            self.columns['device'][row] = self.devices.setdefault(key[0], len(self.devices))
+        else:
+            self.names[row] = name
+        return row
+
+    def observe(self, ip, interfaces, uptime=None, timestamp=None):
+        """Encola los contadores de un sondeo; las tasas se calculan en el siguiente compute()"""
+        timestamp = time.time() if timestamp is None else timestamp
+        uptime = -1 if uptime is None else uptime
+        with self.lock:
+            for if_index, interface in interfaces.items():
+                if interface.in_octets is None or interface.out_octets is None:
+                    continue
+                errors_known = interface.in_errors is not None and interface.out_errors is not None
+                # Si la interfaz ya estaba en cola, la muestra nueva sustituye a la vieja
+                self.pending[(ip, if_index)] = (
+                    interface.name or str(if_index), timestamp, uptime, interface.in_octets,
+                    interface.out_octets, interface.in_errors or 0, interface.out_errors or 0, errors_known,
+                    interface.counter_bits or 64, interface.speed or 0)
+
+    def compute(self):
+        """Calcula las tasas de todo lo observado desde la última llamada; devuelve cuántas son válidas"""
+        np = self.np
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            rows = np.fromiter((self._row(key, sample[0]) for key, sample in pending.items()),
+                               np.intp, len(pending))
+            
+            (_, now, uptime, inbound, outbound, in_errors, out_errors,
+             errors_known, bits, speed) = zip(*pending.values())
+            now = np.array(now, dtype='float64')
+            uptime = np.array(uptime, dtype='int64')
+            inbound = np.array(inbound, dtype='uint64')
+            outbound = np.array(outbound, dtype='uint64')
+            in_errors = np.array(in_errors, dtype='uint64')
+            out_errors = np.array(out_errors, dtype='uint64')
+            errors_known = np.array(errors_known, dtype='bool')
+            bits = np.array(bits, dtype='uint8')
+            speed = np.array(speed, dtype='float64')
+            
+            state = {name: column[rows] for name, column in self.columns.items()}
+            mask = np.where(bits == 32, np.uint64(0xFFFFFFFF), np.uint64(0xFFFFFFFFFFFFFFFF))
+            error_mask = np.uint64(0xFFFFFFFF)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                elapsed = now - state['time']
+                in_bps = ((inbound - state['inbound']) & mask) * 8.0 / elapsed
+                out_bps = ((outbound - state['outbound']) & mask) * 8.0 / elapsed
+                busiest = np.maximum(in_bps, out_bps)
+                utilization = np.where(speed > 0, busiest / speed * 100, np.nan)
+                errors = (((in_errors - state['in_errors']) & error_mask)
+                          + ((out_errors - state['out_errors']) & error_mask)) / elapsed
+            
+            wrapped = (inbound < state['inbound']) | (outbound < state['outbound'])
+            rebooted = (uptime >= 0) & (state['uptime'] >= 0) & (uptime < state['uptime'])
+            # Un contador de 64 bits no da la vuelta en la práctica: si baja, se ha puesto a cero
+            impossible = wrapped & ((bits == 64) | ((speed > 0) & (busiest > speed * RESET_TOLERANCE)))
+            valid = (~np.isnan(state['time']) & (elapsed > 0) & (bits == state['bits'])
+                     & ~rebooted & ~impossible)
+            
+            columns = self.columns
+            columns['in_bps'][rows] = np.where(valid, in_bps, np.nan)
+            columns['out_bps'][rows] = np.where(valid, out_bps, np.nan)
+            columns['utilization'][rows] = np.where(valid, utilization, np.nan)
+            columns['errors'][rows] = np.where(valid & errors_known & state['errors_known'], errors, np.nan)
+            columns['time'][rows] = now
+            columns['uptime'][rows] = uptime
+            columns['inbound'][rows] = inbound
+            columns['outbound'][rows] = outbound
+            columns['in_errors'][rows] = in_errors
+            columns['out_errors'][rows] = out_errors
+            columns['errors_known'][rows] = errors_known
+            columns['bits'][rows] = bits
+            columns['speed'][rows] = speed
+            return int(valid.sum())
+
+    def _fresh(self):
+        """Filas con tasa válida y, si hay `stale_after`, sondeadas hace poco"""
+        np = self.np
+        size = len(self.keys)
+        fresh = ~np.isnan(self.columns['in_bps'][:size])
+        if self.stale_after is not None:
+            fresh &= self.columns['time'][:size] >= time.time() - self.stale_after
+        return fresh
+
+    def _describe(self, row):
+        ip, if_index = self.keys[row]
+        values = {name: float(self.columns[name][row]) for name in ('in_bps', 'out_bps', 'utilization', 'errors')}
+        described = {'ip': ip, 'if_index': if_index, 'name': self.names[row],
+                     'speed': int(self.columns['speed'][row]) or None}
+        described.update({name: None if value != value else round(value, 3) for name, value in values.items()})
+        return described
+
+    def top(self, count=10, order='utilization'):
+        """Las `count` interfaces más cargadas por utilización, tráfico total (bps) o errores"""
+        np = self.np
+        with self.lock:
+            size = len(self.keys)
+            if order == 'bps':
+                values = self.columns['in_bps'][:size] + self.columns['out_bps'][:size]
+            else:
+                values = self.columns[order][:size]
+            candidates = np.flatnonzero(self._fresh() & ~np.isnan(values))
+            if len(candidates) > count:
+                candidates = candidates[np.argpartition(values[candidates], -count)[-count:]]
+            ordered = candidates[np.argsort(values[candidates])[::-1]]
+            return [self._describe(row) for row in ordered]
+
+    def current(self):
+        """Tasas vigentes por (IP, ifIndex) como (bps de entrada, bps de salida, utilización)"""
+        np = self.np
+        with self.lock:
+            size = len(self.keys)
+            rows = np.flatnonzero(self._fresh())
+            values = zip(*(np.round(self.columns[name][:size][rows], 3).tolist()
+                           for name in ('in_bps', 'out_bps', 'utilization')))
+            return {self.keys[row]: tuple(None if value != value else value for value in sample)
+                    for row, sample in zip(rows.tolist(), values)}
+
+    def aggregates(self):
+        """Totales de la flota sobre las interfaces con tasa válida"""
+        np = self.np
+        with self.lock:
+            size = len(self.keys)
+            fresh = self._fresh()
+            utilization = self.columns['utilization'][:size][fresh]
+            utilization = utilization[~np.isnan(utilization)]
+            errors = self.columns['errors'][:size][fresh]
+            return {
+                'interfaces': int(fresh.sum()),
+                'devices': int(np.unique(self.columns['device'][:size][fresh]).size),
+                'in_bps': float(self.columns['in_bps'][:size][fresh].sum()),
+                'out_bps': float(self.columns['out_bps'][:size][fresh].sum()),
+                'utilization_mean': round(float(utilization.mean()), 3) if utilization.size else None,
+                'utilization_max': round(float(utilization.max()), 3) if utilization.size else None,
+                'saturated': int((utilization >= SATURATION).sum()),
+                'errors_per_s': float(np.nansum(errors)),
+            }
+
+class StageTimer:
+    """Acumula cuántas veces y durante cuánto tiempo se ejecuta cada etapa del escaneo"""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.lock = threading.Lock()
+        self.stages = {}  # nombre -> [veces, segundos acumulados, primer inicio, último fin]
+
+    @contextlib.contextmanager
+    def stage(self, name, ip=None):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            ended = time.monotonic()
+            METRICS.observe('stage', ended - started, stage=name)
+            if ip is not None:
+                METRICS.count('device_seconds', ended - started, ip=ip, stage=name)
+            with self.lock:
+                entry = self.stages.setdefault(name, [0, 0.0, started, ended])
+                entry[0] += 1
+                entry[1] += ended - started
+                entry[2] = min(entry[2], started)
+                entry[3] = max(entry[3], ended)
+
+    def merge(self, stages):
+        """Suma las etapas medidas en otro proceso (el reloj monotónico es común a toda la máquina)"""
+        with self.lock:
+            for name, (count, total, first, last) in stages.items():
+                entry = self.stages.setdefault(name, [0, 0.0, first, last])
+                entry[0] += count
+                entry[1] += total
+                entry[2] = min(entry[2], first)
+                entry[3] = max(entry[3], last)
+
+    def report(self):
+        """Líneas con el desglose por etapa, relativo al inicio del escaneo"""
+        lines = []
+        for name, (count, total, first, last) in self.stages.items():
+            lines.append(f"  {name:<15} {count:>5} x  {total:8.2f} s acumulados, "
+                         f"activa de {first - self.origin:.2f} s a {last - self.origin:.2f} s")
+        return lines
+
+def collect_devices(ips, community='public', concurrency=32, device_timeout=10, networks=None,
+                    interfaces=False, cache=None, timer=None, icmp=False, on_device=None,
+                    profiles=(), profile_overrides=None):
+    """Tubería de recogida con descubrimiento, sistema e interfaces solapados
+
+    Cada dispositivo entra en el pool en cuanto se conoce, incluidos los que
+    va encontrando el barrido de `networks`, y pasa por sus etapas sin esperar
+    a los demás. `profiles` y `profile_overrides` eligen los perfiles de OIDs
+    adicionales de cada equipo (ver select_profiles). `on_device` recibe cada
+    dispositivo nada más terminarlo, desde el hilo que lo ha consultado.
+    Devuelve (dispositivos, descubiertos, encendidos sin SNMP).
+    """
+    timer = timer or StageTimer()
+    
+    def poll(ip):
+        # El límite empieza a contar cuando un hilo libre toma el dispositivo
+        deadline = time.monotonic() + device_timeout
+        with timer.stage('sistema', ip):
+            device = get_system_info(ip, community, deadline, cache)
+        if device and interfaces:
+            with timer.stage('interfaces', ip):
+                device.interfaces = get_interfaces_info(ip, community, deadline, cache=cache)
+        selected = select_profiles(device, profiles, profile_overrides) if device else []
+        if selected:
+            with timer.stage('metricas', ip):
+                device.metrics = get_profile_metrics(ip, community, selected, deadline)
+        if device and on_device:
+            with timer.stage('salida', ip):
+                on_device(device)
+        return device
+    
+    futures = {}
+    found = []
+    silent = []
+    alive_without_snmp = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for ip in ips:
+            if ip not in futures:
+                futures[ip] = pool.submit(poll, ip)
+        
+        if networks:
+            with timer.stage('descubrimiento'):
+                for ip in iter_discovered_hosts(networks, community, silent=silent):
+                    found.append(ip)
+                    if ip not in futures:
+                        futures[ip] = pool.submit(poll, ip)
+            if icmp and silent:
+                with timer.stage('icmp'):
+                    alive_without_snmp = [ip for ip, alive in zip(silent, pool.map(ping_host, silent))
+                                          if alive]
+        
+        devices = [future.result() for future in futures.values()]
+    
+    # Los explícitos en el orden dado; los descubiertos, por dirección
+    explicit = len(dict.fromkeys(ips))
+    order = {ip: position for position, ip in enumerate(expand_networks(networks or []))}
+    discovered = sorted(zip(list(futures)[explicit:], devices[explicit:]), key=lambda item: order.get(item[0], 0))
+    devices = devices[:explicit] + [device for _, device in discovered]
+    
+    return [device for device in devices if device], found, alive_without_snmp
+
+# --- Ejecución repartida en varios procesos (--procesos) ---
+
+FRAME_HEADER = struct.Struct('!I')  # longitud de cada mensaje JSON del canal con los trabajadores
+
+def shard_for(ip, shards):
+    """Proceso al que toca una IP; el reparto es estable entre ejecuciones y máquinas"""
+    return zlib.crc32(ip.encode()) % shards
+
+def send_frame(sock, message):
+    """Envía un mensaje como JSON compacto precedido de su longitud"""
+    payload = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode()
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+class FrameReader:
+    """Reconstruye los mensajes de un canal a partir de los bytes que van llegando"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack_from(self.buffer)
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            messages.append(json.loads(self.buffer[FRAME_HEADER.size:end]))
+            del self.buffer[:end]
+        return messages
+
+def shard_worker(address, shard, config):
+    """Proceso trabajador: consulta su parte de los destinos y envía cada resultado por el canal
+
+    Solo necesita la dirección del coordinador y la configuración, así que
+    podría ejecutarse igual en otra máquina.
+    """
+    configure(SnmpConfig.from_dict(config['snmp']))
+    METRICS.enabled = config['metrics']
+    console.use(PlainConsole(sys.stderr))
+    cache = DeviceCache(config['cache'], config['cache_ttl']) if config['cache'] else None
+    
+    sock = socket.create_connection(address)
+    lock = threading.Lock()
+    
+    def on_device(device):
+        with lock:
+            send_frame(sock, {'device': device.to_dict()})
+    
+    timer = StageTimer()
+    with sock:
+        collect_devices(config['ips'], config['community'], config['concurrency'], config['device_timeout'],
+                        interfaces=config['interfaces'], cache=cache, timer=timer, on_device=on_device,
+                        profiles=config['profiles'], profile_overrides=config['profile_overrides'])
+        done = {'done': shard, 'stages': timer.stages, 'metrics': METRICS.snapshot()}
+        if cache is not None:
+            done['cache'] = {ip: cache.entries[ip] for ip in config['ips'] if ip in cache.entries}
+            done['cache_stats'] = dict(cache.stats)
+        with lock:
+            send_frame(sock, done)
+
+def collect_devices_sharded(ips, community='public', concurrency=32, device_timeout=10, processes=2,
+                            interfaces=False, cache=None, timer=None, on_device=None,
+                            profiles=(), profile_overrides=None):
+    """Reparte los destinos entre varios procesos trabajadores y une sus resultados
+
+    Cada trabajador ejecuta collect_devices sobre las IPs que le asigna
+    shard_for, con `concurrency` hilos propios, y se conecta por TCP local
+    al coordinador para enviar cada dispositivo en cuanto lo termina.
+    Devuelve los dispositivos que respondieron en el orden de `ips`.
+    """
+    timer = timer or StageTimer()
+    ips = list(dict.fromkeys(ips))
+    shards = [[] for _ in range(processes)]
+    for ip in ips:
+        shards[shard_for(ip, processes)].append(ip)
+    
+    server = socket.create_server(('127.0.0.1', 0))
+    context = multiprocessing.get_context('spawn')
+    snmp = CONFIG.to_dict(sum(1 for shard_ips in shards if shard_ips) or 1)
+    workers = []
+    for shard, shard_ips in enumerate(shards):
+        if not shard_ips:
+            continue
+        config = {
+            'ips': shard_ips, 'community': community, 'concurrency': concurrency,
+            'device_timeout': device_timeout, 'interfaces': interfaces,
+            'profiles': list(profiles or ()), 'profile_overrides': profile_overrides,
+            'snmp': snmp, 'metrics': METRICS.enabled,
+            'cache': cache.path if cache is not None else None,
+            'cache_ttl': cache.ttl if cache is not None else None,
+        }
+        worker = context.Process(target=shard_worker, args=(server.getsockname(), shard, config), daemon=True)
+        worker.start()
+        workers.append(worker)
+    
+    results = {}
+    finished = 0
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    try:
+        while finished < len(workers):
+            events = selector.select(timeout=1)
+            if not events and not any(worker.is_alive() for worker in workers):
+                break  # Algún trabajador murió sin terminar su parte
+            for key, _ in events:
+                if key.fileobj is server:
+                    connection, _ = server.accept()
+                    selector.register(connection, selectors.EVENT_READ, FrameReader())
+                    continue
+                data = key.fileobj.recv(1 << 16)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                for message in key.data.feed(data):
+                    if 'device' in message:
+                        device = Device.from_dict(message['device'])
+                        results[device.ip] = device
+                        if on_device:
+                            on_device(device)
+                    elif 'done' in message:
+                        finished += 1
+                        timer.merge(message['stages'])
+                        METRICS.merge(message['metrics'])
+                        if cache is not None:
+                            cache.merge(message.get('cache', {}), message.get('cache_stats', {}))
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        for worker in workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+    
+    if finished < len(workers):
+        console.print(f"[red]{len(workers) - finished} procesos trabajadores terminaron sin completar su parte[/red]")
+    return [results[ip] for ip in ips if ip in results]
+
 def display_devices_table(devices):
     """Muestra la tabla de dispositivos con formato mejorado"""
+    from rich.table import Table
+    
     if not devices:
         console.print("[red]No se encontraron dispositivos SNMP.[/red]")
         return
@@ -156,86 +3078,1492 @@ def display_devices_table(devices):
     table.add_column("Contacto")
     
     for device in devices:
+        description = device.description or 'N/A'
         table.add_row(
-            device['ip'],
-            device.get('System Name', 'N/A'),
-            device.get('System Description', 'N/A')[:50] + ('...' if len(device.get('System Description', '')) > 50 else ''),
-            device.get('Location', 'N/A'),
-            device.get('Uptime', 'N/A'),
-            device.get('Contact', 'N/A')
+            device.ip,
+            device.name or 'N/A',
+            description[:50] + ('...' if len(description) > 50 else ''),
+            device.location or 'N/A',
+            device.uptime_text or 'N/A',
+            device.contact or 'N/A'
         )
     
-    console.print(table)
+    with METRICS.timed('render', table='dispositivos'):
+        console.print(table)
 
 def display_interfaces_table(devices):
-    """Muestra las interfaces con el formato mejorado"""
+    """Muestra las interfaces ya recogidas con el formato mejorado"""
+    from rich.table import Table
+    
     if not devices:
         console.print("[yellow]No hay dispositivos para mostrar interfaces[/yellow]")
         return
     
     for device in devices:
-        interfaces = get_interfaces_info(device['ip'])
+        interfaces = device.interfaces
         if not interfaces:
-            console.print(f"[yellow]No se encontraron interfaces para {device.get('System Name', device['ip'])}[/yellow]")
+            console.print(f"[yellow]No se encontraron interfaces para {device.label}[/yellow]")
             continue
             
-        if_table = Table(title=f"Interfaces de {device.get('System Name', device['ip'])}", 
+        if_table = Table(title=f"Interfaces de {device.label}", 
                         header_style="bold green")
         if_table.add_column("ID")
         if_table.add_column("Nombre")
         if_table.add_column("MAC")
         if_table.add_column("Estado")
         
-        for if_id, if_data in sorted(interfaces.items(), key=lambda x: int(x[0])):
+        for if_id, interface in sorted(interfaces.items()):
             if_table.add_row(
-                if_id,
-                if_data.get('name', 'N/A'),
-                if_data.get('mac', 'N/A'),
-                if_data.get('status', 'N/A')
+                str(if_id),
+                interface.name or 'N/A',
+                interface.mac_text or 'N/A',
+                interface.status or 'N/A'
+            )
+        
+        with METRICS.timed('render', table='interfaces'):
+            console.print(if_table)
+
+def format_bytes(size):
+    """Formatea un tamaño en bytes con la unidad binaria adecuada"""
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def display_metrics_table(devices):
+    """Muestra un resumen de los perfiles adicionales recogidos de cada equipo"""
+    from rich.table import Table
+    
+    devices = [device for device in devices if device.metrics]
+    if not devices:
+        return
+    
+    table = Table(title="Métricas por perfil", header_style="bold magenta")
+    table.add_column("IP", style="cyan")
+    table.add_column("Nombre")
+    table.add_column("CPU", justify="right")
+    table.add_column("Memoria")
+    table.add_column("Discos")
+    table.add_column("Interfaces (ifX)")
+    
+    for device in devices:
+        metrics = device.metrics
+        host = metrics.get('host-resources') or {}
+        cpu = f"{host['cpu_load']:g}% ({host['cpus']})" if host.get('cpu_load') is not None else 'N/A'
+        memory = host.get('memory')
+        memory = (f"{format_bytes(memory['used'])} / {format_bytes(memory['size'])} ({memory['percent']:g}%)"
+                  if memory else 'N/A')
+        disks = ', '.join(f"{disk['description']} {disk['percent']:g}%" for disk in host.get('disks', [])) or 'N/A'
+        if_x = (metrics.get('if-extendido') or {}).get('interfaces')
+        links = 'N/A'
+        if if_x:
+            speeds = [row['speed_mbps'] for row in if_x.values() if row.get('speed_mbps')]
+            links = f"{len(if_x)}" + (f", hasta {max(speeds):,} Mb/s" if speeds else '')
+        table.add_row(device.ip, device.name or 'N/A', cpu, memory, disks, links)
+    
+    with METRICS.timed('render', table='metricas'):
+        console.print(table)
+
+# --- Panel en vivo (--panel) ---
+
+def ip_sort_key(ip):
+    """Clave para ordenar direcciones numéricamente; las que no lo son van al final"""
+    try:
+        return (0, int(ipaddress.ip_address(ip.partition(':')[0])), ip)
+    except ValueError:
+        return (1, 0, ip)
+
+def matches_pattern(pattern, *values):
+    """Indica si algún valor encaja con el patrón (comodines * y ?); sin patrón, siempre"""
+    return not pattern or any(value and fnmatch.fnmatchcase(value, pattern) for value in values)
+
+class DashboardRow:
+    """Fila del panel: una interfaz, o el propio equipo si no tiene interfaces o no responde"""
+    __slots__ = ('ip', 'if_index', 'key', 'device', 'name', 'status', 'in_bps', 'out_bps', 'utilization',
+                 'polled', 'cells')
+
+    def __init__(self, ip, if_index):
+        self.ip = ip
+        self.if_index = if_index
+        self.key = (ip_sort_key(ip), if_index or 0)
+        self.device = self.name = self.status = None
+        self.in_bps = self.out_bps = self.utilization = None
+        self.polled = None
+        self.cells = None
+
+    def set(self, values):
+        """Cambia los valores indicados; devuelve los campos que eran distintos"""
+        changed = {field for field, value in values.items() if getattr(self, field) != value}
+        for field in changed:
+            setattr(self, field, values[field])
+        if changed:
+            self.cells = None  # Se vuelven a formatear solo si la fila llega a mostrarse
+        return changed
+
+    def render(self):
+        if self.cells is None:
+            color = {'Up': 'green', 'Down': 'red'}.get(self.status, 'yellow')
+            self.cells = (
+                self.ip,
+                self.device or 'N/A',
+                '' if self.if_index is None else str(self.if_index),
+                self.name or '',
+                f"[{color}]{self.status or 'N/A'}[/{color}]",
+                format_bps(self.in_bps) if self.in_bps is not None else '-',
+                format_bps(self.out_bps) if self.out_bps is not None else '-',
+                f"{self.utilization:.1f}%" if self.utilization is not None else '-',
+                time.strftime('%H:%M:%S', time.localtime(self.polled)) if self.polled else '-',
             )
+        return self.cells
+
+DASHBOARD_ORDERS = {  # orden -> (clave, campos de la fila de los que depende)
+    'ip': (lambda row: row.key, ()),
+    'nombre': (lambda row: ((row.device or '').lower(), (row.name or '').lower(), row.key), ('device', 'name')),
+    'estado': (lambda row: (row.status == 'Up', row.key), ('status',)),
+    'trafico': (lambda row: (-((row.in_bps or 0) + (row.out_bps or 0)), row.key), ('in_bps', 'out_bps')),
+    'utilizacion': (lambda row: (-(row.utilization or 0), row.key), ('utilization',)),
+}
+SNAPSHOT_ORDERS = {  # los que el colector sabe aplicar: no guarda tasas
+    'ip': lambda ip, device, interfaces: ip_sort_key(ip),
+    'nombre': lambda ip, device, interfaces: ((device.name or '').lower(), ip_sort_key(ip)),
+    'estado': lambda ip, device, interfaces: (
+        -sum(1 for interface in (interfaces or {}).values() if interface.status != 'Up'), ip_sort_key(ip)),
+}
+
+class Dashboard:
+    """Panel en vivo de los modos vigilar y colector: una fila por interfaz, actualizada en su sitio
+
+    Los sondeos, traps y tasas solo cambian las filas afectadas, que se
+    vuelven a formatear al mostrarse. El filtro y el orden se aplican aquí,
+    sobre todas las filas, y solo se vuelve a ordenar cuando cambia algo que
+    les afecta. Rich dibuja únicamente la página visible y solo cuando ha
+    cambiado alguna de sus filas, así que el coste de dibujar depende de lo
+    que cabe en pantalla y no del tamaño de la flota.
+    """
+    KEYS = "n/p página · s orden · c solo caídas · q salir"
+
+    def __init__(self, order='ip', only_down=False, pattern=None, page_size=None, stop=None):
+        self.order = order
+        self.only_down = only_down
+        self.pattern = pattern
+        self.page_size = page_size
+        self.stop = stop or threading.Event()
+        self.page = 0
+        self.rows = {}
+        self.by_ip = collections.defaultdict(set)
+        self.sorted = []
+        self.down = 0  # filas que no están Up, llevadas al día en cada cambio
+        self.visible = set()
+        self.order_dirty = True
+        self.dirty = True
+        self.events = collections.deque(maxlen=3)
+        self.lock = threading.Lock()
+        self.live = None
+        self.threads = []
+
+    def _row(self, ip, if_index):
+        key = (ip, if_index)
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = DashboardRow(ip, if_index)
+            self.by_ip[ip].add(key)
+            self.down += 1  # Hasta el primer sondeo no consta como Up
+            self.order_dirty = True
+        return row
+
+    def _update(self, row, values):
+        """Aplica cambios a una fila y marca solo lo que hay que rehacer"""
+        was_down = row.status != 'Up'
+        changed = row.set(values)
+        if not changed:
+            return
+        self.down += (row.status != 'Up') - was_down
+        # Solo se reordena si cambia algo que use el orden o el filtro activos
+        sorting = set(DASHBOARD_ORDERS[self.order][1])
+        if self.only_down:
+            sorting.add('status')
+        if self.pattern:
+            sorting.add('device')
+        if sorting & changed:
+            self.order_dirty = True
+        elif (row.ip, row.if_index) in self.visible:
+            self.dirty = True
+
+    def update_poll(self, ip, device, elapsed, changes):
+        """on_result del PollScheduler: rehace las filas del equipo sondeado"""
+        with self.lock:
+            keys = set()
+            if not device:
+                rows = [(self._row(ip, None), {'status': 'Sin respuesta'})]
+            elif not device.interfaces:
+                rows = [(self._row(ip, None), {'device': device.label, 'status': 'Sin interfaces'})]
+            else:
+                rows = [(self._row(ip, if_index), {'device': device.label, 'name': interface.name,
+                                                   'status': interface.status})
+                        for if_index, interface in device.interfaces.items()]
+            now = time.time()
+            for row, values in rows:
+                keys.add((ip, row.if_index))
+                values['polled'] = now
+                self._update(row, values)
+            # Las filas que ya no existen (interfaces dadas de baja, o el equipo que vuelve a responder)
+            for key in self.by_ip[ip] - keys:
+                if self.rows.pop(key).status != 'Up':
+                    self.down -= 1
+                self.order_dirty = True
+            self.by_ip[ip] = keys
+            for if_id, name, old_status, new_status in changes:
+                self.events.append(f"{time.strftime('%H:%M:%S')} {ip} {name}: {old_status} -> {new_status}")
+                self.dirty = True
+
+    def update_trap(self, event, changes):
+        """Refleja en el panel un trap recibido y los cambios de estado que produce"""
+        with self.lock:
+            targets = list(self.by_ip)
+        ips = [ip for ip in targets if target_address(ip) == event['ip']]
+        with self.lock:
+            detail = f" interfaz {event['if_index']}" if event['if_index'] else ''
+            self.events.append(f"{time.strftime('%H:%M:%S')} {event['ip']} trap {event['event']}{detail}")
+            self.dirty = True
+            for if_id, name, old_status, new_status in changes:
+                for ip in ips:
+                    row = self.rows.get((ip, if_id))
+                    if row is not None:
+                        self._update(row, {'status': new_status})
+
+    def update_rates(self, engine):
+        """on_rates del PollScheduler: copia a las filas las tasas del último ciclo"""
+        current = engine.current()
+        with self.lock:
+            for key, row in self.rows.items():
+                in_bps, out_bps, utilization = current.get(key, (None, None, None))
+                self._update(row, {'in_bps': in_bps, 'out_bps': out_bps, 'utilization': utilization})
+
+    def handle_key(self, key):
+        with self.lock:
+            if key in ('n', ' '):
+                self.page += 1
+            elif key == 'p':
+                self.page = max(0, self.page - 1)
+            elif key == 's':
+                orders = list(DASHBOARD_ORDERS)
+                self.order = orders[(orders.index(self.order) + 1) % len(orders)]
+                self.order_dirty = True
+            elif key == 'c':
+                self.only_down = not self.only_down
+                self.page = 0
+                self.order_dirty = True
+            elif key == 'q':
+                self.stop.set()
+            self.dirty = True
+
+    def _matches(self, row):
+        if self.only_down and row.status == 'Up':
+            return False
+        return matches_pattern(self.pattern, row.ip, row.device)
+
+    def render(self):
+        """Construye la página visible; se llama con el cerrojo tomado"""
+        from rich.console import Group
+        from rich.table import Table
+        
+        if self.order_dirty:
+            self.sorted = sorted((row for row in self.rows.values() if self._matches(row)),
+                                 key=DASHBOARD_ORDERS[self.order][0])
+            self.order_dirty = False
+        page_size = self.page_size or max(5, console.size.height - 9)
+        pages = max(1, -(-len(self.sorted) // page_size))
+        self.page = min(self.page, pages - 1)
+        visible = self.sorted[self.page * page_size:(self.page + 1) * page_size]
+        self.visible = {(row.ip, row.if_index) for row in visible}
+        
+        filters = [name for name, active in (('solo caídas', self.only_down),
+                                             (f"patrón {self.pattern}", self.pattern)) if active]
+        table = Table(title=f"{len(self.by_ip)} equipos, {len(self.rows)} filas, [red]{self.down}[/red] sin servicio · "
+                            f"orden {self.order}" + (f" · {', '.join(filters)}" if filters else '')
+                            + f" · página {self.page + 1}/{pages} ({len(self.sorted)} filas)",
+                      header_style="bold blue", expand=True)
+        for column in ("IP", "Equipo", "ID", "Interfaz", "Estado", "Entrada", "Salida", "Uso", "Sondeo"):
+            table.add_column(column, justify="right" if column in ("ID", "Entrada", "Salida", "Uso") else "left",
+                             no_wrap=True)
+        for row in visible:
+            table.add_row(*row.render())
+        footer = '\n'.join(self.events) or '[dim]Sin eventos[/dim]'
+        return Group(table, footer, f"[dim]{self.KEYS}[/dim]")
+
+    def _refresh_loop(self):
+        while not self.stop.wait(0.25):
+            self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            if not (self.dirty or self.order_dirty):
+                return
+            with METRICS.timed('render', table='panel'):
+                self.live.update(self.render(), refresh=True)
+            self.dirty = False
+
+    def _read_keys(self):
+        """Lee teclas sueltas de la terminal sin esperar a Intro (solo POSIX)"""
+        try:
+            import termios
+            import tty
+        except ImportError:
+            return
+        fd = sys.stdin.fileno()
+        saved = termios.tcgetattr(fd)
+        try:
+            tty.setcbreak(fd)
+            while not self.stop.is_set():
+                ready, _, _ = select.select([sys.stdin], [], [], 0.25)
+                if ready:
+                    self.handle_key(sys.stdin.read(1).lower())
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+    def __enter__(self):
+        from rich.live import Live
+        
+        with self.lock:
+            self.live = Live(self.render(), console=console._console(), auto_refresh=False, screen=False,
+                             transient=False)
+        self.live.start()
+        targets = [self._refresh_loop]
+        if sys.stdin.isatty():
+            targets.append(self._read_keys)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join(timeout=1)
+        self.refresh()
+        self.live.stop()
+
+class PollScheduler:
+    """Planificador del modo vigilar: sondea cada dispositivo periódicamente
+
+    La cola es un heap ordenado por el instante en que toca sondear cada
+    dispositivo. Cada sondeo tiene como límite su propio intervalo, así que
+    un dispositivo lento no retrasa a los demás; si le vuelve a tocar
+    mientras sigue en curso se cuenta como solape y se salta ese ciclo.
+    Con inventario, los ciclos de los equipos en espera por fallos se saltan.
+    Con `rates`, cada intervalo se calculan de una vez las tasas de todos los
+    sondeos del ciclo y se entregan a `on_rates`.
+    """
+
+    def __init__(self, ips, community='public', interval=60, intervals=None, jitter=0.1,
+                 concurrency=32, device_timeout=10, on_result=None, store=None, cache=None,
+                 inventory=None, profiles=(), profile_overrides=None, rates=None, on_rates=None):
+        self.community = community
+        self.rates = rates
+        self.on_rates = on_rates
+        self.profiles = profiles
+        self.profile_overrides = profile_overrides
+        self.store = store
+        self.cache = cache
+        self.inventory = inventory
+        self.interval = interval
+        self.intervals = dict(intervals or {})
+        self.jitter = jitter
+        self.device_timeout = device_timeout
+        self.on_result = on_result
+        self.devices = {}
+        self.interfaces = {}
+        self.stats = collections.Counter()
+        self.lock = threading.Lock()
+        self.queue = []
+        self.next_due = {}
+        self.in_flight = set()
+        self.sequence = itertools.count()
+        self.polled_at = {}
+        self.completed = collections.Counter()
+        self.poll_done = threading.Condition(self.lock)
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        self.next_rates = time.monotonic() + interval
+        
+        # Repartir el primer sondeo para no lanzar todos los dispositivos a la vez
+        now = time.monotonic()
+        for ip in ips:
+            self.schedule(ip, now + random.uniform(0, self.jitter * self.interval_for(ip)))
+
+    def interval_for(self, ip):
+        return self.intervals.get(ip, self.interval)
+
+    def schedule(self, ip, due):
+        """Programa el próximo sondeo de un dispositivo, sustituyendo al anterior"""
+        with self.lock:
+            self.next_due[ip] = due
+            heapq.heappush(self.queue, (due, next(self.sequence), ip))
+        self.wakeup.set()
+
+    def poll_now(self, ip):
+        """Adelanta el sondeo de un dispositivo a este mismo instante"""
+        self.schedule(ip, time.monotonic())
+
+    def refresh(self, ips, timeout):
+        """Sondea ya las IPs indicadas y espera a que terminen, como mucho `timeout` segundos"""
+        with self.lock:
+            before = {ip: self.completed[ip] for ip in ips}
+        for ip in ips:
+            self.poll_now(ip)
+        end = time.monotonic() + timeout
+        with self.poll_done:
+            while any(self.completed[ip] == count for ip, count in before.items()):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.poll_done.wait(remaining)
+        return True
+
+    def snapshot(self, ips=None, only_down=False, pattern=None, order=None, offset=0, limit=None):
+        """Último estado conocido de cada dispositivo en forma JSON, con sus interfaces y la hora del sondeo
+
+        El filtro (solo interfaces caídas, patrón de IP o nombre), el orden y
+        la página se aplican aquí, de modo que solo se serializa lo que se va
+        a enviar. Devuelve esa página y el total de dispositivos que encajan.
+        """
+        with self.lock:
+            selected = []
+            for ip in (ips or self.next_due):
+                device = self.devices.get(ip)
+                if not device or not matches_pattern(pattern, ip, device.name):
+                    continue
+                interfaces = self.interfaces.get(ip)
+                if only_down:
+                    interfaces = {if_index: interface for if_index, interface in (interfaces or {}).items()
+                                  if interface.status != 'Up'}
+                    if not interfaces:
+                        continue
+                selected.append((ip, device, interfaces))
+            if order:
+                selected.sort(key=lambda item: SNAPSHOT_ORDERS[order](*item))
+            
+            devices = []
+            for ip, device, interfaces in selected[offset:None if limit is None else offset + limit]:
+                device.interfaces = interfaces
+                device.polled_at = self.polled_at.get(ip)
+                devices.append(device.to_dict())
+                device.interfaces = self.interfaces.get(ip)
+            return devices, len(selected)
+
+    def handle_trap(self, event):
+        """Aplica un evento de trap al estado y adelanta el sondeo del dispositivo afectado
+
+        Devuelve los cambios de estado de interfaz que produce, con la misma
+        forma que los que recibe on_result, o None si el dispositivo no se vigila.
+        """
+        changes = []
+        with self.lock:
+            # schedule() añade IPs a next_due desde otros hilos (colector, refrescos)
+            targets = list(self.next_due)
+        # Los destinos por nombre se comparan por su dirección; la resolución queda en caché
+        ips = [ip for ip in targets if target_address(ip) == event['ip']]
+        with self.lock:
+            ips = [ip for ip in ips if ip in self.next_due]
+            if not ips:
+                self.stats['trampas ignoradas'] += 1
+                return None
+            self.stats['trampas'] += 1
+            for ip in ips:
+                interfaces = self.interfaces.get(ip)
+                interface = (interfaces or {}).get(event['if_index'])
+                if interface is not None and event['status'] and interface.status != event['status']:
+                    changes.append((event['if_index'], interface.name or event['if_index'],
+                                    interface.status, event['status']))
+                    interface.status = event['status']
+        # Refresco inmediato solo del dispositivo que ha avisado
+        for ip in ips:
+            self.poll_now(ip)
+        return changes
+
+    def run(self, duration=None, stop=None):
+        """Bucle principal; termina al pasar `duration` segundos o al activarse `stop`"""
+        stop = stop or threading.Event()
+        end = None if duration is None else time.monotonic() + duration
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                if end is not None and now >= end:
+                    break
+                
+                due_items = []
+                with self.lock:
+                    while self.queue and self.queue[0][0] <= now:
+                        due, _, ip = heapq.heappop(self.queue)
+                        if self.next_due.get(ip) == due:  # Las entradas sustituidas se ignoran
+                            due_items.append((due, ip))
+                    wait = self.queue[0][0] - now if self.queue else 1
+                
+                for due, ip in due_items:
+                    self._dispatch(ip, due)
+                
+                if self.rates is not None:
+                    if now >= self.next_rates:
+                        self.next_rates = now + self.interval
+                        self._compute_rates()
+                    wait = min(wait, self.next_rates - now)
+                
+                if end is not None:
+                    wait = min(wait, end - now)
+                self.wakeup.wait(max(0, wait))
+                self.wakeup.clear()
+        finally:
+            self.stopping.set()
+            pending = self.drain(self.device_timeout + 1)
+            self.pool.shutdown(wait=False)
+            if pending:
+                console.print(f"[yellow]{pending} sondeos siguen en curso al terminar; sus resultados se descartan[/yellow]")
+
+    def drain(self, timeout):
+        """Espera a que acaben los sondeos en curso, como mucho `timeout` segundos, y devuelve cuántos quedan
+
+        Cada sondeo tiene como límite `device_timeout` desde que le tocó, así
+        que al salir del bucle basta con ese margen para que terminen antes de
+        que se cierren el almacén, la caché y el inventario donde escriben.
+        Los que seguían en cola salen sin sondear al ver `stopping`.
+        """
+        end = time.monotonic() + timeout
+        with self.poll_done:
+            while self.in_flight:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.poll_done.wait(remaining)
+            return len(self.in_flight)
+
+    def _compute_rates(self):
+        with METRICS.timed('rates'):
+            valid = self.rates.compute()
+        if valid and self.on_rates:
+            self.on_rates(self.rates)
+
+    def _dispatch(self, ip, due):
+        interval = self.interval_for(ip)
+        self.schedule(ip, due + interval * (1 + random.uniform(-self.jitter, self.jitter)))
+        
+        if self.inventory is not None and not self.inventory.is_due(ip):
+            with self.lock:
+                self.stats['en espera'] += 1
+            return
+        
+        with self.lock:
+            if ip in self.in_flight:
+                self.stats['solapes'] += 1
+                console.print(f"[yellow]{ip}: el sondeo anterior sigue en curso, se salta este ciclo[/yellow]")
+                return
+            self.in_flight.add(ip)
+        
+        deadline = due + min(interval, self.device_timeout)
+        self.pool.submit(self._poll, ip, deadline, interval)
+
+    def _poll(self, ip, deadline, interval):
+        try:
+            if self.stopping.is_set():
+                return
+            if time.monotonic() >= deadline:
+                # Ha esperado en cola más de lo que le quedaba; mejor el próximo ciclo
+                with self.lock:
+                    self.stats['vencidos'] += 1
+                return
+            
+            started = time.monotonic()
+            device = get_system_info(ip, self.community, deadline, self.cache)
+            interfaces = None
+            if device:
+                interfaces = get_interfaces_info(ip, self.community, deadline,
+                                                 counters=self.store is not None or self.rates is not None,
+                                                 cache=self.cache)
+                device.interfaces = interfaces
+                selected = select_profiles(device, self.profiles, self.profile_overrides)
+                if selected:
+                    device.metrics = get_profile_metrics(ip, self.community, selected, deadline)
+            elapsed = time.monotonic() - started
+            METRICS.observe('stage', elapsed, stage='sondeo')
+            METRICS.count('device_seconds', elapsed, ip=ip, stage='sondeo')
+            if self.stopping.is_set() and time.monotonic() >= deadline:
+                # Fuera de plazo tras la parada: el almacén puede estar ya cerrado
+                return
+            if self.store is not None and interfaces:
+                self.store.record(ip, interfaces)
+            if self.rates is not None and interfaces:
+                self.rates.observe(ip, interfaces, device.uptime)
+            if self.inventory is not None:
+                self.inventory.record(ip, device)
+            
+            with self.lock:
+                self.stats['sondeos'] += 1
+                if not device:
+                    self.stats['sin respuesta'] += 1
+                if elapsed > interval:
+                    self.stats['solapes'] += 1
+                previous = self.interfaces.get(ip) or {}
+                self.devices[ip] = device
+                self.interfaces[ip] = interfaces
+                self.polled_at[ip] = time.time()
+            
+            if elapsed > interval:
+                console.print(f"[yellow]{ip}: el sondeo tardó {elapsed:.2f}s, más que su intervalo de {interval:g}s[/yellow]")
+            
+            changes = []
+            for if_id, interface in (interfaces or {}).items():
+                old = previous.get(if_id)
+                old_status = old.status if old is not None else None
+                if old_status and old_status != interface.status:
+                    changes.append((if_id, interface.name or if_id, old_status, interface.status))
+            
+            if self.on_result:
+                self.on_result(ip, device, elapsed, changes)
+        except Exception as e:
+            console.print(f"[red]Error sondeando {ip}: {str(e)}[/red]")
+        finally:
+            with self.lock:
+                self.in_flight.discard(ip)
+                self.completed[ip] += 1
+                self.poll_done.notify_all()
+
+INTERFACE_FIELDS = ('name', 'mac', 'status', 'speed', 'in_octets', 'out_octets', 'in_errors', 'out_errors')
+RATE_FIELDS = ('if_index', 'name', 'speed', 'in_bps', 'out_bps', 'utilization', 'errors')
+CSV_FIELDS = ['type', 'timestamp', 'ip', 'description', 'location', 'uptime', 'contact', 'object_id',
+              'if_index', 'name', 'mac', 'status', 'speed', 'in_octets', 'out_octets', 'in_errors', 'out_errors',
+              'in_bps', 'out_bps', 'utilization', 'errors', 'old_status', 'elapsed', 'metrics']
+
+class RecordWriter:
+    """Escribe cada dispositivo e interfaz en cuanto se recoge, en JSON Lines o CSV
+
+    Los hilos del pool escriben a la vez, así que cada registro se escribe y
+    se vuelca con el cerrojo tomado para que no se mezclen líneas. Si quien
+    lee cierra la tubería (`| head`), el escritor se cierra sin error y
+    avisa a `on_close`.
+    """
+
+    def __init__(self, stream, fmt, devices=True, interfaces=True, on_close=None):
+        self.stream = stream
+        self.format = fmt
+        self.devices = devices
+        self.interfaces = interfaces
+        self.on_close = on_close
+        self.closed = False
+        self.lock = threading.Lock()
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(stream, CSV_FIELDS, extrasaction='ignore', lineterminator='\n')
+            with self.lock:
+                try:
+                    self.csv.writeheader()
+                    stream.flush()
+                except BrokenPipeError:
+                    self._broken_pipe()
+
+    def _write(self, records):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                for record in records:
+                    if self.csv is not None:
+                        # Los resultados de los perfiles van en una sola celda, como JSON
+                        self.csv.writerow({key: json.dumps(value, ensure_ascii=False) if isinstance(value, dict)
+                                           else value for key, value in record.items()})
+                    else:
+                        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.stream.flush()
+            except BrokenPipeError:
+                self._broken_pipe()
+
+    def _broken_pipe(self):
+        self.closed = True
+        # Como recomienda la documentación de Python: el descriptor pasa a apuntar a
+        # /dev/null para que el volcado final del intérprete no vuelva a fallar
+        with contextlib.suppress(OSError, ValueError):
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.stream.fileno())
+            os.close(devnull)
+        if self.on_close:
+            self.on_close()
+
+    def device_records(self, device, timestamp=None):
+        records = []
+        if self.devices:
+            record = {'type': 'device', 'timestamp': timestamp, 'ip': device.ip}
+            record.update(device.record())
+            records.append(record)
+            if device.metrics:
+                records.append({'type': 'metrics', 'timestamp': timestamp, 'ip': device.ip,
+                                'metrics': device.metrics})
+        if self.interfaces:
+            for if_index, interface in sorted((device.interfaces or {}).items()):
+                record = {'type': 'interface', 'timestamp': timestamp, 'ip': device.ip, 'if_index': if_index}
+                values = interface.to_dict()
+                record.update({key: values[key] for key in INTERFACE_FIELDS if key in values})
+                records.append(record)
+        return records
+
+    def write_device(self, device):
+        """Escribe el registro del dispositivo y los de sus interfaces"""
+        self._write(self.device_records(device, time.time()))
+
+    def write_trap(self, event, changes):
+        """Modo vigilar: un registro por trap recibido"""
+        self._write([{'type': 'trap', 'timestamp': time.time(), 'ip': event['ip'], 'name': event['event'],
+                      'if_index': event['if_index'], 'status': event['status'],
+                      'old_status': changes[0][2] if changes else None}])
+
+    def write_poll(self, ip, device, elapsed, changes):
+        """Modo vigilar: un registro por sondeo y otro por cada cambio de estado de interfaz"""
+        timestamp = time.time()
+        if not device:
+            records = [{'type': 'unreachable', 'timestamp': timestamp, 'ip': ip, 'elapsed': round(elapsed, 4)}]
+        else:
+            record = {'type': 'device', 'timestamp': timestamp, 'ip': ip, 'elapsed': round(elapsed, 4)}
+            record.update(device.record())
+            records = [record]
+            if device.metrics:
+                records.append({'type': 'metrics', 'timestamp': timestamp, 'ip': ip, 'metrics': device.metrics})
+        for if_id, name, old_status, new_status in changes:
+            records.append({'type': 'interface_change', 'timestamp': timestamp, 'ip': ip, 'if_index': if_id,
+                            'name': name, 'old_status': old_status, 'status': new_status})
+        self._write(records)
+
+    def write_rates(self, top, fleet):
+        """Modo vigilar con --tasas: un registro con los totales de la flota y otro por interfaz del top"""
+        timestamp = time.time()
+        records = [{'type': 'fleet', 'timestamp': timestamp, 'metrics': fleet}]
+        for rank in top:
+            record = {'type': 'rate', 'timestamp': timestamp, 'ip': rank['ip']}
+            record.update({key: rank[key] for key in RATE_FIELDS})
+            records.append(record)
+        self._write(records)
+
+# --- Receptor de traps e informs (--trampas) ---
+
+SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'       # snmpTrapOID.0
+SNMP_TRAP_ADDRESS = '1.3.6.1.6.3.18.1.3.0'    # snmpTrapAddress.0
+TRAP_NAMES = {
+    '1.3.6.1.6.3.1.1.5.1': 'coldStart',
+    '1.3.6.1.6.3.1.1.5.2': 'warmStart',
+    '1.3.6.1.6.3.1.1.5.3': 'linkDown',
+    '1.3.6.1.6.3.1.1.5.4': 'linkUp',
+}
+V1_GENERIC_TRAPS = {0: 'coldStart', 1: 'warmStart', 2: 'linkDown', 3: 'linkUp'}
+IF_INDEX_PREFIX = '1.3.6.1.2.1.2.2.1.1.'
+IF_STATUS_PREFIX = IF_COLUMNS['status'] + '.'
+
+def parse_trap(message, source):
+    """Resume una notificación decodificada en un evento
+
+    Devuelve {'ip', 'event', 'if_index', 'status'} o None si no es un trap.
+    """
+    pdu_type = message['pdu_type']
+    if pdu_type == TRAP_V1:
+        ip = message['agent_address'] or source
+        event = V1_GENERIC_TRAPS.get(message['generic_trap'], 'enterpriseSpecific')
+    elif pdu_type in (SNMPV2_TRAP, INFORM_REQUEST):
+        values = dict(message['varbinds'])
+        ip = values.get(SNMP_TRAP_ADDRESS) or source
+        trap_oid = values.get(SNMP_TRAP_OID)
+        event = TRAP_NAMES.get(trap_oid, trap_oid or 'desconocido')
+    else:
+        return None
+    
+    if_index = None
+    status = None
+    for oid, value in message['varbinds']:
+        if oid.startswith(IF_INDEX_PREFIX) and isinstance(value, int):
+            if_index = int(value)
+        elif oid.startswith(IF_STATUS_PREFIX) and isinstance(value, int):
+            if_index = if_index or int(oid[len(IF_STATUS_PREFIX):])
+            status = 'Up' if value == 1 else 'Down'
+    if status is None and event in ('linkUp', 'linkDown'):
+        status = 'Up' if event == 'linkUp' else 'Down'
+    return {'ip': str(ip), 'event': event, 'if_index': if_index, 'status': status}
+
+class TrapProtocol:
+    """Protocolo UDP de asyncio que pasa cada datagrama al TrapReceiver
+
+    Implementa los métodos de asyncio.DatagramProtocol sin heredar de él
+    para no importar asyncio al arrancar si no se usan traps.
+    """
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.receiver.handle(data, address, self.transport)
+
+    def error_received(self, exc):
+        self.receiver.stats['errores'] += 1
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+class TrapReceiver:
+    """Escucha traps (v1 y v2c) e informs en un bucle asyncio con su propio hilo
+
+    Los informs se confirman con un Response. Cada trap reconocido se
+    convierte en un evento y se pasa a `on_event` desde el hilo del bucle.
+    """
+
+    def __init__(self, port=162, community=None, on_event=None, host='0.0.0.0'):
+        self.address = (host, port)
+        self.community = community.encode() if isinstance(community, str) else community
+        self.on_event = on_event
+        self.stats = collections.Counter()
+        self.loop = None
+        self.transport = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+    def handle(self, data, address, transport):
+        try:
+            if message_version(data) == 3:
+                self.stats['v3 no soportadas'] += 1
+                return
+            message = decode_message(data)
+        except (ValueError, IndexError):
+            self.stats['malformadas'] += 1
+            return
+        if self.community is not None and message['community'] != self.community:
+            self.stats['comunidad incorrecta'] += 1
+            return
+        if message['pdu_type'] == INFORM_REQUEST:
+            transport.sendto(encode_message(message['community'], GET_RESPONSE, message['request_id'],
+                                            message['varbinds'], version=message['version']), address)
+        event = parse_trap(message, address[0])
+        if event is None:
+            self.stats['ignoradas'] += 1
+            return
+        self.stats['trampas'] += 1
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                console.print(f"[red]Error procesando trap de {event['ip']}: {str(e)}[/red]")
+
+    def _run(self):
+        import asyncio
         
-        console.print(if_table)
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.transport, _ = self.loop.run_until_complete(
+                self.loop.create_datagram_endpoint(lambda: TrapProtocol(self), local_addr=self.address))
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def start(self):
+        """Arranca el hilo del receptor; lanza OSError si no puede abrir el puerto"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+        return self
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+# --- Colector residente y cliente ligero (--colector) ---
+
+DEFAULT_SOCKET = os.path.join('/tmp', 'tmd-colector.sock')
+
+class CollectorHandler(socketserver.StreamRequestHandler):
+    """Atiende las consultas de un cliente: una línea JSON por petición y por respuesta"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = self.server.collector.answer(request)
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+            self.wfile.flush()
+
+class CollectorServer:
+    """Expone por un socket Unix la última foto de estado del PollScheduler
+
+    Una consulta puede pedir refrescar IPs concretas: se adelanta su sondeo
+    y se espera a que termine (como mucho `device_timeout`) antes de responder.
+    Las IPs a refrescar que aún no se vigilaban pasan a vigilarse. También
+    puede pedir solo lo caído, un patrón, un orden y una página, que se
+    resuelven en el colector para no enviar la flota entera al cliente.
+    """
+
+    def __init__(self, path, scheduler, device_timeout=10):
+        self.path = path
+        self.scheduler = scheduler
+        self.device_timeout = device_timeout
+        self.server = None
+        self.thread = None
+
+    def answer(self, request):
+        refresh = list(request.get('refresh') or [])
+        if refresh:
+            self.scheduler.refresh(refresh, request.get('timeout', self.device_timeout))
+        order = request.get('order')
+        if order is not None and order not in SNAPSHOT_ORDERS:
+            raise ValueError(f"orden desconocido: {order}")
+        devices, total = self.scheduler.snapshot(request.get('ips'), bool(request.get('down')),
+                                                 request.get('pattern'), order,
+                                                 max(0, int(request.get('offset') or 0)), request.get('limit'))
+        return {'devices': devices, 'total': total}
+
+    def remove_stale_socket(self):
+        """Borra el socket huérfano de una ejecución anterior; falla si la ruta es otra cosa o sigue viva"""
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{self.path} ya existe y no es un socket")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.path)
+            except ConnectionRefusedError:
+                os.unlink(self.path)  # Nadie escucha: quedó de un colector que no terminó bien
+                return
+        raise FileExistsError(f"ya hay un colector escuchando en {self.path}")
+
+    def start(self):
+        self.remove_stale_socket()
+        # Los permisos del descriptor pasan al fichero al hacer bind (Linux), así que el socket
+        # nace ya con 0600 sin un chmod posterior ni tocar la umask del proceso, que es común
+        # a los hilos que ya están creando ficheros
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, CollectorHandler, bind_and_activate=False)
+        try:
+            os.fchmod(self.server.socket.fileno(), 0o600)
+            self.server.server_bind()
+            self.server.server_activate()
+        except OSError:
+            self.server.server_close()
+            raise
+        self.server.daemon_threads = True
+        self.server.collector = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.path)
+
+def query_collector(path, ips=None, refresh=None, timeout=10, **filters):
+    """Pide al colector su foto de estado; devuelve los dispositivos y cuántos encajan en total
+
+    `filters` se pasa tal cual al colector: down, pattern, order, offset y limit.
+    """
+    request = {'ips': ips, 'refresh': refresh, 'timeout': timeout, **filters}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout + 5)
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as stream:
+            response = json.loads(stream.readline() or b'{}')
+    if 'error' in response:
+        raise ValueError(response['error'])
+    devices = [Device.from_dict(device) for device in response.get('devices', [])]
+    return devices, response.get('total', len(devices))
+
+def show_collector_snapshot(args, writer=None):
+    """Cliente ligero: muestra la foto del colector residente sin sondear nada por su cuenta"""
+    start_time = time.time()
+    try:
+        devices, total = query_collector(args.socket, args.ips, args.refrescar, args.limite,
+                                         down=args.solo_caidas, pattern=args.filtro_ip, order=args.orden,
+                                         offset=(args.pagina - 1) * (args.filas or 0), limit=args.filas)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]No se pudo consultar el colector en {args.socket}: {str(e)}[/red]")
+        console.print("Arráncalo con: python tmd.py colector --ips ...")
+        return
+    elapsed_time = time.time() - start_time
+    
+    if writer is not None:
+        for device in devices:
+            writer.write_device(device)
+    else:
+        if args.modo == 'dispositivos':
+            display_devices_table(devices)
+        elif args.modo == 'interfaces':
+            display_interfaces_table(devices)
+        else:
+            display_devices_table(devices)
+            display_interfaces_table(devices)
+        display_metrics_table(devices)
+    
+    polled = [device.polled_at for device in devices if device.polled_at]
+    age = f", sondeo más antiguo hace {time.time() - min(polled):.0f} s" if polled else ''
+    console.print(f"\nConsulta al colector: [bold cyan]{elapsed_time * 1000:.1f}[/bold cyan] ms{age}")
+    if args.filas:
+        console.print(f"Página {args.pagina} de {max(1, -(-total // args.filas))} ({total} dispositivos)")
+
+def print_poll_result(ip, device, elapsed, changes):
+    """Muestra una línea por sondeo del modo vigilar"""
+    timestamp = time.strftime('%H:%M:%S')
+    if not device:
+        console.print(f"[dim]{timestamp}[/dim] [cyan]{ip}[/cyan] [red]sin respuesta[/red] ({elapsed:.2f}s)")
+        return
+    console.print(f"[dim]{timestamp}[/dim] [cyan]{ip}[/cyan] {device.name or 'N/A'} "
+                  f"uptime {device.uptime_text or 'N/A'} ({elapsed:.2f}s)")
+    for if_id, name, old_status, new_status in changes:
+        color = 'green' if new_status == 'Up' else 'red'
+        console.print(f"    Interfaz {name} ({if_id}): {old_status} -> [{color}]{new_status}[/{color}]")
+
+def format_bps(bps):
+    """Formatea una tasa en bits por segundo con la unidad decimal adecuada"""
+    for unit in ('b/s', 'kb/s', 'Mb/s', 'Gb/s'):
+        if bps < 1000 or unit == 'Gb/s':
+            return f"{bps:.0f} {unit}" if unit == 'b/s' else f"{bps:.1f} {unit}"
+        bps /= 1000
 
-def main():
+def print_rates(top, fleet):
+    """Muestra los totales de la flota y las interfaces más cargadas del ciclo"""
+    timestamp = time.strftime('%H:%M:%S')
+    utilization = (f", utilización media {fleet['utilization_mean']:.1f}% (máx. {fleet['utilization_max']:.1f}%)"
+                   if fleet['utilization_mean'] is not None else '')
+    console.print(f"[dim]{timestamp}[/dim] [bold]Flota[/bold]: {fleet['interfaces']} interfaces en "
+                  f"{fleet['devices']} equipos, entrada {format_bps(fleet['in_bps'])}, "
+                  f"salida {format_bps(fleet['out_bps'])}{utilization}, "
+                  f"{fleet['saturated']} saturadas, {fleet['errors_per_s']:.1f} errores/s")
+    for rank in top:
+        load = f"{rank['utilization']:.1f}%" if rank['utilization'] is not None else 'N/A'
+        color = 'red' if rank['utilization'] is not None and rank['utilization'] >= SATURATION else 'green'
+        console.print(f"    [cyan]{rank['ip']}[/cyan] {rank['name']}: [{color}]{load}[/{color}] "
+                      f"entrada {format_bps(rank['in_bps'])}, salida {format_bps(rank['out_bps'])}")
+
+def print_trap_event(event, changes):
+    """Muestra una línea por trap recibido en el modo vigilar"""
+    timestamp = time.strftime('%H:%M:%S')
+    detail = f" interfaz {event['if_index']}" if event['if_index'] else ''
+    console.print(f"[dim]{timestamp}[/dim] [cyan]{event['ip']}[/cyan] [magenta]trap {event['event']}[/magenta]{detail}")
+    for if_id, name, old_status, new_status in changes:
+        color = 'green' if new_status == 'Up' else 'red'
+        console.print(f"    Interfaz {name} ({if_id}): {old_status} -> [{color}]{new_status}[/{color}]")
+
+def parse_intervals(values):
+    """Convierte entradas IP=SEGUNDOS en un diccionario de intervalos por dispositivo"""
+    intervals = {}
+    for value in values or []:
+        ip, _, seconds = value.rpartition('=')
+        if not ip:
+            raise argparse.ArgumentTypeError(f"Intervalo no válido: {value} (formato IP=SEGUNDOS)")
+        intervals[ip] = float(seconds)
+    return intervals
+
+def parse_profile_overrides(values):
+    """Convierte entradas IP=PERFIL,PERFIL en un diccionario de perfiles por dispositivo"""
+    overrides = {}
+    for value in values or []:
+        ip, _, names = value.rpartition('=')
+        if not ip:
+            raise argparse.ArgumentTypeError(f"Perfiles no válidos: {value} (formato IP=PERFIL,PERFIL)")
+        overrides[ip] = [name for name in names.split(',') if name]
+        unknown = [name for name in overrides[ip] if name != 'auto' and name not in PROFILES]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"Perfil desconocido: {', '.join(unknown)}")
+    return overrides
+
+def report_discovery(networks, found, without_snmp):
+    """Muestra el resultado del barrido de descubrimiento"""
+    console.print(f"Descubiertos [bold cyan]{len(found)}[/bold cyan] dispositivos SNMP en {', '.join(networks)}")
+    if without_snmp:
+        console.print(f"[yellow]Responden a ping pero no a SNMP: {', '.join(without_snmp)}[/yellow]")
+
+def agent_label(address):
+    """Nombre de un agente (IP, puerto) en los avisos: la IP, con el puerto si no es el configurado"""
+    host, port = address
+    return host if port == CONFIG.port else f'{host}:{port}'
+
+def report_governor():
+    """Avisa de los agentes frenados por pérdidas, aparte de los que directamente no responden"""
+    failing = set(TIMEOUTS.failing_hosts())
+    throttled = sorted(((address, rate) for address, rate in CONFIG.governor.throttled().items()
+                        if address not in failing),
+                       key=lambda item: item[1])
+    if throttled:
+        shown = ', '.join(f"{agent_label(address)} ({rate:.0f} pps)" for address, rate in throttled[:5])
+        more = f" y {len(throttled) - 5} más" if len(throttled) > 5 else ''
+        console.print(f"[yellow]Ritmo reducido por pérdidas en {len(throttled)} agentes: {shown}{more}[/yellow]")
+    if failing:
+        broken = set(TIMEOUTS.open_hosts())
+        shown = ', '.join(sorted(map(agent_label, failing), key=ip_sort_key)[:5])
+        more = f" y {len(failing) - 5} más" if len(failing) > 5 else ''
+        console.print(f"[yellow]{len(failing)} agentes sin respuesta en su última petición "
+                      f"({len(broken)} con el cortocircuito abierto): {shown}{more}[/yellow]")
+
+def report_profile(path):
+    """Muestra el resumen de métricas y las exporta al fichero indicado"""
+    console.print("\nPerfil:")
+    for line in METRICS.report():
+        console.print(line)
+    try:
+        METRICS.export(path)
+        console.print(f"Métricas exportadas a [bold]{path}[/bold]")
+    except OSError as e:
+        console.print(f"[red]No se pudieron exportar las métricas: {str(e)}[/red]")
+
+DEFAULT_IPS = ['30.20.10.10', '30.20.10.113', '30.20.10.114']
+
+def main(argv=None):
+    
     parser = argparse.ArgumentParser(description='Monitor de dispositivos SNMP')
-    parser.add_argument('modo', choices=['dispositivos', 'interfaces', 'todo'], 
-                       help='Qué información mostrar (dispositivos, interfaces, todo)')
-    parser.add_argument('--ips', nargs='+', default=['30.20.10.10', '30.20.10.113', '30.20.10.114'],
-                       help='Direcciones IP a escanear')
+    parser.add_argument('modo', choices=['dispositivos', 'interfaces', 'todo', 'vigilar', 'colector'], 
+                       help='Qué información mostrar (dispositivos, interfaces, todo), vigilar de forma continua '
+                            'o arrancar el colector residente')
+    parser.add_argument('--ips', nargs='+',
+                       help=f'Direcciones IP a escanear (por defecto: {" ".join(DEFAULT_IPS)})')
+    parser.add_argument('--red', nargs='+', metavar='CIDR',
+                       help='Rangos a barrer con sondas SNMP para descubrir dispositivos')
+    parser.add_argument('--icmp', action='store_true',
+                       help='En el descubrimiento, hacer ping a las IPs que no responden a SNMP')
+    parser.add_argument('--puerto', type=int, default=SNMP_PORT,
+                       help=f'Puerto UDP de los agentes SNMP (por defecto: {SNMP_PORT})')
     parser.add_argument('--comunidad', default='public',
                        help='Comunidad SNMP (por defecto: public)')
+    parser.add_argument('--v3-usuario', metavar='USUARIO',
+                       help='Usar SNMPv3 con este usuario en lugar de la comunidad')
+    parser.add_argument('--v3-auth', choices=sorted(V3_AUTH_PROTOCOLS), default='SHA',
+                       help='SNMPv3: protocolo de autenticación (por defecto: SHA)')
+    parser.add_argument('--v3-clave-auth', metavar='CLAVE',
+                       help='SNMPv3: contraseña de autenticación (sin ella, noAuthNoPriv)')
+    parser.add_argument('--v3-clave-priv', metavar='CLAVE',
+                       help='SNMPv3: contraseña de cifrado AES-128 (con ella, authPriv)')
+    parser.add_argument('--concurrencia', type=int, default=32,
+                       help='Dispositivos consultados en paralelo (por defecto: 32)')
+    parser.add_argument('--procesos', type=int, default=1,
+                       help='Repartir los dispositivos entre N procesos, cada uno con --concurrencia hilos '
+                            '(por defecto: 1)')
+    parser.add_argument('--limite', type=float, default=10,
+                       help='Tiempo máximo por dispositivo en segundos (por defecto: 10)')
+    parser.add_argument('--motor', choices=['nativo', 'netsnmp'], default='nativo',
+                       help='Cliente SNMP: nativo en Python o subprocesos de net-snmp (por defecto: nativo)')
+    parser.add_argument('--reintentos', type=int, default=SNMP_RETRIES,
+                       help=f'Reenvíos como máximo de cada petición SNMP; el timeout de cada envío se ajusta '
+                            f'al RTT medido del agente (por defecto: {SNMP_RETRIES})')
+    parser.add_argument('--pps', type=float, default=0,
+                       help='Paquetes SNMP por segundo como máximo en total, reenvíos incluidos '
+                            '(por defecto: sin límite)')
+    parser.add_argument('--pps-agente', type=float, default=AGENT_PPS,
+                       help=f'Paquetes por segundo como máximo a cada agente; se reduce a la mitad con cada '
+                            f'pérdida y se recupera con las respuestas (por defecto: {AGENT_PPS}; 0 sin límite)')
+    parser.add_argument('--en-vuelo', type=int, default=0,
+                       help='Peticiones SNMP sin terminar como máximo en todo el proceso '
+                            '(por defecto: sin límite)')
+    parser.add_argument('--repeticiones', type=int, default=BULK_REPETITIONS,
+                       help=f'max-repetitions de cada GETBULK de tablas (por defecto: {BULK_REPETITIONS})')
+    extra_profiles = [name for name in PROFILES if name not in BASE_PROFILES]
+    parser.add_argument('--metricas', nargs='+', default=[], choices=extra_profiles + ['auto'], metavar='PERFIL',
+                       help=f'Perfiles de OIDs adicionales a recoger ({", ".join(extra_profiles)}), o auto para '
+                            f'elegirlos según la clase del equipo (sysObjectID)')
+    parser.add_argument('--metricas-ip', action='append', metavar='IP=PERFIL,PERFIL',
+                       help='Perfiles propios de un dispositivo en lugar de --metricas (se puede repetir)')
+    parser.add_argument('--intervalo', type=float, default=60,
+                       help='Modo vigilar: segundos entre sondeos de cada dispositivo (por defecto: 60)')
+    parser.add_argument('--intervalo-ip', action='append', metavar='IP=SEGUNDOS',
+                       help='Modo vigilar: intervalo propio para un dispositivo (se puede repetir)')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                       help='Modo vigilar: variación aleatoria del intervalo, en fracción (por defecto: 0.1)')
+    parser.add_argument('--duracion', type=float,
+                       help='Modo vigilar: terminar tras estos segundos (por defecto: sin fin)')
+    parser.add_argument('--trampas', type=int, metavar='PUERTO',
+                       help='Modo vigilar: recibir traps e informs SNMP en este puerto UDP (162 requiere '
+                            'privilegios) y refrescar al momento el dispositivo que avisa')
+    parser.add_argument('--historial', metavar='FICHERO',
+                       help='Modo vigilar: guardar los contadores de tráfico en este fichero mapeado en memoria')
+    parser.add_argument('--muestras', type=int, default=1440,
+                       help='Muestras guardadas por interfaz en el historial (por defecto: 1440)')
+    parser.add_argument('--series', type=int, default=4096,
+                       help='Número máximo de interfaces en el historial (por defecto: 4096); '
+                            'las que no caben no se guardan')
+    parser.add_argument('--tasas', type=int, metavar='N',
+                       help='Modo vigilar: calcular cada intervalo tasas, utilización y errores de todas las '
+                            'interfaces (requiere NumPy) y mostrar los totales y las N más cargadas')
+    parser.add_argument('--tasas-orden', choices=RateEngine.ORDERS, default='utilization',
+                       help='Con --tasas: ordenar por utilización, tráfico total (bps) o errores '
+                            '(por defecto: utilization)')
+    parser.add_argument('--panel', action='store_true',
+                       help='Modos vigilar y colector: panel en vivo con una fila por interfaz que se actualiza '
+                            'en su sitio (teclas: n/p página, s orden, c solo caídas, q salir)')
+    parser.add_argument('--orden', choices=list(DASHBOARD_ORDERS), default='ip',
+                       help='Orden de las filas del panel o de la consulta al colector; trafico y utilizacion '
+                            'solo en el panel con --tasas (por defecto: ip)')
+    parser.add_argument('--solo-caidas', action='store_true',
+                       help='Con --panel o --colector: mostrar solo las interfaces que no están Up')
+    parser.add_argument('--filtro-ip', metavar='PATRÓN',
+                       help='Con --panel o --colector: solo los equipos cuya IP o nombre encaja con el patrón '
+                            '(admite * y ?)')
+    parser.add_argument('--filas', type=int, metavar='N',
+                       help='Filas por página del panel (por defecto: las que quepan) o dispositivos por página '
+                            'de la consulta al colector (por defecto: todos)')
+    parser.add_argument('--pagina', type=int, default=1, metavar='N',
+                       help='Con --colector y --filas: página a mostrar (por defecto: 1)')
+    parser.add_argument('--cache', metavar='FICHERO',
+                       help='Guardar la información estática y las interfaces de cada equipo y releerlas solo cuando cambien')
+    parser.add_argument('--cache-ttl', type=float, default=3600,
+                       help='Segundos que vale una entrada de la caché (por defecto: 3600)')
+    parser.add_argument('--inventario', metavar='FICHERO',
+                       help='Inventario SQLite: añade sus dispositivos a los destinos, guarda el último estado '
+                            'de cada uno y sondea cada vez menos los que no responden')
+    parser.add_argument('--formato', choices=['tabla', 'jsonl', 'csv'], default='tabla',
+                       help='Salida: tablas al terminar, o un registro JSON Lines/CSV por dispositivo e interfaz '
+                            'en cuanto se recoge; los mensajes van entonces a stderr (por defecto: tabla)')
+    parser.add_argument('--colector', action='store_true',
+                       help='Cliente ligero: pedir la última foto al colector residente en lugar de sondear')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, metavar='RUTA',
+                       help=f'Socket Unix del colector residente (por defecto: {DEFAULT_SOCKET})')
+    parser.add_argument('--refrescar', nargs='+', metavar='IP',
+                       help='Con --colector: sondear ya estas IPs y esperar al resultado antes de mostrarlo')
+    parser.add_argument('--perfil', metavar='FICHERO',
+                       help='Medir tiempos de ping, peticiones, tablas, parseo, limpieza y renderizado y '
+                            'exportarlos a FICHERO (JSON si acaba en .json, si no texto de Prometheus)')
     
-    args = parser.parse_args()
-    
+    args = parser.parse_args(argv)
     try:
-        subprocess.run(['snmpget', '-v'], 
-                      stdout=subprocess.DEVNULL,
-                      stderr=subprocess.DEVNULL,
-                      timeout=2)
-    except:
-        console.print("[red]Error: net-snmp no está instalado.[/red]")
-        console.print("Instálalo con: sudo apt-get install snmp")
+        intervals = parse_intervals(args.intervalo_ip)
+        profile_overrides = parse_profile_overrides(args.metricas_ip)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+    if args.procesos > 1 and args.modo in ('vigilar', 'colector'):
+        parser.error('--procesos solo está disponible en los modos de escaneo único')
+    if args.colector and args.modo in ('vigilar', 'colector'):
+        parser.error('--colector solo se usa con dispositivos, interfaces o todo')
+    if args.panel and (args.modo not in ('vigilar', 'colector') or args.formato != 'tabla'):
+        parser.error('--panel solo se usa en los modos vigilar y colector con --formato tabla')
+    if args.colector and args.orden not in SNAPSHOT_ORDERS:
+        parser.error(f"el colector solo ordena por {', '.join(SNAPSHOT_ORDERS)}")
+    if (args.filas is not None and args.filas < 1) or args.pagina < 1:
+        parser.error('--filas y --pagina deben ser al menos 1')
+    
+    v3 = None
+    if args.v3_usuario:
+        try:
+            v3 = UsmSecurity(args.v3_usuario, args.v3_auth if args.v3_clave_auth else None,
+                             args.v3_clave_auth, args.v3_clave_priv)
+        except ValueError as e:
+            console.print(f"[red]Error: {str(e)}.[/red]")
+            if args.v3_clave_priv and load_aes() is None:
+                console.print("Instálalo con: pip install cryptography")
+            return
+    configure(SnmpConfig(args.puerto, args.motor, max(1, args.repeticiones), max(0, args.reintentos), v3,
+                         RequestGovernor(max(0, args.pps) or None, max(0, args.pps_agente) or None,
+                                         max(0, args.en_vuelo) or None)))
+    
+    writer = None
+    if args.formato != 'tabla':
+        # stdout queda solo para los registros; Rich no se llega a importar
+        console.use(PlainConsole(sys.stderr))
+        writer = RecordWriter(sys.stdout, args.formato,
+                              devices=args.modo in ('dispositivos', 'todo', 'vigilar', 'colector'),
+                              interfaces=args.modo in ('interfaces', 'todo'))
+    
+    if args.colector:
+        show_collector_snapshot(args, writer)
         return
     
-    start_time = time.time()
-    devices = []
+    if CONFIG.engine == 'netsnmp':
+        try:
+            subprocess.run(['snmpget', '-v'], 
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL,
+                          timeout=2)
+        except:
+            console.print("[red]Error: net-snmp no está instalado.[/red]")
+            console.print("Instálalo con: sudo apt-get install snmp")
+            return
+    
+    ips = list(args.ips or [])
+    inventory = DeviceInventory(args.inventario) if args.inventario else None
+    if inventory is not None:
+        inventory.add(ips)
+        ips += [ip for ip in inventory.targets() if ip not in ips]
+    if not ips and not args.red:
+        ips = list(DEFAULT_IPS)
+    
+    cache = DeviceCache(args.cache, args.cache_ttl) if args.cache else None
+    METRICS.enabled = bool(args.perfil)
+    
+    if args.modo in ('vigilar', 'colector'):
+        if args.red:
+            found, without_snmp = discover_hosts(args.red, args.comunidad, icmp=args.icmp,
+                                             concurrency=args.concurrencia)
+            report_discovery(args.red, found, without_snmp)
+            ips += [ip for ip in found if ip not in ips]
+            if inventory is not None:
+                inventory.add(found)
+        
+        stop = threading.Event()
+        dashboard = None
+        on_result = writer.write_poll if writer else print_poll_result
+        if writer is not None:
+            writer.on_close = stop.set  # Sin nadie leyendo los registros no tiene sentido seguir
+        if args.panel:
+            dashboard = Dashboard(args.orden, args.solo_caidas, args.filtro_ip, args.filas, stop)
+            on_result = dashboard.update_poll
+        
+        rates = on_rates = None
+        if args.tasas is not None:
+            try:
+                rates = RateEngine(stale_after=3 * max([args.intervalo, *intervals.values()]))
+            except ValueError as e:
+                console.print(f"[red]Error: {str(e)}.[/red]")
+                console.print("Instálalo con: pip install numpy")
+                return
+            show_rates = writer.write_rates if writer else print_rates
+            on_rates = lambda engine: show_rates(engine.top(args.tasas, args.tasas_orden), engine.aggregates())
+            if dashboard is not None:
+                on_rates = dashboard.update_rates
+        
+        store = CounterStore(args.historial, args.muestras, args.series) if args.historial else None
+        scheduler = PollScheduler(ips, args.comunidad, args.intervalo, intervals, args.jitter,
+                                  args.concurrencia, args.limite,
+                                  on_result=on_result,
+                                  store=store, cache=cache, inventory=inventory,
+                                  profiles=args.metricas, profile_overrides=profile_overrides,
+                                  rates=rates, on_rates=on_rates)
+        
+        receiver = None
+        if args.trampas:
+            show_trap = writer.write_trap if writer else print_trap_event
+            if dashboard is not None:
+                show_trap = dashboard.update_trap
+            
+            def on_trap(event):
+                changes = scheduler.handle_trap(event)
+                if changes is not None:
+                    show_trap(event, changes)
+            
+            try:
+                receiver = TrapReceiver(args.trampas, args.comunidad, on_trap).start()
+            except OSError as e:
+                console.print(f"[red]No se pudo escuchar traps en el puerto {args.trampas}: {str(e)}[/red]")
+                return
+            console.print(f"Escuchando traps en el puerto UDP [bold cyan]{args.trampas}[/bold cyan]")
+        
+        server = None
+        if args.modo == 'colector':
+            try:
+                server = CollectorServer(args.socket, scheduler, args.limite).start()
+            except OSError as e:
+                console.print(f"[red]No se pudo abrir el socket {args.socket}: {str(e)}[/red]")
+                return
+            console.print(f"Colector escuchando en [bold cyan]{args.socket}[/bold cyan]")
+        
+        console.print(f"Vigilando [bold cyan]{len(ips)}[/bold cyan] dispositivos (Ctrl+C para salir)")
+        try:
+            with dashboard or contextlib.nullcontext():
+                scheduler.run(args.duracion, stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.stop()
+            if receiver is not None:
+                receiver.stop()
+            if store is not None:
+                console.print(f"Historial: {len(store)} series de contadores en {args.historial}")
+                if store.dropped:
+                    dropped = ', '.join(f"{reason}: {count}" for reason, count in sorted(store.dropped.items()))
+                    console.print(f"[yellow]Muestras descartadas del historial: {dropped}[/yellow]")
+                store.close()
+            if cache is not None:
+                cache.save()
+                console.print(f"Caché: {cache.summary()}")
+            if inventory is not None:
+                console.print(f"Inventario: {inventory.summary()}")
+                inventory.close()
+        summary = ', '.join(f"{name}: {count}" for name, count in sorted(scheduler.stats.items()))
+        console.print(f"\nResumen: {summary or 'sin sondeos'}")
+        report_governor()
+        if args.perfil:
+            report_profile(args.perfil)
+        return
     
-    for ip in args.ips:
-        device = get_system_info(ip, args.comunidad)
-        if device:
-            devices.append(device)
+    waiting = []
+    if inventory is not None:
+        ips, waiting = inventory.split_due(ips)
     
+    timer = StageTimer()
+    start_time = time.time()
+    if args.procesos > 1:
+        # El barrido va primero: los trabajadores reciben la lista de destinos ya completa
+        found, without_snmp = [], []
+        if args.red:
+            with timer.stage('descubrimiento'):
+                found, without_snmp = discover_hosts(args.red, args.comunidad, icmp=args.icmp,
+                                                     concurrency=args.concurrencia)
+        devices = collect_devices_sharded(
+            ips + [ip for ip in found if ip not in ips], args.comunidad, args.concurrencia, args.limite,
+            args.procesos, interfaces=args.modo in ('interfaces', 'todo'), cache=cache, timer=timer,
+            on_device=writer.write_device if writer else None,
+            profiles=args.metricas, profile_overrides=profile_overrides)
+    else:
+        devices, found, without_snmp = collect_devices(
+            ips, args.comunidad, args.concurrencia, args.limite, networks=args.red,
+            interfaces=args.modo in ('interfaces', 'todo'), cache=cache, timer=timer, icmp=args.icmp,
+            on_device=writer.write_device if writer else None,
+            profiles=args.metricas, profile_overrides=profile_overrides)
     elapsed_time = time.time() - start_time
     
-    if args.modo == 'dispositivos':
-        display_devices_table(devices)
-    elif args.modo == 'interfaces':
-        display_interfaces_table(devices)
-    elif args.modo == 'todo':
-        display_devices_table(devices)
-        display_interfaces_table(devices)
+    if inventory is not None:
+        responded = {device.ip: device for device in devices}
+        for ip in dict.fromkeys(ips + found):
+            inventory.record(ip, responded.get(ip))
+    
+    if args.red:
+        report_discovery(args.red, found, without_snmp)
+    
+    # Con --formato jsonl/csv los registros ya se escribieron según llegaban
+    if writer is None:
+        with timer.stage('renderizado'):
+            if args.modo == 'dispositivos':
+                display_devices_table(devices)
+            elif args.modo == 'interfaces':
+                display_interfaces_table(devices)
+            elif args.modo == 'todo':
+                display_devices_table(devices)
+                display_interfaces_table(devices)
+            display_metrics_table(devices)
     
     console.print(f"\nTiempo de escaneo: [bold cyan]{elapsed_time:.2f}[/bold cyan] segundos")
+    for line in timer.report():
+        console.print(line)
+    report_governor()
+    if cache is not None:
+        cache.save()
+        console.print(f"Caché: {cache.summary()}")
+    if inventory is not None:
+        if waiting:
+            console.print(f"[yellow]{len(waiting)} dispositivos sin respuesta en los últimos sondeos "
+                          f"no se han vuelto a sondear todavía[/yellow]")
+        console.print(f"Inventario: {inventory.summary()}")
+        inventory.close()
+    if args.perfil:
+        report_profile(args.perfil)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file